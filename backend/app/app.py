@@ -3,7 +3,12 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from app.config import get_config
 from app.models import db
-from app.extensions import jwt, socketio, mail  # added mail
+from app.extensions import jwt, token_revocations, socketio, mail, summary_cache, phone_lookup_cache, email_outbox, smtp_pool, mpesa_token_cache, daraja, mpesa_jobs, mpesa_callbacks, disbursements  # added mail
+from app.commands import ledger_cli, perf_cli, notifications_cli, email_cli, mpesa_cli, auth_cli
+from app.utils.retention import start_retention_job
+from app.utils.digest import start_digest_job
+from app.utils.stk_reconcile import start_stk_reconcile_job
+from app.utils.revocation import start_revocation_purge_job
 import logging, sys
 
 # Import blueprints
@@ -45,7 +50,17 @@ CORS(
 # Initialize Extensions
 db.init_app(app)
 jwt.init_app(app)
+token_revocations.init_app(app)
 mail.init_app(app)  # ✅ initialize Flask-Mail
+smtp_pool.init_app(app)
+summary_cache.init_app(app)
+phone_lookup_cache.init_app(app)
+email_outbox.init_app(app)
+mpesa_token_cache.init_app(app)
+daraja.init_app(app)
+mpesa_jobs.init_app(app)
+mpesa_callbacks.init_app(app)
+disbursements.init_app(app)
 socketio.init_app(app, cors_allowed_origins=[
     "http://localhost:5173",
     "https://dapper-sundae-a9aff0.netlify.app/"
@@ -53,6 +68,20 @@ socketio.init_app(app, cors_allowed_origins=[
 
 migrate = Migrate(app, db)
 
+# Background jobs
+start_retention_job(app)
+start_digest_job(app)
+start_stk_reconcile_job(app)
+start_revocation_purge_job(app)
+
+# CLI commands
+app.cli.add_command(ledger_cli)
+app.cli.add_command(perf_cli)
+app.cli.add_command(notifications_cli)
+app.cli.add_command(email_cli)
+app.cli.add_command(mpesa_cli)
+app.cli.add_command(auth_cli)
+
 # Register Blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(contributions_bp)
@@ -71,11 +100,26 @@ def home():
     return "Flask is working!"
 
 # Socket.IO 
-@socketio.on("join_group")
-def handle_join_group(data):
-    group_id = data.get("group_id")
+@socketio.on("connect")
+def handle_connect(auth=None):
+    """
+    Clients that send their access token ({"token": ...}) join their own
+    user room and their group's room, where notifications are pushed.
+    Anonymous connections are accepted but join no rooms; a revoked token
+    refuses the connection.
+    """
     from flask_socketio import join_room
-    join_room(f"group_{group_id}")
+    from app.models import User
+    from app.utils.realtime import identity_from_socket_auth, remember_socket_identity, user_room, group_room
+
+    user_id = identity_from_socket_auth(auth)
+    if user_id is None:
+        return
+    remember_socket_identity(user_id)
+    join_room(user_room(user_id))
+    user = db.session.get(User, user_id)
+    if user and user.group_id:
+        join_room(group_room(user.group_id))
 
 # Run Server
 if __name__ == "__main__":
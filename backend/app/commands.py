@@ -0,0 +1,547 @@
+# commands.py
+import datetime
+import re
+import sys
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.models import (
+    db, Group, User, Transaction, TransactionType, TransactionReason, Contribution, ContributionStatus,
+    Notification, NotificationCounter, WithdrawalRequest, WithdrawalStatus, WithdrawalVotes, Loan, LoanStatus,
+    Disbursement
+)
+from app.utils.ledger import recompute_group_balance, backfill_member_month_totals
+from app.utils.notify import rebuild_unread_counters
+from app.utils.retention import purge_notifications_from_config
+from app.utils.digest import send_digests
+from app.utils.disbursements import requeue, FAILED
+from app.utils.stk_reconcile import reconcile_stk_pushes_from_config
+from app.utils.statement import reconcile_statement, StatementError
+
+ledger_cli = AppGroup("ledger", help="Maintain the materialized money totals.")
+perf_cli = AppGroup("perf", help="Query performance checks.")
+notifications_cli = AppGroup("notifications", help="Maintain notification bookkeeping.")
+email_cli = AppGroup("email", help="Transactional email outbox.")
+mpesa_cli = AppGroup("mpesa", help="M-Pesa callback and payout processing.")
+auth_cli = AppGroup("auth", help="Access token revocation.")
+
+
+@ledger_cli.command("rebuild-balances")
+@click.option("--group-id", type=int, default=None, help="Only rebuild this group.")
+def rebuild_balances(group_id):
+    """Recompute every group's running balance from the source tables."""
+    query = db.session.query(Group.id)
+    if group_id:
+        query = query.filter(Group.id == group_id)
+
+    count = 0
+    for (gid,) in query.all():
+        recompute_group_balance(gid)
+        db.session.commit()
+        count += 1
+    click.echo(f"Rebuilt balances for {count} group(s)")
+
+
+@ledger_cli.command("backfill-month-totals")
+@click.option("--group-id", type=int, default=None, help="Only backfill this group.")
+def backfill_month_totals(group_id):
+    """Rebuild the per-member monthly rollup from CREDIT transactions."""
+    count = backfill_member_month_totals(group_id)
+    db.session.commit()
+    click.echo(f"Wrote {count} member month total(s)")
+
+
+@notifications_cli.command("repair-counters")
+@click.option("--group-id", type=int, default=None, help="Only repair this group's members.")
+def repair_counters(group_id):
+    """Recompute the unread notification counters from the notification rows."""
+    count = rebuild_unread_counters(group_id)
+    db.session.commit()
+    click.echo(f"Repaired {count} unread counter(s)")
+
+
+@notifications_cli.command("purge")
+@click.option("--days", type=int, default=None, help="Override NOTIFICATION_RETENTION_DAYS.")
+@click.option("--batch-size", type=int, default=None, help="Override NOTIFICATION_PURGE_BATCH_SIZE.")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+@click.option("--mode", type=click.Choice(["archive", "delete"]), default=None,
+              help="Override NOTIFICATION_RETENTION_MODE.")
+def purge(days, batch_size, max_batches, mode):
+    """Archive or delete read notifications and group broadcasts past the retention window, in batches."""
+    result = purge_notifications_from_config(
+        current_app.config,
+        retention_days=days,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        archive=None if mode is None else mode == "archive",
+    )
+    click.echo(
+        f"Removed {result['deleted']} notification(s), archived {result['archived']}; "
+        f"removed {result['broadcasts_deleted']} broadcast(s), archived {result['broadcasts_archived']}; "
+        f"in {result['batches']} batch(es) ({result['seconds']}s)"
+    )
+
+
+@notifications_cli.command("send-digests")
+@click.option("--window-hours", type=int, default=None, help="Override DIGEST_WINDOW_HOURS.")
+def send_digests_command(window_hours):
+    """Queue digest emails for members on digest delivery whose window has elapsed."""
+    result = send_digests(
+        window_hours or current_app.config.get("DIGEST_WINDOW_HOURS", 24),
+        current_app.config.get("DIGEST_BATCH_SIZE", 200),
+    )
+    click.echo(f"Queued {result['emails']} digest(s) for {result['users']} member(s)")
+
+
+@email_cli.command("send-pending")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def send_pending(max_batches):
+    """Deliver due outbox emails now, in the foreground, until none are left."""
+    outbox = current_app.extensions["email_outbox"]
+    batches = handled = 0
+    while max_batches is None or batches < max_batches:
+        count = outbox.process_batch()
+        if not count:
+            break
+        batches += 1
+        handled += count
+    stats = outbox.stats()
+    click.echo(f"Handled {handled} email(s): {stats['sent']} sent, {stats['retried']} to retry, {stats['failed']} failed")
+
+
+@mpesa_cli.command("process-callbacks")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def process_callbacks(max_batches):
+    """Apply due M-Pesa callbacks now, in the foreground, until none are left."""
+    inbox = current_app.extensions["mpesa_callbacks"]
+    batches = handled = 0
+    while max_batches is None or batches < max_batches:
+        count = inbox.process_batch()
+        if not count:
+            break
+        batches += 1
+        handled += count
+    stats = inbox.stats()
+    click.echo(
+        f"Handled {handled} callback(s): {stats['processed']} processed, {stats['ignored']} ignored, "
+        f"{stats['retried']} to retry, {stats['failed']} failed"
+    )
+
+
+@mpesa_cli.command("reconcile-stk")
+@click.option("--after-minutes", type=int, default=None, help="Override MPESA_STK_RECONCILE_AFTER.")
+@click.option("--rate", type=float, default=None, help="Override MPESA_STK_QUERY_RATE (queries per second).")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def reconcile_stk(after_minutes, rate, max_batches):
+    """Query Daraja for STK pushes whose callback never arrived."""
+    result = reconcile_stk_pushes_from_config(
+        current_app.config, after_minutes=after_minutes, rate=rate, max_batches=max_batches
+    )
+    click.echo(
+        f"Queried {result['queried']} push(es) in {result['seconds']}s: {result['settled']} settled, "
+        f"{result['still_pending']} still pending, {result['errors']} error(s), {result['expired']} expired"
+    )
+
+
+@mpesa_cli.command("reconcile-statement")
+@click.argument("group_id", type=int)
+@click.argument("statement", type=click.File("rb"))
+@click.option("--show", type=int, default=20, help="List at most this many receipts of each kind.")
+def reconcile_statement_command(group_id, statement, show):
+    """Compare a paybill statement CSV with a group's booked transactions."""
+    try:
+        report = reconcile_statement(group_id, statement)
+    except StatementError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(
+        f"{report['rows']} row(s), {report['receipts']} receipt(s) in {report['seconds']}s: "
+        f"{report['matched']} matched, {len(report['missing'])} missing (KES {report['missing_amount']:.2f}), "
+        f"{len(report['amount_mismatches'])} amount mismatch(es), "
+        f"{len(report['duplicates']['statement'])} repeated in the statement, "
+        f"{len(report['duplicates']['booked'])} booked more than once"
+    )
+    for item in report["missing"][:show]:
+        click.echo(f"  missing   {item['receipt']}  {item['amount']:.2f}")
+    for item in report["amount_mismatches"][:show]:
+        click.echo(f"  mismatch  {item['receipt']}  statement {item['statement_amount']:.2f}, booked {item['booked_amount']:.2f}")
+    for receipt in report["duplicates"]["booked"][:show]:
+        click.echo(f"  duplicate {receipt}")
+
+
+@mpesa_cli.command("dispatch-disbursements")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def dispatch_disbursements(max_batches):
+    """Send due B2C payouts now, in the foreground, at the configured rate."""
+    dispatcher = current_app.extensions["disbursements"]
+    batches = handled = 0
+    while max_batches is None or batches < max_batches:
+        count = dispatcher.process_batch()
+        if not count:
+            break
+        batches += 1
+        handled += count
+    stats = dispatcher.stats()
+    click.echo(
+        f"Handled {handled} payout(s): {stats['sent']} sent, {stats['retried']} to retry, "
+        f"{stats['failed']} failed, {stats['unknown']} with unknown outcome"
+    )
+
+
+@mpesa_cli.command("requeue-disbursement")
+@click.argument("disbursement_id", type=int)
+def requeue_disbursement(disbursement_id):
+    """Queue a failed payout again, once M-Pesa shows it never went out."""
+    disbursement = db.session.get(Disbursement, disbursement_id)
+    if not disbursement:
+        raise click.ClickException(f"No disbursement {disbursement_id}")
+    if disbursement.status != FAILED:
+        raise click.ClickException(f"Disbursement {disbursement_id} is {disbursement.status}, not failed")
+    requeue(disbursement)
+    db.session.commit()
+    click.echo(f"Requeued disbursement {disbursement_id}")
+
+
+def _hot_queries(group_id, user_id):
+    """The main query behind each hot endpoint, keyed by a readable name."""
+    return {
+        "log_contribution: duplicate receipt": Transaction.query.filter_by(reference="CHECK-PLAN"),
+        "get_all_transactions": Transaction.query.filter_by(group_id=group_id).order_by(Transaction.date.desc()),
+        "group credits since date": db.session.query(db.func.sum(Transaction.amount)).filter(
+            Transaction.group_id == group_id,
+            Transaction.type == TransactionType.CREDIT,
+            Transaction.date >= db.func.now()
+        ),
+        "get_contributions": Contribution.query.filter_by(user_id=user_id, group_id=group_id),
+        "get_notifications": Notification.query.filter_by(user_id=user_id, group_id=group_id)
+            .order_by(Notification.date.desc()),
+        "get_unread_count": NotificationCounter.query.filter_by(user_id=user_id, group_id=group_id),
+        "withdraw_request: pending check": WithdrawalRequest.query.filter_by(
+            group_id=group_id, status=WithdrawalStatus.PENDING
+        ),
+        "approve_withdrawal: vote count": db.session.query(db.func.count(WithdrawalVotes.id)).filter(
+            WithdrawalVotes.withdrawal_id == 1, WithdrawalVotes.vote == "approve"
+        ),
+        "account_summary: active loans": Loan.query.filter(
+            Loan.user_id == user_id, Loan.status == LoanStatus.DISBURSED
+        ),
+    }
+
+
+@perf_cli.command("check-plans")
+@click.option("--group-id", type=int, default=None, help="Group to plan against (defaults to the first group).")
+@click.option("--verbose", is_flag=True, help="Print every plan.")
+def check_plans(group_id, verbose):
+    """
+    Run EXPLAIN on each hot endpoint query and fail if any falls back to a
+    sequential scan. Sequential scans are disabled for the session so tables
+    with few rows still show which index the planner can use.
+    Requires PostgreSQL.
+    """
+    if db.engine.dialect.name != "postgresql":
+        click.echo("check-plans needs PostgreSQL", err=True)
+        sys.exit(2)
+
+    group = db.session.get(Group, group_id) if group_id else Group.query.order_by(Group.id).first()
+    if not group:
+        click.echo("No group to plan against; seed some data first", err=True)
+        sys.exit(2)
+
+    db.session.execute(db.text("SET LOCAL enable_seqscan = off"))
+
+    failures = []
+    for name, query in _hot_queries(group.id, group.admin_id).items():
+        sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+        plan = "\n".join(row[0] for row in db.session.execute(db.text(f"EXPLAIN {sql}")))
+        seq_scans = re.findall(r"Seq Scan on (\w+)", plan)
+        status = "FAIL" if seq_scans else "ok"
+        click.echo(f"[{status}] {name}" + (f" (seq scan on {', '.join(seq_scans)})" if seq_scans else ""))
+        if verbose or seq_scans:
+            click.echo(plan)
+        if seq_scans:
+            failures.append(name)
+
+    db.session.rollback()
+    if failures:
+        click.echo(f"{len(failures)} query plan(s) fell back to a sequential scan", err=True)
+        sys.exit(1)
+
+
+@perf_cli.command("member-figures-queries")
+@click.option("--sizes", default="5,50,500", help="Comma-separated member counts to try.")
+def member_figures_queries(sizes):
+    """
+    Count the SQL statements the admin dashboard and the contribution streaks
+    issue for groups of different sizes, and fail if the count grows with the
+    member count. Each size seeds a throwaway group in an open transaction
+    that is rolled back, so nothing is left behind.
+    """
+    from sqlalchemy import event
+    from flask_jwt_extended import create_access_token, verify_jwt_in_request
+    from app.routes.admin import get_admin_dashboard
+    from app.routes.contributions import get_contribution_streaks
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    views = {
+        "admin_dashboard": lambda group: get_admin_dashboard(group.id),
+        "contribution_streaks": lambda group: get_contribution_streaks(),
+    }
+    counts = {name: {} for name in views}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for size in [int(size) for size in sizes.split(",")]:
+        admin = User(name="perf admin", email=f"perf-admin-{size}@example.invalid", is_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        group = Group(name=f"perf group {size}", admin_id=admin.id, daily_contribution_amount=10)
+        db.session.add(group)
+        db.session.flush()
+        admin.group_id = group.id
+        db.session.flush()
+        members = [
+            User(name=f"perf member {n}", email=f"perf-{size}-{n}@example.invalid", group_id=group.id)
+            for n in range(size)
+        ]
+        db.session.add_all(members)
+        db.session.flush()
+        db.session.add_all(
+            Transaction(user_id=member.id, group_id=group.id, amount=10.0 * (n % 7), date=now,
+                        type=TransactionType.CREDIT, reason=TransactionReason.CONTRIBUTION)
+            for n, member in enumerate(members)
+        )
+        db.session.flush()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+
+        for name, view in views.items():
+            db.session.expire_all()  # start every view from a cold session, as a request would
+            with current_app.test_request_context(headers=headers):
+                verify_jwt_in_request()  # refreshes the token revocation list now, not mid-count
+                event.listen(db.engine, "before_cursor_execute", count)
+                try:
+                    view(group)
+                finally:
+                    event.remove(db.engine, "before_cursor_execute", count)
+            counts[name][size] = len(statements)
+            statements.clear()
+        db.session.rollback()
+
+    failed = False
+    for name, by_size in counts.items():
+        constant = len(set(by_size.values())) == 1
+        failed = failed or not constant
+        listed = ", ".join(f"{size} members: {n}" for size, n in by_size.items())
+        click.echo(f"{'ok  ' if constant else 'GROWS'} {name}: {listed}")
+    if failed:
+        sys.exit(1)
+
+
+def _legacy_summary_figures(user_id, group_id, first_day, now):
+    """The account summary's aggregates as they were read before, one query each, for comparison."""
+    def total(query):
+        return query.scalar() or 0.0
+
+    contributions = db.session.query(db.func.sum(Contribution.amount)).filter(Contribution.group_id == group_id)
+    this_month = (Contribution.date >= first_day, Contribution.date <= now)
+    debits = db.session.query(db.func.sum(Transaction.amount)).filter(
+        Transaction.group_id == group_id, Transaction.type == TransactionType.DEBIT
+    )
+
+    monthly = total(contributions.filter(Contribution.user_id == user_id, *this_month))
+    group_total = total(contributions)
+    group_monthly = total(contributions.filter(*this_month))
+    withdrawals = total(debits.join(WithdrawalRequest, WithdrawalRequest.transaction_id == Transaction.id).filter(
+        WithdrawalRequest.status.in_([WithdrawalStatus.COMPLETED, WithdrawalStatus.APPROVED])
+    ))
+    disbursed = total(debits.filter(db.func.lower(Transaction.reason) == TransactionReason.LOAN_DISBURSEMENT))
+    repaid = total(db.session.query(db.func.sum(Transaction.amount)).filter(
+        Transaction.group_id == group_id,
+        Transaction.type == TransactionType.CREDIT,
+        db.func.lower(Transaction.reason) == TransactionReason.LOAN_REPAYMENT
+    ))
+
+    return {
+        "monthly_contributed": float(monthly),
+        "group_monthly_contributions": float(group_monthly),
+        "group_total_contributions": float(group_total),
+        "adjusted_group_funds": float(group_total - withdrawals - disbursed + repaid),
+    }
+
+
+@perf_cli.command("account-summary")
+@click.option("--members", type=int, default=50, help="Members in the seeded group.")
+@click.option("--days", type=int, default=365, help="Days of daily contributions per member.")
+@click.option("--runs", type=int, default=200, help="Timed calls of each implementation.")
+def account_summary_benchmark(members, days, runs):
+    """
+    Time the account summary's aggregates read one query at a time, as they
+    used to be, against the single statement the endpoint now issues, and
+    fail if the two disagree. Seeds a throwaway group with a year of daily
+    contributions in an open transaction that is rolled back afterwards.
+    """
+    import statistics
+    import time
+    from sqlalchemy import event
+    from app.routes.user import _summary_figures
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    first_day = datetime.datetime(now.year, now.month, 1, tzinfo=datetime.timezone.utc)
+
+    admin = User(name="perf admin", email="perf-summary-admin@example.invalid", is_admin=True)
+    db.session.add(admin)
+    db.session.flush()
+    group = Group(name="perf summary group", admin_id=admin.id, daily_contribution_amount=10)
+    db.session.add(group)
+    db.session.flush()
+    users = [admin] + [
+        User(name=f"perf member {n}", email=f"perf-summary-{n}@example.invalid", group_id=group.id)
+        for n in range(members - 1)
+    ]
+    admin.group_id = group.id
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.execute(db.insert(Contribution), [
+        {"user_id": user.id, "group_id": group.id, "amount": 10.0 + n % 5,
+         "date": now - datetime.timedelta(days=day), "status": ContributionStatus.PAID}
+        for n, user in enumerate(users) for day in range(days)
+    ])
+    recompute_group_balance(group.id)
+
+    implementations = {"per-aggregate queries": _legacy_summary_figures, "single statement": _summary_figures}
+    results = {}
+    try:
+        for name, figures_for in implementations.items():
+            timings = []
+            event.listen(db.engine, "before_cursor_execute", count)
+            try:
+                for run in range(runs):
+                    started = time.perf_counter()
+                    figures = figures_for(users[run % len(users)].id, group.id, first_day, now)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", count)
+            results[name] = figures
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            click.echo(
+                f"{name}: {len(statements) / runs:.0f} statement(s), "
+                f"mean {statistics.mean(timings):.2f} ms, p95 {p95:.2f} ms over {runs} call(s)"
+            )
+            statements.clear()
+    finally:
+        db.session.rollback()
+
+    before, after = results.values()
+    differing = [field for field in before if abs(before[field] - after[field]) > 0.005]
+    if differing:
+        click.echo(f"Figures differ: {', '.join(differing)}", err=True)
+        sys.exit(1)
+
+
+@perf_cli.command("smtp-throughput")
+@click.option("--count", type=int, default=200, help="Messages to send in each mode.")
+@click.option("--to", "recipient", default="sink@example.com", help="Recipient address.")
+@click.option("--batch-size", type=int, default=20, help="Messages per pooled batch.")
+def smtp_throughput(count, recipient, batch_size):
+    """
+    Compare messages/second for one SMTP connection per message (mail.send)
+    against the pooled, batched transport. Point MAIL_SERVER/MAIL_PORT at a
+    local SMTP sink first, e.g. `python -m aiosmtpd -n -l localhost:1025`.
+    """
+    import time
+    from app.utils.helpers import build_email_message
+
+    mail = current_app.extensions["mail"]
+    pool = current_app.extensions["smtp_pool"]
+    click.echo(f"Sending {count} message(s) per mode to {mail.server}:{mail.port}")
+
+    def message(i):
+        return build_email_message(f"Throughput test {i}", recipient, f"<p>Message {i}</p>")
+
+    started = time.perf_counter()
+    for i in range(count):
+        mail.send(message(i))
+    per_message = count / (time.perf_counter() - started)
+
+    pool.close_all()
+    started = time.perf_counter()
+    errors = 0
+    for start in range(0, count, batch_size):
+        results = pool.send_batch([message(i) for i in range(start, min(start + batch_size, count))])
+        errors += sum(1 for error in results if error)
+    pooled = count / (time.perf_counter() - started)
+
+    click.echo(f"connection per message: {per_message:8.1f} msg/s")
+    click.echo(f"pooled, batched:        {pooled:8.1f} msg/s ({pooled / per_message:.1f}x, {errors} error(s))")
+    click.echo(f"pool: {pool.stats()}")
+
+
+@perf_cli.command("payment-loop")
+@click.option("--count", type=int, default=100, help="STK pushes to send.")
+@click.option("--concurrency", type=int, default=10, help="Pushes in flight at once.")
+@click.option("--user-id", type=int, required=True, help="Member the pushes are for (needs a valid phone and group).")
+@click.option("--amount", type=float, default=10, help="Amount per push.")
+@click.option("--timeout", type=int, default=120, help="Seconds to wait for the callbacks to be booked.")
+def payment_loop(count, concurrency, user_id, amount, timeout):
+    """
+    Benchmark the whole STK push loop: push, Daraja callback, inbox, booking.
+    Run daraja_simulator.py with --callback-base pointing at the running app
+    and set MPESA_BASE_URL to the simulator, for this command and the app.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.models import MpesaCallback
+    from app.utils.mpesa import initiate_stk_push
+
+    app = current_app._get_current_object()
+    click.echo(f"Sending {count} STK push(es), {concurrency} at a time, to {app.extensions['daraja'].base_url}")
+
+    def push(_):
+        with app.app_context():
+            started = time.perf_counter()
+            response = initiate_stk_push(user_id, amount)
+            return time.perf_counter() - started, response.get("ResponseCode") == "0"
+
+    since = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(push, range(count)))
+    push_seconds = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    accepted = sum(1 for _, ok in results if ok)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    click.echo(f"pushes:   {count / push_seconds:8.1f} req/s, {accepted} accepted, "
+               f"p50 {percentile(0.5):.0f} ms, p95 {percentile(0.95):.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+
+    received = booked = 0
+    while time.perf_counter() - started < timeout:
+        db.session.rollback()  # see rows committed by the app since the last poll
+        rows = db.session.query(MpesaCallback.status, db.func.count(MpesaCallback.id)).filter(
+            MpesaCallback.kind == "stk", MpesaCallback.received_at >= since
+        ).group_by(MpesaCallback.status).all()
+        received = sum(n for _, n in rows)
+        booked = sum(n for status, n in rows if status != "pending")
+        if booked >= accepted:
+            break
+        time.sleep(0.5)
+    elapsed = time.perf_counter() - started
+    click.echo(f"loop:     {received} callback(s) received, {booked} applied in {elapsed:.1f}s "
+               f"({booked / elapsed:.1f} payments/s end to end)")
+
+
+@auth_cli.command("purge-revoked-tokens")
+@click.option("--batch-size", type=int, default=None, help="Override TOKEN_REVOCATION_PURGE_BATCH_SIZE.")
+def purge_revoked_tokens(batch_size):
+    """Delete revocations of tokens that have expired anyway."""
+    revocations = current_app.extensions["token_revocations"]
+    deleted = revocations.purge(batch_size or current_app.config.get("TOKEN_REVOCATION_PURGE_BATCH_SIZE", 1000))
+    click.echo(f"Purged {deleted} expired token revocation(s)")
@@ -17,6 +17,13 @@ class Config:
     JWT_HEADER_NAME = "Authorization"
     JWT_HEADER_TYPE = "Bearer"
 
+    # Logged-out tokens: checked against an in-process copy, refreshed from the DB at most this often
+    TOKEN_REVOCATION_ENABLED = os.getenv("TOKEN_REVOCATION_ENABLED", "True").lower() in ("true", "1", "yes")
+    TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", 5))  # seconds
+    TOKEN_REVOCATION_SYNC_OVERLAP = int(os.getenv("TOKEN_REVOCATION_SYNC_OVERLAP", 60))  # seconds re-read each sync, for lagging writers
+    TOKEN_REVOCATION_PURGE_INTERVAL = int(os.getenv("TOKEN_REVOCATION_PURGE_INTERVAL", 3600))  # seconds; 0 = run from cron/CLI only
+    TOKEN_REVOCATION_PURGE_BATCH_SIZE = int(os.getenv("TOKEN_REVOCATION_PURGE_BATCH_SIZE", 1000))
+
     # M-Pesa API Credentials
     MPESA_CONSUMER_KEY = os.getenv("MPESA_CONSUMER_KEY")
     MPESA_CONSUMER_SECRET = os.getenv("MPESA_CONSUMER_SECRET")
@@ -32,6 +39,53 @@ class Config:
     MPESA_B2C_TIMEOUT_URL = os.getenv("MPESA_B2C_TIMEOUT_URL")
     MPESA_B2C_RESULT_URL = os.getenv("MPESA_B2C_RESULT_URL")
 
+    # Daraja OAuth token cache ("redis" shares one token and its refresh across workers)
+    MPESA_TOKEN_CACHE_BACKEND = os.getenv("MPESA_TOKEN_CACHE_BACKEND", "memory")
+    MPESA_TOKEN_REDIS_URL = os.getenv("MPESA_TOKEN_REDIS_URL", os.getenv("SUMMARY_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    MPESA_TOKEN_REFRESH_MARGIN = int(os.getenv("MPESA_TOKEN_REFRESH_MARGIN", 60))  # seconds before expires_in to refresh
+
+    # Daraja HTTP client (one pooled session shared by OAuth, STK push and B2C)
+    # Point MPESA_BASE_URL at daraja_simulator.py (e.g. http://localhost:8089) for local load tests
+    MPESA_BASE_URL = os.getenv("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke")
+    MPESA_OAUTH_URL = os.getenv("MPESA_OAUTH_URL")  # optional full-URL overrides of the paths under MPESA_BASE_URL
+    MPESA_STK_URL = os.getenv("MPESA_STK_URL")
+    MPESA_STK_QUERY_URL = os.getenv("MPESA_STK_QUERY_URL")
+    MPESA_HTTP_CONNECT_TIMEOUT = float(os.getenv("MPESA_HTTP_CONNECT_TIMEOUT", 3.05))
+    MPESA_HTTP_READ_TIMEOUT = float(os.getenv("MPESA_HTTP_READ_TIMEOUT", 15))
+    MPESA_HTTP_MAX_RETRIES = int(os.getenv("MPESA_HTTP_MAX_RETRIES", 2))  # idempotent calls only
+    MPESA_HTTP_BACKOFF = float(os.getenv("MPESA_HTTP_BACKOFF", 0.5))  # seconds, doubled per retry with jitter
+    MPESA_HTTP_POOL_SIZE = int(os.getenv("MPESA_HTTP_POOL_SIZE", 10))
+
+    # "async" runs Daraja calls on a worker pool and answers with a pending job id
+    MPESA_CALL_MODE = os.getenv("MPESA_CALL_MODE", "sync")
+    MPESA_WORKERS = int(os.getenv("MPESA_WORKERS", 8))
+    MPESA_JOB_QUEUE_LIMIT = int(os.getenv("MPESA_JOB_QUEUE_LIMIT", 32))  # waiting calls beyond the workers before 503
+
+    # Callback inbox: Daraja callbacks are stored on arrival and applied in batches
+    MPESA_CALLBACK_WORKER = os.getenv("MPESA_CALLBACK_WORKER", "True").lower() in ("true", "1", "yes")
+    MPESA_CALLBACK_BATCH_SIZE = int(os.getenv("MPESA_CALLBACK_BATCH_SIZE", 100))
+    MPESA_CALLBACK_POLL_INTERVAL = float(os.getenv("MPESA_CALLBACK_POLL_INTERVAL", 1))
+    MPESA_CALLBACK_MAX_ATTEMPTS = int(os.getenv("MPESA_CALLBACK_MAX_ATTEMPTS", 5))
+    MPESA_CALLBACK_BACKOFF_BASE = int(os.getenv("MPESA_CALLBACK_BACKOFF_BASE", 5))  # seconds, doubles per attempt
+    MPESA_CALLBACK_BACKOFF_MAX = int(os.getenv("MPESA_CALLBACK_BACKOFF_MAX", 600))
+
+    # STK pushes whose callback never came are settled through the STK Push Query API
+    MPESA_STK_RECONCILE_INTERVAL = int(os.getenv("MPESA_STK_RECONCILE_INTERVAL", 60))  # seconds; 0 = run from cron/CLI only
+    MPESA_STK_RECONCILE_AFTER = int(os.getenv("MPESA_STK_RECONCILE_AFTER", 3))  # minutes without a callback before asking
+    MPESA_STK_RECONCILE_BATCH_SIZE = int(os.getenv("MPESA_STK_RECONCILE_BATCH_SIZE", 50))
+    MPESA_STK_QUERY_RATE = float(os.getenv("MPESA_STK_QUERY_RATE", 2))  # queries per second
+    MPESA_STK_EXPIRE_HOURS = int(os.getenv("MPESA_STK_EXPIRE_HOURS", 24))
+
+    # B2C payouts (loans, withdrawals) are queued and sent by a throttled dispatcher
+    MPESA_B2C_DISPATCHER = os.getenv("MPESA_B2C_DISPATCHER", "True").lower() in ("true", "1", "yes")
+    MPESA_B2C_RATE = float(os.getenv("MPESA_B2C_RATE", 2))  # requests per second, across the dispatcher's threads
+    MPESA_B2C_CONCURRENCY = int(os.getenv("MPESA_B2C_CONCURRENCY", 2))
+    MPESA_B2C_BATCH_SIZE = int(os.getenv("MPESA_B2C_BATCH_SIZE", 10))
+    MPESA_B2C_POLL_INTERVAL = float(os.getenv("MPESA_B2C_POLL_INTERVAL", 2))
+    MPESA_B2C_MAX_ATTEMPTS = int(os.getenv("MPESA_B2C_MAX_ATTEMPTS", 3))  # for payouts Daraja refused
+    MPESA_B2C_BACKOFF_BASE = int(os.getenv("MPESA_B2C_BACKOFF_BASE", 60))  # seconds, doubled per attempt
+    MPESA_B2C_CLAIM_TIMEOUT = int(os.getenv("MPESA_B2C_CLAIM_TIMEOUT", 300))
+
     #  Email (Flask-Mail)
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
@@ -44,6 +98,10 @@ class Config:
         os.getenv("MAIL_NAME", "Maziwa"),
         os.getenv("MAIL_USERNAME")
     )
+    # Persistent SMTP connections shared by the outbox worker and send_email
+    MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))
+    MAIL_POOL_IDLE_TIMEOUT = int(os.getenv("MAIL_POOL_IDLE_TIMEOUT", 30))  # seconds before an idle connection is replaced
+
     # Useful in testing to avoid actually sending emails
     MAIL_SUPPRESS_SEND = os.getenv("MAIL_SUPPRESS_SEND", "False").lower() in ("true", "1", "yes")
 
@@ -59,6 +117,39 @@ class Config:
     GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:5173/auth/google/callback")
 
 
+    # Account summary cache ("memory" for a per-process LRU, "redis" to share it across workers)
+    SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+    SUMMARY_CACHE_BACKEND = os.getenv("SUMMARY_CACHE_BACKEND", "memory")
+    SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 60))  # seconds
+    SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 1024))  # entries, memory backend only
+    SUMMARY_CACHE_REDIS_URL = os.getenv("SUMMARY_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Per-process phone -> (user, group) cache used to match M-Pesa callbacks to members
+    PHONE_LOOKUP_CACHE_ENABLED = os.getenv("PHONE_LOOKUP_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+    PHONE_LOOKUP_CACHE_SIZE = int(os.getenv("PHONE_LOOKUP_CACHE_SIZE", 4096))  # entries
+    PHONE_LOOKUP_CACHE_TTL = int(os.getenv("PHONE_LOOKUP_CACHE_TTL", 300))  # seconds
+
+    # Notification retention: read notifications older than this are archived (or deleted) in batches
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+    NOTIFICATION_RETENTION_MODE = os.getenv("NOTIFICATION_RETENTION_MODE", "archive")  # "archive" or "delete"
+    NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv("NOTIFICATION_PURGE_BATCH_SIZE", 1000))
+    NOTIFICATION_PURGE_PAUSE = float(os.getenv("NOTIFICATION_PURGE_PAUSE", 0.1))  # seconds between batches
+    NOTIFICATION_PURGE_INTERVAL = int(os.getenv("NOTIFICATION_PURGE_INTERVAL", 0))  # seconds; 0 = run from cron/CLI only
+
+    # Email outbox: mail is queued in the request's transaction and sent by a background worker
+    EMAIL_OUTBOX_WORKER = os.getenv("EMAIL_OUTBOX_WORKER", "True").lower() in ("true", "1", "yes")
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 20))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", 2))  # seconds
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 6))
+    EMAIL_OUTBOX_BACKOFF_BASE = int(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE", 30))  # seconds, doubles per attempt
+    EMAIL_OUTBOX_BACKOFF_MAX = int(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX", 3600))
+    EMAIL_OUTBOX_CLAIM_TIMEOUT = int(os.getenv("EMAIL_OUTBOX_CLAIM_TIMEOUT", 300))  # retry claims a dead worker left behind
+
+    # Notification email digests for members on "digest" delivery
+    DIGEST_WINDOW_HOURS = int(os.getenv("DIGEST_WINDOW_HOURS", 24))
+    DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", 200))  # members per commit
+    DIGEST_INTERVAL = int(os.getenv("DIGEST_INTERVAL", 0))  # seconds; 0 = run from cron/CLI only
+
     # Token expiration defaults (seconds) can be tweaked
     EMAIL_CONFIRMATION_EXPIRATION = int(os.getenv("EMAIL_CONFIRMATION_EXPIRATION", 3600))  # 1 hour
     PASSWORD_RESET_EXPIRATION = int(os.getenv("PASSWORD_RESET_EXPIRATION", 3600))  # 1 hour
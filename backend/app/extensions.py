@@ -3,7 +3,26 @@ from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 from flask_mail import Mail
 from app.models import db
+from app.utils.cache import SummaryCache, PhoneLookupCache
+from app.utils.email_outbox import EmailOutboxWorker
+from app.utils.smtp_pool import SMTPPool
+from app.utils.mpesa_token import MpesaTokenCache
+from app.utils.daraja import DarajaClient
+from app.utils.mpesa_jobs import MpesaJobRunner
+from app.utils.mpesa_callbacks import MpesaCallbackWorker
+from app.utils.disbursements import DisbursementDispatcher
+from app.utils.revocation import TokenRevocationList
 
 jwt = JWTManager()
+token_revocations = TokenRevocationList()
 socketio = SocketIO(cors_allowed_origins="*")
-mail = Mail()
\ No newline at end of file
+mail = Mail()
+smtp_pool = SMTPPool()
+summary_cache = SummaryCache()
+phone_lookup_cache = PhoneLookupCache()
+email_outbox = EmailOutboxWorker()
+mpesa_token_cache = MpesaTokenCache()
+daraja = DarajaClient(token_cache=mpesa_token_cache)
+mpesa_jobs = MpesaJobRunner()
+mpesa_callbacks = MpesaCallbackWorker()
+disbursements = DisbursementDispatcher()
@@ -0,0 +1,28 @@
+"""Add email delivery preference and digest timestamp to user
+
+Revision ID: 0b7e4d92c3f1
+Revises: f6d1a39c8e25
+Create Date: 2026-10-18 19:16:03.482915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e4d92c3f1'
+down_revision = 'f6d1a39c8e25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_delivery', sa.String(length=10), server_default='digest', nullable=False))
+        batch_op.add_column(sa.Column('digest_sent_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('digest_sent_at')
+        batch_op.drop_column('email_delivery')
@@ -0,0 +1,36 @@
+"""Add group_balance table
+
+Revision ID: 3f9a1c7d2e54
+Revises: 07c4cf1eea33
+Create Date: 2026-10-18 09:12:41.207113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7d2e54'
+down_revision = '07c4cf1eea33'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group_balance',
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('total_contributions', sa.Float(), nullable=False),
+    sa.Column('total_withdrawals', sa.Float(), nullable=False),
+    sa.Column('loans_disbursed', sa.Float(), nullable=False),
+    sa.Column('loans_repaid', sa.Float(), nullable=False),
+    sa.Column('outstanding_principal', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+    sa.PrimaryKeyConstraint('group_id')
+    )
+    # Rows are built lazily from the source tables on first read,
+    # or all at once with `flask ledger rebuild-balances`.
+
+
+def downgrade():
+    op.drop_table('group_balance')
@@ -0,0 +1,40 @@
+"""Add mpesa_job table
+
+Revision ID: 4c8a2f61d0e7
+Revises: 0b7e4d92c3f1
+Create Date: 2026-10-18 20:37:45.219063
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8a2f61d0e7'
+down_revision = '0b7e4d92c3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mpesa_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('http_status', sa.Integer(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('mpesa_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mpesa_job_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mpesa_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mpesa_job_user_id'))
+
+    op.drop_table('mpesa_job')
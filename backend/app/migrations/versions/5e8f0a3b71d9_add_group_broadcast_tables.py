@@ -0,0 +1,50 @@
+"""Add group_broadcast and broadcast_receipt tables
+
+Revision ID: 5e8f0a3b71d9
+Revises: c41d7e0b9a26
+Create Date: 2026-10-18 16:31:52.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8f0a3b71d9'
+down_revision = 'c41d7e0b9a26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group_broadcast',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('message', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('excluded_user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['excluded_user_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('group_broadcast', schema=None) as batch_op:
+        batch_op.create_index('ix_group_broadcast_group_date', ['group_id', 'date'], unique=False)
+
+    op.create_table('broadcast_receipt',
+    sa.Column('broadcast_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('read', sa.Boolean(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['broadcast_id'], ['group_broadcast.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('broadcast_id', 'user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('broadcast_receipt')
+    with op.batch_alter_table('group_broadcast', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_broadcast_group_date')
+
+    op.drop_table('group_broadcast')
@@ -0,0 +1,58 @@
+"""Add disbursement queue table
+
+Revision ID: 7e1c5a09b4d2
+Revises: d3f7b1e9a524
+Create Date: 2026-10-18 21:48:31.905562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1c5a09b4d2'
+down_revision = 'd3f7b1e9a524'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('disbursement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('loan_id', sa.Integer(), nullable=True),
+    sa.Column('withdrawal_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('phone', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('reason', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('originator_conversation_id', sa.String(length=50), nullable=True),
+    sa.Column('conversation_id', sa.String(length=50), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+    sa.ForeignKeyConstraint(['loan_id'], ['loan.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['withdrawal_id'], ['withdrawal_request.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('loan_id'),
+    sa.UniqueConstraint('originator_conversation_id'),
+    sa.UniqueConstraint('withdrawal_id')
+    )
+    with op.batch_alter_table('disbursement', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_disbursement_conversation_id'), ['conversation_id'], unique=False)
+        batch_op.create_index('ix_disbursement_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('disbursement', schema=None) as batch_op:
+        batch_op.drop_index('ix_disbursement_status_next_attempt')
+        batch_op.drop_index(batch_op.f('ix_disbursement_conversation_id'))
+
+    op.drop_table('disbursement')
@@ -0,0 +1,34 @@
+"""Add member_month_total table
+
+Revision ID: 8b2e6d41c0fa
+Revises: 3f9a1c7d2e54
+Create Date: 2026-10-18 11:40:03.518270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6d41c0fa'
+down_revision = '3f9a1c7d2e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('member_month_total',
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('year_month', sa.String(length=7), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('group_id', 'year_month', 'user_id')
+    )
+    # The (group_id, year_month, user_id) primary key doubles as the month lookup index.
+    # Existing history is loaded with `flask ledger backfill-month-totals`.
+
+
+def downgrade():
+    op.drop_table('member_month_total')
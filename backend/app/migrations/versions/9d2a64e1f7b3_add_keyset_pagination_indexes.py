@@ -0,0 +1,38 @@
+"""Add keyset pagination indexes
+
+Revision ID: 9d2a64e1f7b3
+Revises: 5e8f0a3b71d9
+Create Date: 2026-10-18 16:42:08.315027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2a64e1f7b3'
+down_revision = '5e8f0a3b71d9'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_transaction_group_date_id', 'transaction', ['group_id', 'date', 'id']),
+    ('ix_transaction_user_date_id', 'transaction', ['user_id', 'date', 'id']),
+    ('ix_notification_user_group_date_id', 'notification', ['user_id', 'group_id', 'date', 'id']),
+    ('ix_notification_group_date_id', 'notification', ['group_id', 'date', 'id']),
+    ('ix_announcement_group_date_id', 'announcement', ['group_id', 'date', 'id']),
+]
+
+
+def upgrade():
+    # Build concurrently so the live tables stay writable while the indexes are created
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,28 @@
+"""Add transaction_id to stk_push_request
+
+Revision ID: a3d8e1c6b7f2
+Revises: f1b7c3e5a920
+Create Date: 2026-10-19 10:02:17.845163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d8e1c6b7f2'
+down_revision = 'f1b7c3e5a920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stk_push_request', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('transaction_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_stk_push_request_transaction_id', 'transaction', ['transaction_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('stk_push_request', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_stk_push_request_transaction_id', type_='foreignkey')
+        batch_op.drop_column('transaction_id')
@@ -0,0 +1,32 @@
+"""Add notification_counter table
+
+Revision ID: a7c3e95d2b18
+Revises: 9d2a64e1f7b3
+Create Date: 2026-10-18 17:20:44.518903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e95d2b18'
+down_revision = '9d2a64e1f7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_counter',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('unread', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'group_id')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_counter')
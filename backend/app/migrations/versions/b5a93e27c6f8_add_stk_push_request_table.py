@@ -0,0 +1,46 @@
+"""Add stk_push_request table
+
+Revision ID: b5a93e27c6f8
+Revises: 7e1c5a09b4d2
+Create Date: 2026-10-18 22:34:57.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5a93e27c6f8'
+down_revision = '7e1c5a09b4d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stk_push_request',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('checkout_request_id', sa.String(length=100), nullable=False),
+    sa.Column('merchant_request_id', sa.String(length=100), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('phone', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('result_code', sa.Integer(), nullable=True),
+    sa.Column('result_desc', sa.String(length=255), nullable=True),
+    sa.Column('checks', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_checked_at', sa.DateTime(), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('checkout_request_id')
+    )
+    with op.batch_alter_table('stk_push_request', schema=None) as batch_op:
+        batch_op.create_index('ix_stk_push_request_status_created', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stk_push_request', schema=None) as batch_op:
+        batch_op.drop_index('ix_stk_push_request_status_created')
+
+    op.drop_table('stk_push_request')
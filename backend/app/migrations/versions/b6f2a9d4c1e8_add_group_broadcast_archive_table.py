@@ -0,0 +1,47 @@
+"""Add group_broadcast_archive table and retention index
+
+Revision ID: b6f2a9d4c1e8
+Revises: a3d8e1c6b7f2
+Create Date: 2026-10-19 10:41:55.307219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f2a9d4c1e8'
+down_revision = 'a3d8e1c6b7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group_broadcast_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('message', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('excluded_user_id', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('group_broadcast_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_group_broadcast_archive_group_id'), ['group_id'], unique=False)
+
+    # The purge scans broadcasts by date across groups
+    with op.get_context().autocommit_block():
+        op.create_index('ix_group_broadcast_date', 'group_broadcast', ['date'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_group_broadcast_date', table_name='group_broadcast',
+                      postgresql_concurrently=True, if_exists=True)
+
+    with op.batch_alter_table('group_broadcast_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_group_broadcast_archive_group_id'))
+
+    op.drop_table('group_broadcast_archive')
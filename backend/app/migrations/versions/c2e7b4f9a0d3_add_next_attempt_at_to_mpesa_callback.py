@@ -0,0 +1,35 @@
+"""Add next_attempt_at to mpesa_callback
+
+Revision ID: c2e7b4f9a0d3
+Revises: b6f2a9d4c1e8
+Create Date: 2026-10-19 11:20:48.661092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e7b4f9a0d3'
+down_revision = 'b6f2a9d4c1e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mpesa_callback', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+
+    # Callbacks already in the inbox are due now
+    callback = sa.table('mpesa_callback', sa.column('received_at', sa.DateTime), sa.column('next_attempt_at', sa.DateTime))
+    op.execute(callback.update().values(next_attempt_at=callback.c.received_at))
+
+    with op.batch_alter_table('mpesa_callback', schema=None) as batch_op:
+        batch_op.alter_column('next_attempt_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_mpesa_callback_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mpesa_callback', schema=None) as batch_op:
+        batch_op.drop_index('ix_mpesa_callback_status_next_attempt')
+        batch_op.drop_column('next_attempt_at')
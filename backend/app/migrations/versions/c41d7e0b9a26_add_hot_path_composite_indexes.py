@@ -0,0 +1,40 @@
+"""Add composite indexes for hot filter paths
+
+Revision ID: c41d7e0b9a26
+Revises: 8b2e6d41c0fa
+Create Date: 2026-10-18 14:05:19.662410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e0b9a26'
+down_revision = '8b2e6d41c0fa'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_transaction_group_type_date', 'transaction', ['group_id', 'type', 'date']),
+    ('ix_transaction_reference', 'transaction', ['reference']),
+    ('ix_contribution_group_user_date', 'contribution', ['group_id', 'user_id', 'date']),
+    ('ix_notification_user_group_read_date', 'notification', ['user_id', 'group_id', 'read', 'date']),
+    ('ix_withdrawal_votes_withdrawal_vote', 'withdrawal_votes', ['withdrawal_id', 'vote']),
+    ('ix_withdrawal_request_group_status', 'withdrawal_request', ['group_id', 'status']),
+    ('ix_loan_user_status', 'loan', ['user_id', 'status']),
+]
+
+
+def upgrade():
+    # Build concurrently so the live tables stay writable while the indexes are created
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
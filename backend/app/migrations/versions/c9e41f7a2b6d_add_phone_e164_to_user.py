@@ -0,0 +1,67 @@
+"""Add canonical phone_e164 to user and backfill it
+
+Revision ID: c9e41f7a2b6d
+Revises: b5a93e27c6f8
+Create Date: 2026-10-18 23:41:12.604381
+
+"""
+import logging
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e41f7a2b6d'
+down_revision = 'b5a93e27c6f8'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def _normalize_phone(phone):
+    # A copy of app.utils.phone.normalize_phone as of this revision, so the
+    # backfill does not change when the app's rules do
+    if phone is None:
+        return None
+
+    phone = str(phone).strip().replace(" ", "").lstrip("+")
+    if not phone:
+        return None
+    if phone.startswith("0") and len(phone) == 10:
+        phone = "254" + phone[1:]
+    elif not phone.startswith("254"):
+        phone = f"254{phone[-9:]}"
+
+    if re.fullmatch(r"254(7\d{8}|1\d{8})", phone):
+        return phone
+    return None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_e164', sa.String(length=15), nullable=True))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('phone', sa.String), sa.column('phone_e164', sa.String))
+    bind = op.get_bind()
+    seen = {}
+    for user_id, phone in bind.execute(sa.select(user.c.id, user.c.phone).where(user.c.phone.isnot(None)).order_by(user.c.id)):
+        phone_e164 = _normalize_phone(phone)
+        if not phone_e164:
+            continue
+        if phone_e164 in seen:
+            # Two spellings of one number; the older account keeps it
+            logger.warning(f"user {user_id}: phone {phone!r} is also user {seen[phone_e164]}'s, leaving phone_e164 empty")
+            continue
+        seen[phone_e164] = user_id
+        bind.execute(user.update().where(user.c.id == user_id).values(phone_e164=phone_e164))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_phone_e164'), ['phone_e164'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_phone_e164'))
+        batch_op.drop_column('phone_e164')
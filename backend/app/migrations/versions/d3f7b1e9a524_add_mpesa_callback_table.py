@@ -0,0 +1,41 @@
+"""Add mpesa_callback inbox table
+
+Revision ID: d3f7b1e9a524
+Revises: 4c8a2f61d0e7
+Create Date: 2026-10-18 21:12:08.640317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7b1e9a524'
+down_revision = '4c8a2f61d0e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mpesa_callback',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('dedupe_key', sa.String(length=100), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('received_at', sa.DateTime(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('dedupe_key')
+    )
+    with op.batch_alter_table('mpesa_callback', schema=None) as batch_op:
+        batch_op.create_index('ix_mpesa_callback_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mpesa_callback', schema=None) as batch_op:
+        batch_op.drop_index('ix_mpesa_callback_status_id')
+
+    op.drop_table('mpesa_callback')
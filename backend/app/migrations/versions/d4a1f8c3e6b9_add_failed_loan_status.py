@@ -0,0 +1,57 @@
+"""Add FAILED loan status and unwind loans whose payout failed
+
+Revision ID: d4a1f8c3e6b9
+Revises: c2e7b4f9a0d3
+Create Date: 2026-10-19 13:05:26.418730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a1f8c3e6b9'
+down_revision = 'c2e7b4f9a0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE loanstatus ADD VALUE IF NOT EXISTS 'FAILED'")
+
+    # Loans whose payout M-Pesa refused or rejected still held their principal,
+    # and those rejected after Daraja accepted them also had a DEBIT booked
+    loan = sa.table('loan', sa.column('id', sa.Integer), sa.column('group_id', sa.Integer), sa.column('amount', sa.Float),
+                    sa.column('outstanding', sa.Float), sa.column('status', sa.String),
+                    sa.column('disbursed_transaction_id', sa.Integer))
+    disbursement = sa.table('disbursement', sa.column('loan_id', sa.Integer), sa.column('status', sa.String),
+                            sa.column('outcome_unknown', sa.Boolean))
+    transaction = sa.table('transaction', sa.column('id', sa.Integer))
+    balance = sa.table('group_balance', sa.column('group_id', sa.Integer), sa.column('loans_disbursed', sa.Float),
+                       sa.column('outstanding_principal', sa.Float))
+
+    failed = bind.execute(
+        sa.select(loan.c.id, loan.c.group_id, loan.c.amount, loan.c.outstanding, loan.c.disbursed_transaction_id)
+        .join(disbursement, disbursement.c.loan_id == loan.c.id)
+        .where(disbursement.c.status == 'failed', sa.not_(disbursement.c.outcome_unknown),
+               loan.c.status == 'DISBURSED')
+    ).all()
+    for loan_id, group_id, amount, outstanding, transaction_id in failed:
+        disbursed = 0.0
+        if transaction_id:
+            bind.execute(loan.update().where(loan.c.id == loan_id).values(disbursed_transaction_id=None))
+            bind.execute(transaction.delete().where(transaction.c.id == transaction_id))
+            disbursed = amount
+        bind.execute(loan.update().where(loan.c.id == loan_id).values(status='FAILED', outstanding=0))
+        bind.execute(balance.update().where(balance.c.group_id == group_id).values(
+            loans_disbursed=balance.c.loans_disbursed - disbursed,
+            outstanding_principal=balance.c.outstanding_principal - outstanding
+        ))
+
+
+def downgrade():
+    # Postgres cannot drop an enum value; failed loans are left as they are
+    pass
@@ -0,0 +1,48 @@
+"""Add notification_archive table and retention index
+
+Revision ID: e2b5c8f41a67
+Revises: a7c3e95d2b18
+Create Date: 2026-10-18 18:05:37.120584
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b5c8f41a67'
+down_revision = 'a7c3e95d2b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=True),
+    sa.Column('message', sa.String(length=255), nullable=False),
+    sa.Column('read', sa.Boolean(), nullable=True),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_archive_user_id'), ['user_id'], unique=False)
+
+    # The purge scans read rows by date; build concurrently so notification stays writable
+    with op.get_context().autocommit_block():
+        op.create_index('ix_notification_read_date', 'notification', ['read', 'date'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notification_read_date', table_name='notification',
+                      postgresql_concurrently=True, if_exists=True)
+
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_archive_user_id'))
+
+    op.drop_table('notification_archive')
@@ -0,0 +1,39 @@
+"""Mark loans whose payout is not yet confirmed as pending
+
+Revision ID: e5b9c2d7f1a4
+Revises: d4a1f8c3e6b9
+Create Date: 2026-10-19 13:48:02.771359
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9c2d7f1a4'
+down_revision = 'd4a1f8c3e6b9'
+branch_labels = None
+depends_on = None
+
+# PENDING has been a loanstatus value since the loan table was created
+
+loan = sa.table('loan', sa.column('id', sa.Integer), sa.column('status', sa.String),
+                sa.column('disbursed_transaction_id', sa.Integer))
+disbursement = sa.table('disbursement', sa.column('loan_id', sa.Integer), sa.column('status', sa.String))
+
+
+def upgrade():
+    # Loans still queued, being sent, or failed with an unknown outcome, with no DEBIT booked
+    unpaid = sa.select(disbursement.c.loan_id).where(
+        disbursement.c.loan_id.isnot(None),
+        disbursement.c.status.in_(['queued', 'sending', 'sent', 'failed'])
+    )
+    op.execute(
+        loan.update()
+        .where(loan.c.status == 'DISBURSED', loan.c.disbursed_transaction_id.is_(None), loan.c.id.in_(unpaid))
+        .values(status='PENDING')
+    )
+
+
+def downgrade():
+    op.execute(loan.update().where(loan.c.status == 'PENDING').values(status='DISBURSED'))
@@ -0,0 +1,75 @@
+"""Key token_blacklist by jti with the token's expiry
+
+Revision ID: e8a2d6f04c17
+Revises: c9e41f7a2b6d
+Create Date: 2026-10-19 00:52:30.216904
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+import jwt
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2d6f04c17'
+down_revision = 'c9e41f7a2b6d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    carried = []
+    if sa.inspect(bind).has_table('token_blacklist'):
+        # Keep revocations of tokens that are still live; the rest can go
+        now = datetime.datetime.now(datetime.timezone.utc)
+        old = sa.table('token_blacklist', sa.column('token', sa.String), sa.column('created_at', sa.DateTime), sa.column('user_id', sa.Integer))
+        for token, created_at, user_id in bind.execute(sa.select(old.c.token, old.c.created_at, old.c.user_id)):
+            try:
+                claims = jwt.decode(token, options={"verify_signature": False})
+            except jwt.InvalidTokenError:
+                continue
+            if not claims.get("jti") or not claims.get("exp"):
+                continue
+            expires_at = datetime.datetime.fromtimestamp(claims["exp"], datetime.timezone.utc)
+            if expires_at > now:
+                carried.append({"jti": claims["jti"], "expires_at": expires_at, "created_at": created_at or now, "user_id": user_id})
+        op.drop_table('token_blacklist')
+
+    table = op.create_table('token_blacklist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('token_blacklist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_blacklist_jti'), ['jti'], unique=True)
+        batch_op.create_index(batch_op.f('ix_token_blacklist_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_token_blacklist_created_at'), ['created_at'], unique=False)
+
+    if carried:
+        op.bulk_insert(table, list({row["jti"]: row for row in carried}.values()))
+
+
+def downgrade():
+    # Revocations cannot be turned back into token strings; they are dropped
+    with op.batch_alter_table('token_blacklist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_blacklist_created_at'))
+        batch_op.drop_index(batch_op.f('ix_token_blacklist_expires_at'))
+        batch_op.drop_index(batch_op.f('ix_token_blacklist_jti'))
+
+    op.drop_table('token_blacklist')
+    op.create_table('token_blacklist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=500), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('token_blacklist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_blacklist_token'), ['token'], unique=True)
@@ -0,0 +1,38 @@
+"""Add outcome_unknown to disbursement
+
+Revision ID: f1b7c3e5a920
+Revises: e8a2d6f04c17
+Create Date: 2026-10-19 09:14:42.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7c3e5a920'
+down_revision = 'e8a2d6f04c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('disbursement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('outcome_unknown', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Failures recorded before this column existed whose error says the payout may have gone out
+    disbursement = sa.table('disbursement', sa.column('status', sa.String), sa.column('last_error', sa.Text), sa.column('outcome_unknown', sa.Boolean))
+    op.execute(
+        disbursement.update()
+        .where(disbursement.c.status == 'failed')
+        .where(sa.or_(
+            disbursement.c.last_error.like('No answer from Daraja%'),
+            disbursement.c.last_error.like('Dispatcher stopped while sending%')
+        ))
+        .values(outcome_unknown=True)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('disbursement', schema=None) as batch_op:
+        batch_op.drop_column('outcome_unknown')
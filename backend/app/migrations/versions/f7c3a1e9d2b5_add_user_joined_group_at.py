@@ -0,0 +1,40 @@
+"""Record when a user joined their group
+
+Revision ID: f7c3a1e9d2b5
+Revises: e5b9c2d7f1a4
+Create Date: 2026-10-19 15:12:40.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3a1e9d2b5'
+down_revision = 'e5b9c2d7f1a4'
+branch_labels = None
+depends_on = None
+
+user = sa.table('user', sa.column('id', sa.Integer), sa.column('group_id', sa.Integer),
+                sa.column('joined_group_at', sa.DateTime))
+join_request = sa.table('group_join_request', sa.column('user_id', sa.Integer), sa.column('group_id', sa.Integer),
+                        sa.column('status', sa.String), sa.column('date', sa.DateTime))
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('joined_group_at', sa.DateTime(), nullable=True))
+
+    # Members who joined by request: their latest approved request is the nearest record
+    # of when. Group creators have none and keep NULL, which leaves their feed unbounded.
+    approved_at = sa.select(sa.func.max(join_request.c.date)).where(
+        join_request.c.user_id == user.c.id,
+        join_request.c.group_id == user.c.group_id,
+        join_request.c.status == 'APPROVED'
+    ).scalar_subquery()
+    op.execute(user.update().where(user.c.group_id.isnot(None)).values(joined_group_at=approved_at))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('joined_group_at')
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 import datetime
 from enum import Enum
 import secrets
+from app.utils.phone import normalize_phone
 
 db = SQLAlchemy()
 
@@ -28,9 +30,11 @@ class GroupJoin(Enum):
     REJECTED = "rejected"
 
 class LoanStatus(Enum):
+    PENDING = "pending"  # approved, payout not yet confirmed by M-Pesa
     DISBURSED = "disbursed"
     REPAID = "repaid"
     PARTIALLY_REPAID = "partially_repaid"
+    FAILED = "failed"  # the payout never reached the borrower
 
 class TransactionReason:
     CONTRIBUTION = "contribution"
@@ -50,6 +54,8 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False, index=True)
     phone = db.Column(db.String(15), unique=True, nullable=True, index=True)
+    # phone in canonical 254XXXXXXXXX form, kept in step with phone; M-Pesa callbacks are matched on it
+    phone_e164 = db.Column(db.String(15), unique=True, nullable=True, index=True)
     password = db.Column(db.String(200), nullable=True)
 
     google_id = db.Column(db.String(255), unique=True, nullable=True)
@@ -57,11 +63,22 @@ class User(db.Model):
       
     is_admin = db.Column(db.Boolean, default=False)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=True)
+    # when the user joined group_id; group broadcasts from before it are not theirs (NULL: no bound)
+    joined_group_at = db.Column(db.DateTime, nullable=True)
     monthly_total = db.Column(db.Float, default=0.0)
     profile_photo = db.Column(db.String(255), nullable=True)
 
     is_verified = db.Column(db.Boolean, default=False, nullable=False)
 
+    # "immediate" emails each notification as it happens, "digest" batches them into one email per window
+    email_delivery = db.Column(db.String(10), default="digest", server_default="digest", nullable=False)
+    digest_sent_at = db.Column(db.DateTime, nullable=True)
+
+    @validates("phone")
+    def _normalize_phone(self, key, phone):
+        self.phone_e164 = normalize_phone(phone)
+        return phone
+
 class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -86,6 +103,10 @@ class Contribution(db.Model):
     user = db.relationship('User', backref=db.backref('contributions', lazy=True, cascade="all, delete-orphan"))
     group = db.relationship('Group', backref=db.backref('contributions', lazy=True, cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        db.Index("ix_contribution_group_user_date", "group_id", "user_id", "date"),
+    )
+
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -94,11 +115,17 @@ class Transaction(db.Model):
     type = db.Column(db.Enum(TransactionType), default=TransactionType.CREDIT, nullable=False)
     reason = db.Column(db.String(200), nullable=False)
     date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
-    reference = db.Column(db.String(50), nullable=True)
+    reference = db.Column(db.String(50), nullable=True, index=True)
 
     user = db.relationship('User', backref=db.backref('transactions', lazy=True, cascade="all, delete-orphan"))
     group = db.relationship('Group', backref=db.backref('transactions', lazy=True, cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        db.Index("ix_transaction_group_type_date", "group_id", "type", "date"),
+        db.Index("ix_transaction_group_date_id", "group_id", "date", "id"),
+        db.Index("ix_transaction_user_date_id", "user_id", "date", "id"),
+    )
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -111,10 +138,181 @@ class Notification(db.Model):
     user = db.relationship('User', backref=db.backref('notifications', lazy=True, cascade="all, delete-orphan"))
     group = db.relationship("Group", backref=db.backref("notifications", lazy=True, cascade="all, delete-orphan"))
 
-class TokenBlacklist(db.Model):
+    __table_args__ = (
+        db.Index("ix_notification_user_group_read_date", "user_id", "group_id", "read", "date"),
+        db.Index("ix_notification_user_group_date_id", "user_id", "group_id", "date", "id"),
+        db.Index("ix_notification_group_date_id", "group_id", "date", "id"),
+        db.Index("ix_notification_read_date", "read", "date"),
+    )
+
+class NotificationArchive(db.Model):
+    """Read notifications moved out of the live table by the retention job."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original notification id
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    group_id = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(255), nullable=False)
+    read = db.Column(db.Boolean, default=True)
+    type = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+
+
+class GroupBroadcast(db.Model):
+    """A group-wide notification stored once and merged into each member's feed at read time."""
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey("group.id"), nullable=False)
+    message = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    excluded_user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)  # e.g. the admin who triggered it
+
+    group = db.relationship("Group", backref=db.backref("broadcasts", lazy=True, cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        db.Index("ix_group_broadcast_group_date", "group_id", "date"),
+        db.Index("ix_group_broadcast_date", "date"),
+    )
+
+
+class GroupBroadcastArchive(db.Model):
+    """Group broadcasts moved out of the live table by the retention job; their receipts are dropped."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # original broadcast id
+    group_id = db.Column(db.Integer, nullable=False, index=True)
+    message = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    excluded_user_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+
+
+class BroadcastReceipt(db.Model):
+    """Per-member read/deleted state for a GroupBroadcast. No row means unread."""
+    broadcast_id = db.Column(db.Integer, db.ForeignKey("group_broadcast.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    read = db.Column(db.Boolean, default=False, nullable=False)
+    deleted = db.Column(db.Boolean, default=False, nullable=False)
+
+    broadcast = db.relationship("GroupBroadcast", backref=db.backref("receipts", lazy=True, cascade="all, delete-orphan"))
+    user = db.relationship("User", backref=db.backref("broadcast_receipts", lazy=True, cascade="all, delete-orphan"))
+
+
+class NotificationCounter(db.Model):
+    """Unread notification count per member and group, kept in step with notification writes."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey("group.id"), primary_key=True)
+    unread = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+
+
+class EmailOutbox(db.Model):
+    """Transactional email queued in the sender's transaction and delivered by a background worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    sender = db.Column(db.String(120), nullable=True)
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class MpesaJob(db.Model):
+    """An outbound Daraja call running on the M-Pesa worker pool; clients poll it or get a socket event."""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    kind = db.Column(db.String(30), nullable=False)  # stk_push, loan_repayment
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending, running, succeeded, failed
+    http_status = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+
+class MpesaCallback(db.Model):
+    """Raw Daraja callback, acknowledged on arrival and applied later by the callback worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # stk, b2c
+    dedupe_key = db.Column(db.String(100), nullable=True, unique=True)  # receipt:<MpesaReceiptNumber>, checkout:<id>, b2c:<id>
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending, processed, ignored, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_mpesa_callback_status_id", "status", "id"),
+        db.Index("ix_mpesa_callback_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class Disbursement(db.Model):
+    """A queued B2C payout for a loan or an approved withdrawal, sent by the disbursement dispatcher."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # loan, withdrawal
+    loan_id = db.Column(db.Integer, db.ForeignKey("loan.id"), nullable=True, unique=True)
+    withdrawal_id = db.Column(db.Integer, db.ForeignKey("withdrawal_request.id"), nullable=True, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)  # recipient
+    group_id = db.Column(db.Integer, db.ForeignKey("group.id"), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default="queued", nullable=False)  # queued, sending, sent, confirmed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    originator_conversation_id = db.Column(db.String(50), nullable=True, unique=True)
+    conversation_id = db.Column(db.String(50), nullable=True, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Set when a failed send may still have paid out; such a payout is only requeued by hand
+    outcome_unknown = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_disbursement_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class StkPushRequest(db.Model):
+    """An STK push Daraja accepted, kept until its callback (or the reconciler) settles it."""
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(500), nullable=False, unique=True, index=True)
+    checkout_request_id = db.Column(db.String(100), nullable=False, unique=True)
+    merchant_request_id = db.Column(db.String(100), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending, completed, failed, expired
+    result_code = db.Column(db.Integer, nullable=True)
+    result_desc = db.Column(db.String(255), nullable=True)
+    checks = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    last_checked_at = db.Column(db.DateTime, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    # Set when the reconciler booked the push, without a receipt, so its late callback can add one
+    transaction_id = db.Column(db.Integer, db.ForeignKey("transaction.id"), nullable=True)
+
+    transaction = db.relationship("Transaction")
+
+    __table_args__ = (
+        db.Index("ix_stk_push_request_status_created", "status", "created_at"),
+    )
+
+
+class TokenBlacklist(db.Model):
+    """An access token revoked before it expired, keyed by its jti. Rows past expires_at are purged."""
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
     user = db.relationship('User', backref=db.backref('blacklisted_tokens', lazy=True))
@@ -132,6 +330,10 @@ class WithdrawalRequest(db.Model):
     transaction = db.relationship('Transaction', backref=db.backref('withdrawal_request', uselist=False, cascade="all, delete-orphan"))
     group = db.relationship('Group', backref=db.backref('withdrawal_requests', lazy=True, cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        db.Index("ix_withdrawal_request_group_status", "group_id", "status"),
+    )
+
 
 class WithdrawalVotes(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -144,6 +346,10 @@ class WithdrawalVotes(db.Model):
     withdrawal = db.relationship("WithdrawalRequest", backref="votes")
     group = db.relationship('Group', backref=db.backref('withdrawalvotes', lazy=True, cascade="all, delete-orphan"))
 
+    __table_args__ = (
+        db.Index("ix_withdrawal_votes_withdrawal_vote", "withdrawal_id", "vote"),
+    )
+
 
 class GroupJoinRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -173,6 +379,10 @@ class Loan(db.Model):
     borrower = db.relationship('User', foreign_keys=[user_id], backref=db.backref('loans_borrowed', lazy=True))
     group = db.relationship('Group', backref=db.backref('loans', lazy=True))
 
+    __table_args__ = (
+        db.Index("ix_loan_user_status", "user_id", "status"),
+    )
+
     # Helper method to compute accrued amount
     def calculate_due_amount(self, as_of_date=None):
         if not as_of_date:
@@ -205,3 +415,54 @@ class Announcement(db.Model):
     date = db.Column(db.DateTime, default=datetime.datetime.now(datetime.timezone.utc))
 
     group = db.relationship("Group", backref="announcements")
+
+    __table_args__ = (
+        db.Index("ix_announcement_group_date_id", "group_id", "date", "id"),
+    )
+
+
+class GroupBalance(db.Model):
+    """Running money totals for a group, kept in step with every money movement."""
+    group_id = db.Column(db.Integer, db.ForeignKey("group.id"), primary_key=True)
+    total_contributions = db.Column(db.Float, default=0.0, nullable=False)
+    total_withdrawals = db.Column(db.Float, default=0.0, nullable=False)
+    loans_disbursed = db.Column(db.Float, default=0.0, nullable=False)
+    loans_repaid = db.Column(db.Float, default=0.0, nullable=False)
+    outstanding_principal = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+
+    group = db.relationship("Group", backref=db.backref("balance", uselist=False, cascade="all, delete-orphan"))
+
+    @property
+    def cash_at_hand(self):
+        """Money physically held by the group: paid in minus paid out, with loans still owed."""
+        return (
+            self.total_contributions
+            + self.loans_repaid
+            - self.total_withdrawals
+            - self.outstanding_principal
+        )
+
+    @property
+    def adjusted_funds(self):
+        return (
+            self.total_contributions
+            - self.total_withdrawals
+            - self.loans_disbursed
+            + self.loans_repaid
+        )
+
+
+class MemberMonthTotal(db.Model):
+    """Per-member credits (contributions and repayments) rolled up by calendar month."""
+    group_id = db.Column(db.Integer, db.ForeignKey("group.id"), primary_key=True)
+    year_month = db.Column(db.String(7), primary_key=True)  # "YYYY-MM"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+
+    user = db.relationship("User", backref=db.backref("month_totals", lazy=True, cascade="all, delete-orphan"))
+    group = db.relationship("Group", backref=db.backref("member_month_totals", lazy=True, cascade="all, delete-orphan"))
+
+    @staticmethod
+    def key_for(date):
+        return date.strftime("%Y-%m")
@@ -1,6 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User, Group, Transaction, TransactionType, Loan, LoanStatus, WithdrawalRequest, WithdrawalStatus, Notification, GroupJoin, GroupJoinRequest
+from app.utils.member_figures import get_member_figures, empty_figures
+from app.extensions import summary_cache, phone_lookup_cache, token_revocations, mpesa_token_cache, mpesa_jobs, mpesa_callbacks, disbursements
+from app.utils.notify import notify_group
+from app.utils.retention import retention_stats
+from app.utils.stk_reconcile import reconcile_stats
+from app.utils.statement import reconcile_statement, StatementError
 import datetime, calendar
 
 admin_bp = Blueprint("admin", __name__)
@@ -29,23 +35,17 @@ def set_daily_amount(group_id):
         return jsonify({"error": "Invalid amount"}), 400
     
     group.daily_contribution_amount = float(amount)
-    db.session.commit()
 
     # Notify all members except admin
-    members = group.members
-    for member in members:
-        if member.id == user.id:
-            continue
-        notif = Notification(
-            user_id=member.id,
-            group_id=group.id,
-            message=f"The daily contribution has been set to Ksh {amount} by {user.name}",
-            type="Daily Contribution update",
-            date=datetime.datetime.now(datetime.timezone.utc)  # fixed typo: was "dete"
-        )
-        db.session.add(notif)
+    notify_group(
+        group.id,
+        f"The daily contribution has been set to Ksh {amount} by {user.name}",
+        "Daily Contribution update",
+        exclude_user_id=user.id
+    )
 
     db.session.commit()
+    summary_cache.invalidate_group(group.id)
 
     return jsonify({"message": f"Daily contribution set to {amount} for {group.name}"}), 200
 
@@ -77,19 +77,13 @@ def get_admin_dashboard(group_id):
     # Daily requirement
     daily_amount = group.daily_contribution_amount or 0
     now = datetime.datetime.now(datetime.timezone.utc)
-    first_day = datetime.datetime(now.year, now.month, 1, tzinfo=datetime.timezone.utc)
     required_so_far = daily_amount * now.day
 
+    figures = get_member_figures(group.id, now)
+
     members_data = []
     for member in group.members:
-        total_contributed = db.session.query(db.func.sum(Transaction.amount)) \
-            .filter(
-                Transaction.user_id == member.id,
-                Transaction.group_id == group.id,
-                Transaction.type == TransactionType.CREDIT,
-                Transaction.date >= first_day,
-                Transaction.date <= now
-            ).scalar() or 0.0
+        total_contributed = figures.get(member.id, empty_figures())["month_credits"]
 
         members_data.append({
             "member_id": member.id,
@@ -182,21 +176,13 @@ def update_group_loan_policy(group_id):
     except ValueError:
         return jsonify({"error": "Invalid frequency"}), 400
 
-    db.session.commit()
-
     # Notify members
-    members = group.members
-    for member in members:
-        if member.id == user.id:
-            continue
-        notif = Notification(
-            user_id=member.id,
-            group_id=group.id,
-            message=f"The loan policy has been updated: {rate*100:.2f}% {frequency.lower()} by {user.name}",
-            type="Loan Policy Update",
-            date=datetime.datetime.now(datetime.timezone.utc)
-        )
-        db.session.add(notif)
+    notify_group(
+        group.id,
+        f"The loan policy has been updated: {rate*100:.2f}% {frequency.lower()} by {user.name}",
+        "Loan Policy Update",
+        exclude_user_id=user.id
+    )
 
     db.session.commit()
 
@@ -205,3 +191,132 @@ def update_group_loan_policy(group_id):
         "loan_interest_rate": group.loan_interest_rate,
         "loan_interest_frequency": group.loan_interest_frequency.value
     }), 200
+
+
+# Reconcile an uploaded M-Pesa paybill statement (CSV) against the group's transactions
+@admin_bp.route("/groups/<int:group_id>/statement/reconcile", methods=["POST"])
+@jwt_required()
+def reconcile_mpesa_statement(group_id):
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    group = Group.query.get(group_id)
+    if not group:
+        return jsonify({"error": "Group not found"}), 404
+
+    if group.admin_id != user.id:
+        return jsonify({"error": "Only the group admin can reconcile statements"}), 403
+
+    file = request.files.get("statement")
+    if not file or file.filename == "":
+        return jsonify({"error": "Upload the statement CSV as 'statement'"}), 400
+
+    try:
+        report = reconcile_statement(group.id, file.stream)
+    except StatementError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(report), 200
+
+
+# Account summary cache stats (for tuning TTL and size)
+@admin_bp.route("/cache/summary_stats", methods=["GET"])
+@jwt_required()
+def get_summary_cache_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(summary_cache.stats()), 200
+
+
+@admin_bp.route("/cache/phone_lookup_stats", methods=["GET"])
+@jwt_required()
+def get_phone_lookup_cache_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(phone_lookup_cache.stats()), 200
+
+
+@admin_bp.route("/auth/revocation_stats", methods=["GET"])
+@jwt_required()
+def get_token_revocation_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(token_revocations.stats()), 200
+
+
+@admin_bp.route("/mpesa/token_stats", methods=["GET"])
+@jwt_required()
+def get_mpesa_token_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(mpesa_token_cache.stats()), 200
+
+
+@admin_bp.route("/mpesa/job_stats", methods=["GET"])
+@jwt_required()
+def get_mpesa_job_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(mpesa_jobs.stats()), 200
+
+
+@admin_bp.route("/mpesa/callback_stats", methods=["GET"])
+@jwt_required()
+def get_mpesa_callback_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(mpesa_callbacks.stats()), 200
+
+
+@admin_bp.route("/mpesa/disbursement_stats", methods=["GET"])
+@jwt_required()
+def get_disbursement_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(disbursements.stats()), 200
+
+
+@admin_bp.route("/mpesa/stk_reconcile_stats", methods=["GET"])
+@jwt_required()
+def get_stk_reconcile_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(reconcile_stats()), 200
+
+
+@admin_bp.route("/notifications/retention_stats", methods=["GET"])
+@jwt_required()
+def get_notification_retention_stats():
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or not user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify(retention_stats()), 200
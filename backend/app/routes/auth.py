@@ -2,10 +2,13 @@ from flask import Blueprint, request, jsonify, send_from_directory, url_for
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import timedelta
-from app.models import db, User, TokenBlacklist, Group
+from datetime import datetime, timedelta, timezone
+from app.models import db, User, Group
 from app.utils.jwt_handler import decode_jwt
-from app.utils.helpers import format_phone_number, generate_token, confirm_token, send_email
+from app.extensions import token_revocations
+from app.utils.helpers import format_phone_number, generate_token, confirm_token
+from app.utils.email_outbox import queue_email
+from app.utils.digest import DELIVERY_MODES
 import os
 import uuid
 import re
@@ -43,7 +46,7 @@ def register():
     if not formatted_phone:
         return jsonify({"error": "Invalid phone number format. Use 254xxxxxxxxx"}), 400
 
-    if User.query.filter((User.email == data["email"]) | (User.phone == formatted_phone)).first():
+    if User.query.filter((User.email == data["email"]) | (User.phone_e164 == formatted_phone)).first():
         return jsonify({"error": "User with email or phone already exists"}), 409
 
     hashed_password = generate_password_hash(data["password"])
@@ -57,7 +60,6 @@ def register():
         is_verified=False  # new field
     )
     db.session.add(new_user)
-    db.session.commit()
 
     # Generate email verification token
     token = generate_token(new_user.email)
@@ -68,7 +70,9 @@ def register():
     <p><a href="{verification_url}">Verify Email</a></p>
     <p>This link expires in 1 hour.</p>
     """
-    send_email("Verify Your Email", new_user.email, html_body)
+    # Queued with the new user so the response never waits on SMTP
+    queue_email("Verify Your Email", new_user.email, html_body)
+    db.session.commit()
 
     return jsonify({"message": "User registered successfully. Please check your email to verify your account."}), 201
 
@@ -227,12 +231,15 @@ def logout():
     token = auth_header.split(" ")[1]
     decoded_token = decode_jwt(token)
 
-    if not decoded_token:
+    if not decoded_token or not decoded_token.get("jti") or not decoded_token.get("exp"):
         return jsonify({"error": "Invalid token"}), 401
 
-    blacklisted_token = TokenBlacklist(token=token)
-    db.session.add(blacklisted_token)
-    db.session.commit()
+    # Revoked by jti until the token would have expired anyway
+    token_revocations.revoke(
+        decoded_token["jti"],
+        datetime.fromtimestamp(decoded_token["exp"], timezone.utc),
+        user_id=int(decoded_token["sub"]) if decoded_token.get("sub") else None
+    )
 
     return jsonify({"message": "Logged out successfully"}), 200
 
@@ -257,7 +264,8 @@ def request_password_reset():
     <p><a href="{reset_url}">Reset Password</a></p>
     <p>This link expires in 1 hour.</p>
     """
-    send_email("Password Reset Request", user.email, html_body)
+    queue_email("Password Reset Request", user.email, html_body)
+    db.session.commit()
     return jsonify({"message": "Password reset email sent"}), 200
 
 
@@ -311,7 +319,8 @@ def get_user_profile():
         "group_id": user.group_id,
         "group_name": group_name,
         "monthly_total": user.monthly_total,
-        "profile_photo": profile_photo_url
+        "profile_photo": profile_photo_url,
+        "email_delivery": user.email_delivery
     }), 200
 
 
@@ -336,6 +345,10 @@ def update_profile():
         formatted_phone = format_phone_number(data["phone"])
         if formatted_phone:
             current_user.phone = formatted_phone
+    if "email_delivery" in data:
+        if data["email_delivery"] not in DELIVERY_MODES:
+            return jsonify({"error": f"email_delivery must be one of: {', '.join(DELIVERY_MODES)}"}), 400
+        current_user.email_delivery = data["email_delivery"]
 
     db.session.commit()
 
@@ -350,7 +363,8 @@ def update_profile():
             "name": current_user.name,
             "email": current_user.email,
             "phone": current_user.phone,
-            "profile_photo": profile_photo_url
+            "profile_photo": profile_photo_url,
+            "email_delivery": current_user.email_delivery
         }
     }), 200
 
@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Contribution, Transaction, User, ContributionStatus, TransactionType, Notification, Group, TransactionReason
+from app.utils.ledger import apply_balance_delta, record_member_credit
+from app.utils.member_figures import get_member_figures, empty_figures
+from app.extensions import summary_cache
+from app.utils.notify import notify_user
+from app.utils.pagination import get_page_args, paginate, CursorError
 import datetime
 import logging
 
@@ -11,6 +16,41 @@ logger = logging.getLogger(__name__)
 
 contributions_bp = Blueprint('contributions', __name__)
 
+def record_contribution(user_id, group_id, amount, receipt_number, email_delivery=None):
+    """
+    Adds a paid contribution, its CREDIT transaction, the running totals and
+    the member's notification to the session. Takes ids, and the member's
+    email_delivery when known, rather than the User so callback batches
+    need not load it. Does not commit.
+    """
+    contribution = Contribution(
+        user_id=user_id,
+        group_id=group_id,
+        amount=amount,
+        date=datetime.datetime.now(datetime.timezone.utc),
+        status=ContributionStatus.PAID
+    )
+
+    # ✅ Use CREDIT for contributions
+    transaction = Transaction(
+        user_id=user_id,
+        group_id=group_id,
+        amount=amount,
+        type=TransactionType.CREDIT,
+        reason=TransactionReason.CONTRIBUTION,
+        date=datetime.datetime.now(datetime.timezone.utc),
+        reference=receipt_number
+    )
+
+    User.query.filter_by(id=user_id).update({User.monthly_total: db.func.coalesce(User.monthly_total, 0) + amount})
+    db.session.add(contribution)
+    db.session.add(transaction)
+    notify_user(user_id, group_id, f"Your contribution of ksh {amount} has been received", "Contribution", email_delivery)
+    apply_balance_delta(group_id, total_contributions=amount)
+    record_member_credit(group_id, user_id, amount, transaction.date)
+    return contribution, transaction
+
+
 def log_contribution(user_id, amount, receipt_number):
     """Logs a contribution and its associated transaction."""
     try:
@@ -37,37 +77,9 @@ def log_contribution(user_id, amount, receipt_number):
             logger.warning(f"Invalid contribution amount format: {amount} by user {user_id}.")
             return jsonify({"error": "Amount must be a valid number"}), 400
 
-        contribution = Contribution(
-            user_id=user_id,
-            group_id=user.group_id,
-            amount=amount,
-            date=datetime.datetime.now(datetime.timezone.utc),
-            status=ContributionStatus.PAID
-        )
-
-        # ✅ Use CREDIT for contributions
-        transaction = Transaction(
-            user_id=user_id,
-            group_id=user.group_id,
-            amount=amount,
-            type=TransactionType.CREDIT,
-            reason=TransactionReason.CONTRIBUTION,
-            date=datetime.datetime.now(datetime.timezone.utc),
-            reference=receipt_number
-        )
-
-        user.monthly_total += amount      
-        notification = Notification(
-            user_id=user_id,
-            group_id=user.group_id,
-            message=f"Your contribution of ksh {amount} has been received",
-            type="Contribution",
-            date=datetime.datetime.now(datetime.timezone.utc)
-        )
-        db.session.add(contribution)
-        db.session.add(transaction)
-        db.session.add(notification)
+        contribution, transaction = record_contribution(user.id, user.group_id, amount, receipt_number)
         db.session.commit()
+        summary_cache.invalidate_group(user.group_id)
 
         logger.info(f"Contribution logged successfully: User {user_id}, Amount {amount}, Receipt {receipt_number}")
         return {
@@ -119,15 +131,24 @@ def get_contributions():
             logger.warning(f"User {user_id} is not in any group while fetching contributions.")
             return jsonify({"error": "User is not in any group"}), 400
 
-        contributions = Contribution.query.filter_by(user_id=user_id, group_id=user.group_id).all()
+        def serialize(contribution):
+            return {
+                "id": contribution.id,
+                "amount": contribution.amount,
+                "date": contribution.date.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": contribution.status.value,
+                "group_id": contribution.group_id
+            }
+
+        query = Contribution.query.filter_by(user_id=user_id, group_id=user.group_id)
+        page = get_page_args()
+        if page:
+            return jsonify(paginate(query, Contribution.date, Contribution.id, page, serialize)), 200
 
-        return jsonify([{
-            "id": contribution.id,
-            "amount": contribution.amount,
-            "date": contribution.date.strftime("%Y-%m-%d %H:%M:%S"),
-            "status": contribution.status.value,
-            "group_id": contribution.group_id
-        } for contribution in contributions]), 200
+        return jsonify([serialize(contribution) for contribution in query.all()]), 200
+
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         logger.error(f"Error fetching contributions for user {user_id}: {str(e)}")
@@ -193,19 +214,13 @@ def get_contribution_streaks():
     group = Group.query.get(user.group_id)
     daily_amount = group.daily_contribution_amount or 0
     now = datetime.datetime.now(datetime.timezone.utc)
-    first_day = datetime.datetime(now.year, now.month, 1, tzinfo=datetime.timezone.utc)
+
+    figures = get_member_figures(group.id, now)
 
     members_data = []
     for member in group.members:
-        #  Only count CREDIT transactions as contributions
-        total_contributed = db.session.query(db.func.sum(Transaction.amount)) \
-            .filter(
-                Transaction.user_id == member.id,
-                Transaction.group_id == group.id,
-                Transaction.type == TransactionType.CREDIT,
-                Transaction.date >= first_day,
-                Transaction.date <= now
-            ).scalar() or 0.0
+        #  Only CREDIT transactions count as contributions
+        total_contributed = figures.get(member.id, empty_figures())["month_credits"]
 
         days_passed = now.day
         days_met = int(total_contributed // daily_amount) if daily_amount > 0 else 0
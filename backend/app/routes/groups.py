@@ -1,11 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Group, GroupJoinRequest, GroupJoin, Notification, Announcement
+from app.models import db, User, Group, GroupJoinRequest, GroupJoin, Notification, NotificationCounter, Announcement
+from app.utils.notify import notify_user
+from app.utils.pagination import get_page_args, paginate, CursorError
 import datetime
 import secrets
 
 groups_bp = Blueprint('group', __name__)
 
+
+def _join_group(user, group_id):
+    """Makes user a member of group_id as of now. Does not commit."""
+    user.group_id = group_id
+    user.joined_group_at = datetime.datetime.now(datetime.timezone.utc)
+    # A counter left from an earlier membership kept counting broadcasts while they were away
+    db.session.execute(db.delete(NotificationCounter).where(
+        NotificationCounter.user_id == user.id, NotificationCounter.group_id == group_id
+    ))
+
+
 @groups_bp.route("/group/create", methods=["POST"])
 @jwt_required()
 def create_group():
@@ -26,7 +39,7 @@ def create_group():
     db.session.add(new_group)
     db.session.commit()
 
-    user.group_id = new_group.id
+    _join_group(user, new_group.id)
     user.is_admin = True
     db.session.commit()
 
@@ -66,14 +79,7 @@ def request_to_join_group():
     db.session.add(join_request)
     db.session.commit()
 
-    notification = Notification(
-        user_id=group.admin_id,
-        group_id=group.id,
-        message=f"{user.name} has requested to join the group.",
-        type="Join request",
-        date=datetime.datetime.now(datetime.timezone.utc)
-    )
-    db.session.add(notification)
+    notify_user(group.admin_id, group.id, f"{user.name} has requested to join the group.", "Join request")
     db.session.commit()
 
     return jsonify({"message": "Join request sent. Awaiting admin approval", "join_request_id": join_request.id}), 200
@@ -99,17 +105,10 @@ def approve_join_request(request_id):
     db.session.commit()
 
     user = User.query.get(join_request.user_id)
-    user.group_id = join_request.group_id
+    _join_group(user, join_request.group_id)
     db.session.commit()
 
-    notification = Notification(
-        user_id=user.id,
-        group_id=group.id,
-        message=f"Your request to join {group.name} has been approved.",
-        type=" Join Approval",
-        date=datetime.datetime.now(datetime.timezone.utc)
-    )
-    db.session.add(notification)
+    notify_user(user.id, group.id, f"Your request to join {group.name} has been approved.", " Join Approval")
     db.session.commit()
 
     return jsonify({"message": f"{user.name} has been added to the group"}), 200
@@ -135,14 +134,7 @@ def reject_join_request(request_id):
     join_request.status = GroupJoin.REJECTED
     db.session.commit()
 
-    notification = Notification(
-        user_id=join_request.user_id,
-        group_id=group.id,
-        message=f"Your request to join {group.name} has been rejected.",
-        type=" Join Rejection",
-        date=datetime.datetime.now(datetime.timezone.utc)
-    )
-    db.session.add(notification)
+    notify_user(join_request.user_id, group.id, f"Your request to join {group.name} has been rejected.", " Join Rejection")
     db.session.commit()
 
     return jsonify({"message": "Join request rejected"}), 200
@@ -166,15 +158,7 @@ def leave_group():
     user.group_id = None
     db.session.commit()
 
-    notification = Notification(
-        user_id=group.admin_id,
-        group_id=group.id,
-        message=f"{user.name} has left the group",
-        type="Member left",
-        date=datetime.datetime.now(datetime.timezone.utc)
-
-    )
-    db.session.add(notification)
+    notify_user(group.admin_id, group.id, f"{user.name} has left the group", "Member left")
     db.session.commit()
 
     return jsonify({"message": "You have left the group."}), 200
@@ -242,15 +226,20 @@ def get_announcements(group_id):
     if not group:
         return jsonify({"error": "Group not found"}), 404
 
-    announcements = (
-        Announcement.query.filter_by(group_id=group_id)
-        .order_by(Announcement.date.desc())
-        .all()
-    )
-    return jsonify([
-        {"id": a.id, "title": a.title, "message": a.message, "created_at": a.date}
-        for a in announcements
-    ])
+    try:
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def serialize(a):
+        return {"id": a.id, "title": a.title, "message": a.message, "created_at": a.date}
+
+    query = Announcement.query.filter_by(group_id=group_id)
+    if page:
+        return jsonify(paginate(query, Announcement.date, Announcement.id, page, serialize))
+
+    announcements = query.order_by(Announcement.date.desc()).all()
+    return jsonify([serialize(a) for a in announcements])
 
 
 @groups_bp.route("/group/<int:group_id>/announcements", methods=["POST"])
@@ -337,14 +326,7 @@ def join_with_code():
     db.session.add(join_request)
     db.session.commit()
 
-    notification = Notification(
-        user_id=group.admin_id,
-        group_id=group.id,
-        message=f"{user.name} has requested to join using a code.",
-        type="Join request",
-        date=datetime.datetime.now(datetime.timezone.utc),
-    )
-    db.session.add(notification)
+    notify_user(group.admin_id, group.id, f"{user.name} has requested to join using a code.", "Join request")
     db.session.commit()
 
     return jsonify({"message": "Join request sent. Awaiting admin approval"}), 200
\ No newline at end of file
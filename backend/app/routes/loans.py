@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Loan, Transaction, TransactionType, Notification, LoanStatus, TransactionReason, WithdrawalRequest, WithdrawalStatus
-from app.utils.mpesa import initiate_b2c_payment, initiate_stk_push
+from app.models import db, User, Loan, Transaction, TransactionType, Notification, LoanStatus, TransactionReason
+from app.utils.mpesa import initiate_stk_push
+from app.utils.helpers import format_phone_number
+from app.utils.disbursements import queue_disbursement, serialize_disbursement, LOAN
+from app.utils.ledger import get_group_balance, apply_balance_delta, RESERVED_LOAN_STATUSES
+from app.extensions import summary_cache, mpesa_jobs
 import datetime
 import logging
 
@@ -27,26 +31,10 @@ def request_loan():
 
     group_id = user.group_id
 
-    # Compute group financials
-    total_contributions = db.session.query(db.func.sum(Transaction.amount)) \
-        .filter(Transaction.group_id == group_id,
-                Transaction.type == TransactionType.CREDIT).scalar() or 0.0
-
-    total_withdrawals = db.session.query(db.func.sum(Transaction.amount)).join(
-            WithdrawalRequest, WithdrawalRequest.transaction_id == Transaction.id
-        ).filter(
-            Transaction.group_id == group_id,
-            Transaction.type == TransactionType.DEBIT,
-            WithdrawalRequest.status.in_([WithdrawalStatus.COMPLETED, WithdrawalStatus.APPROVED])
-        ).scalar() or 0.0
-
-
-    outstanding_loans = db.session.query(db.func.sum(Loan.outstanding)) \
-        .filter(Loan.group_id == group_id,
-                Loan.status == LoanStatus.DISBURSED).scalar() or 0.0
-
-
-    cash_at_hand = total_contributions - total_withdrawals - outstanding_loans
+    # Group financials come from the running ledger totals
+    balance = get_group_balance(group_id)
+    total_contributions = balance.total_contributions + balance.loans_repaid
+    cash_at_hand = balance.cash_at_hand
     available_company_limit = 0.4 * cash_at_hand
 
     if cash_at_hand <= 0 or available_company_limit <= 0:
@@ -63,11 +51,11 @@ def request_loan():
 
     user_entitlement = (user_contributions / total_contributions) * available_company_limit
 
-    # Check outstanding loans for this user
+    # Check outstanding loans for this user, counting those still being paid out
     user_outstanding_loans = db.session.query(db.func.sum(Loan.outstanding)) \
         .filter(Loan.user_id == user.id,
                 Loan.group_id == group_id,
-                Loan.status == LoanStatus.DISBURSED).scalar() or 0.0
+                Loan.status.in_(RESERVED_LOAN_STATUSES)).scalar() or 0.0
 
     if user_outstanding_loans + amount > user_entitlement:
         return jsonify({
@@ -78,70 +66,43 @@ def request_loan():
         }), 400
     
 
+    phone_number = format_phone_number(user.phone)
+    if not phone_number:
+        return jsonify({"error": "Invalid phone number format"}), 400
+
     group = user.group
     interest_rate = group.loan_interest_rate or 0.0
     interest_frequency = group.loan_interest_frequency or "monthly"
 
-    # Create loan record (already disbursed)
+    # Create loan record; it becomes DISBURSED, and starts accruing, once M-Pesa confirms the payout
     loan = Loan(
         user_id=user.id,
         group_id=group_id,
         amount=amount,
         outstanding=amount,
-        status=LoanStatus.DISBURSED,
+        status=LoanStatus.PENDING,
         date=datetime.datetime.now(datetime.timezone.utc),
         interest_rate=interest_rate,
         interest_frequency=interest_frequency
     )
     db.session.add(loan)
-    db.session.commit()
-
-    # Call B2C to disburse funds to borrower
-    try:
-        response = initiate_b2c_payment(
-            user_id=user.id,
-            phone_number=user.phone,
-            amount=loan.amount,
-            reason=TransactionReason.LOAN_DISBURSEMENT,
-            withdrawal_request_id=None
-        )
-    except Exception as e:
-        logger.error(f"B2C failed: {e}")
-        return jsonify({"error": "B2C disbursement failed", "details": str(e)}), 500
+    apply_balance_delta(group_id, outstanding_principal=loan.amount)
+    db.session.flush()
 
-    # Log a DEBIT transaction from group
-    tx = Transaction(
-        user_id=user.id,
-        group_id=loan.group_id,
-        amount=loan.amount,
-        type=TransactionType.DEBIT,
-        reason=TransactionReason.LOAN_DISBURSEMENT,
-        date=datetime.datetime.now(datetime.timezone.utc)
+    # The dispatcher pays it out over B2C; the group's DEBIT is booked once M-Pesa confirms it
+    disbursement = queue_disbursement(
+        LOAN, user.id, group_id, phone_number, loan.amount, TransactionReason.LOAN_DISBURSEMENT, loan_id=loan.id
     )
-    db.session.add(tx)
-    db.session.commit()
-
-    loan.disbursed_transaction_id = tx.id
-    db.session.commit()
-
-    # Notify borrower
-    notif = Notification(
-        user_id=user.id,
-        group_id=group_id,
-        message=f"Your loan of Ksh {loan.amount} was disbursed.",
-        type="Loan disbursed",
-        date=datetime.datetime.now(datetime.timezone.utc)
-    )
-    db.session.add(notif)
     db.session.commit()
+    summary_cache.invalidate_group(group_id)
 
     return jsonify({
-        "message": "Loan successfully disbursed",
+        "message": "Loan approved and queued for disbursement",
         "loan_id": loan.id,
         "your_entitlement": user_entitlement,
         "requested": amount,
-        "b2c_response": response
-    }), 201
+        "disbursement": serialize_disbursement(disbursement)
+    }), 202
 
 
 @loan_bp.route('/loans/repay', methods=['POST'])
@@ -155,15 +116,21 @@ def repay_loan():
     if not amount or float(amount) <= 0:
         return jsonify({"error": "Invalid amount"}), 400
 
+    body, status = mpesa_jobs.run(int(user_id), "loan_repayment", _repayment_stk_push, int(user_id), float(amount))
+    return jsonify(body), status
+
+
+def _repayment_stk_push(user_id, amount):
+    """The Daraja side of repay_loan. Returns (body, http_status)."""
     # Initiate STK push to collect from the user (repay)
     try:
-        response = initiate_stk_push(user_id, float(amount))
+        response = initiate_stk_push(user_id, amount)
     except Exception as e:
         logger.error(f"STK push failed: {str(e)}")
-        return jsonify({"error": "STK push failed", "details": str(e)}), 500
+        return {"error": "STK push failed", "details": str(e)}, 500
 
     # Loan outstanding will be reduced in callback
-    return jsonify({"message": "Repayment STK push initiated", "stk_response": response}), 200
+    return {"message": "Repayment STK push initiated", "stk_response": response}, 200
 
 
 @loan_bp.route('/loans/my', methods=['GET'])
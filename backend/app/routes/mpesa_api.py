@@ -1,14 +1,13 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import (
-    User, WithdrawalRequest, WithdrawalStatus, Transaction, db, Notification,
-    Loan, LoanStatus, TransactionType, TransactionReason
-)
-from app.utils.mpesa import initiate_stk_push, initiate_b2c_payment
-from app.routes.contributions import log_contribution
+from app.models import User, WithdrawalRequest, WithdrawalStatus, Transaction, db, MpesaJob, Disbursement
+from app.utils.mpesa import initiate_stk_push
 from app.utils.helpers import format_phone_number
+from app.extensions import mpesa_jobs, mpesa_callbacks
+from app.utils.mpesa_jobs import serialize_job
+from app.utils.mpesa_callbacks import STK, B2C, ACCEPTED
+from app.utils.disbursements import queue_disbursement, serialize_disbursement, WITHDRAWAL, FAILED
 import logging
-import datetime
 
 mpesa_bp = Blueprint("mpesa", __name__)
 logger = logging.getLogger(__name__)
@@ -38,122 +37,65 @@ def stk_push():
 
     logger.info(f"Initiating STK push for user {user_id}, Amount: {amount}")
 
+    body, status = mpesa_jobs.run(user_id, "stk_push", _stk_push_call, user_id, amount)
+    return jsonify(body), status
+
+
+def _stk_push_call(user_id, amount):
+    """The Daraja side of stk_push. Returns (body, http_status)."""
     try:
         response = initiate_stk_push(user_id, amount)
     except Exception as e:
         logger.error(f"STK push failed due to an exception: {str(e)}")
-        return jsonify({"error": "STK push failed", "details": str(e)}), 500
+        return {"error": "STK push failed", "details": str(e)}, 500
 
     if response.get("ResponseCode") == "0":
         logger.info(
             f"STK push initiated successfully for user {user_id}, "
             f"CheckoutRequestID: {response.get('CheckoutRequestID')}"
         )
-        return jsonify({
+        return {
             "message": "STK push initiated successfully",
             "checkout_request_id": response.get("CheckoutRequestID")
-        }), 200
+        }, 200
 
     logger.error(f"STK push failed for user {user_id}: {response}")
-    return jsonify({"message": "STK push failed", "error": response}), 400
+    return {"message": "STK push failed", "error": response}, 400
+
+
+@mpesa_bp.route("/mpesa/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_mpesa_job(job_id):
+    """
+    Status of an M-Pesa call started in async mode. The same payload is
+    pushed to the user's socket room as an "mpesa_job" event when it finishes.
+    """
+    user_id = int(get_jwt_identity())
+    job = db.session.get(MpesaJob, job_id)
+    if not job or job.user_id != user_id:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(serialize_job(job)), 200
 
 
 @mpesa_bp.route("/callback/transaction", methods=["POST"])
 def mpesa_callback():
     """
-    Handles M-Pesa STK push callback for contributions and loan repayments.
+    Receives the M-Pesa STK push callback for contributions and loan
+    repayments. The payload is stored in the callback inbox and acknowledged
+    at once; the callback worker books it, once per MpesaReceiptNumber.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid callback data"}), 400
 
     try:
-        body = data.get("Body", {})
-        stk_callback = body.get("stkCallback", {})
-        result_code = stk_callback.get("ResultCode")
-        result_desc = stk_callback.get("ResultDesc")
-        callback_metadata = stk_callback.get("CallbackMetadata", {})
-        items = callback_metadata.get("Item", [])
-
-        # Extract values
-        receipt_number = None
-        phone = None
-        pay_amount = None
-
-        for item in items:
-            if item.get("Name") == "MpesaReceiptNumber":
-                receipt_number = item.get("Value")
-            elif item.get("Name") == "PhoneNumber":
-                phone = str(item.get("Value"))
-            elif item.get("Name") == "Amount":
-                pay_amount = float(item.get("Value"))
-
-        # If failed transaction
-        if result_code != 0:
-            return jsonify({"message": f"Payment failed: {result_desc}"}), 400
-
-        # Match user by phone
-        user = User.query.filter_by(phone=phone).first()
-        if not user:
-            return jsonify({"message": "User not found"}), 404
-
-        # --- Handle repayment if outstanding loan exists ---
-        active_loan = Loan.query.filter(
-            Loan.user_id == user.id,
-            Loan.status.in_([LoanStatus.DISBURSED, LoanStatus.PARTIALLY_REPAID])
-        ).first()
-
-        if active_loan:
-            as_of_date = datetime.datetime.now(datetime.timezone.utc)
-            total_due = active_loan.calculate_due_amount(as_of_date)
-
-            already_repaid = active_loan.amount - active_loan.outstanding
-            remaining_balance = max(total_due - already_repaid, 0.0)
-
-            new_remaining_balance = max(remaining_balance - pay_amount, 0.0)
-
-            active_loan.outstanding = new_remaining_balance
-
-            if new_remaining_balance <= 0:
-                active_loan.status = LoanStatus.REPAID
-                active_loan.outstanding = 0
-            else:
-                active_loan.status = LoanStatus.PARTIALLY_REPAID
-
-            repayment_tx = Transaction(
-                user_id=user.id,
-                group_id=user.group_id,
-                amount=pay_amount,
-                type=TransactionType.CREDIT,   # money into group
-                reason=TransactionReason.LOAN_REPAYMENT,
-                reference=receipt_number,
-                date=as_of_date
-            )
-            db.session.add(repayment_tx)
-
-            notif = Notification(
-                user_id=user.id,
-                message=(
-                    f"Loan repayment of KES {pay_amount:.2f} received. "
-                    f"Outstanding balance: KES {active_loan.outstanding:.2f}"
-                )
-            )
-            db.session.add(notif)
-
-        else:
-            # Treat as normal contribution
-            log_contribution(user.id, pay_amount, receipt_number)
-
-            notif = Notification(
-                user_id=user.id,
-                message=f"Contribution of KES {pay_amount:.2f} received successfully!"
-            )
-            db.session.add(notif)
-
-        db.session.commit()
-        return jsonify({"message": "Payment processed successfully"}), 200
-
+        mpesa_callbacks.receive(STK, data)
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"Could not store STK callback: {e}")
+        return jsonify({"error": "Callback not stored"}), 500
+
+    return jsonify(ACCEPTED), 200
 
 
 @mpesa_bp.route("/mpesa/withdrawal", methods=["POST"])
@@ -182,82 +124,58 @@ def process_withdrawal():
     if not phone_number:
         return jsonify({"error": "Invalid admin phone number format"}), 400
 
-    logger.info(f"Processing withdrawal {withdrawal_request_id} for admin {admin.id}")
+    logger.info(f"Queueing withdrawal {withdrawal_request_id} for admin {admin.id}")
 
-    try:
-        response = initiate_b2c_payment(
-            user_id=admin.id,
-            phone_number=phone_number,
-            amount=transaction.amount,
-            reason=transaction.reason,
-            withdrawal_request_id=withdrawal_request_id
-        )
+    disbursement = queue_disbursement(
+        WITHDRAWAL, admin.id, withdrawal.group_id, phone_number, transaction.amount, transaction.reason,
+        withdrawal_id=withdrawal.id
+    )
+    if disbursement.status == FAILED and disbursement.outcome_unknown:
+        # It may have paid out; sending it again from here could pay twice
+        return jsonify({
+            "error": "The last payout attempt may have gone through. Check M-Pesa, then requeue it with "
+                     "`flask mpesa requeue-disbursement`",
+            "disbursement": serialize_disbursement(disbursement)
+        }), 409
+    db.session.commit()
 
-        originator_id = response.get("OriginatorConversationID")
-        if not originator_id:
-            logger.error("B2C payment failed: No transaction ID returned")
-            return jsonify({"error": "B2C payment failed"}), 500
+    return jsonify({
+        "message": "Withdrawal queued for disbursement",
+        "disbursement": serialize_disbursement(disbursement)
+    }), 202
 
-        withdrawal.mpesa_transaction_id = originator_id
-        db.session.commit()
-        logger.info(
-            f"Withdrawal {withdrawal.id} updated with M-Pesa transaction ID {originator_id}"
-        )
 
-    except Exception as e:
-        logger.error(f"B2C payment failed: {e}")
-        return jsonify({"error": "B2C payment failed", "details": str(e)}), 500
-
-    return jsonify(response), 200
+@mpesa_bp.route("/mpesa/disbursements/<int:disbursement_id>", methods=["GET"])
+@jwt_required()
+def get_disbursement(disbursement_id):
+    """Status of a queued payout, for its recipient or an admin of its group."""
+    user = User.query.get(int(get_jwt_identity()))
+    disbursement = db.session.get(Disbursement, disbursement_id)
+    if not user or not disbursement:
+        return jsonify({"error": "Disbursement not found"}), 404
+    if disbursement.user_id != user.id and not (user.is_admin and user.group_id == disbursement.group_id):
+        return jsonify({"error": "Disbursement not found"}), 404
+    return jsonify(serialize_disbursement(disbursement)), 200
 
 
 @mpesa_bp.route("/callback/b2c/result", methods=["POST"])
 def b2c_callback():
     """
-    Handles B2C M-Pesa callback and updates withdrawal status.
+    Receives the B2C result callback. Like mpesa_callback it only stores the
+    payload; the callback worker settles the disbursement and withdrawal.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True)
     logger.info(f"B2C Callback: {data}")
 
-    result = data.get("Result", {})
-    result_code = result.get("ResultCode")
-    mpesa_transaction_id = result.get("OriginatorConversationID")
-    transaction_id = result.get("TransactionID")
-    result_desc = result.get("ResultDesc")
-
-    if not mpesa_transaction_id:
-        logger.error("Missing mpesa_transaction_id in callback")
+    if not data or not data.get("Result"):
+        logger.error("Missing Result in B2C callback")
         return jsonify({"error": "Invalid callback data"}), 400
 
-    withdrawal = WithdrawalRequest.query.filter_by(
-        mpesa_transaction_id=mpesa_transaction_id
-    ).first()
-    if not withdrawal:
-        logger.warning(f"Withdrawal with transaction ID {mpesa_transaction_id} not found")
-        return jsonify({"error": "Transaction not found"}), 400
-
     try:
-        if result_code == 0:
-            withdrawal.status = WithdrawalStatus.COMPLETED
-            group_members = User.query.filter_by(group_id=withdrawal.group_id).all()
-            for member in group_members:
-                notification = Notification(
-                    user_id=member.id,
-                    group_id=withdrawal.group_id,
-                    message=(
-                        f"Withdrawal of Ksh {withdrawal.amount} via M-Pesa completed successfully"
-                    ),
-                    type="Withdrawal",
-                    date=datetime.datetime.now(datetime.timezone.utc)
-                )
-                db.session.add(notification)
-        else:
-            withdrawal.status = WithdrawalStatus.FAILED
-            logger.error(f"Withdrawal {mpesa_transaction_id} failed: {result_desc}")
-
-        db.session.commit()
+        mpesa_callbacks.receive(B2C, data)
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating withdrawal status: {e}")
+        logger.error(f"Could not store B2C callback: {e}")
+        return jsonify({"error": "Callback not stored"}), 500
 
-    return jsonify({"message": "Callback processed successfully"})
\ No newline at end of file
+    return jsonify(ACCEPTED), 200
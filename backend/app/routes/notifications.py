@@ -1,10 +1,79 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Notification, User, db
-import datetime
+from app.models import Notification, GroupBroadcast, User, db
+from app.utils.notify import (
+    notify_user, notify_group, visible_broadcasts, set_broadcast_state,
+    serialize_notification, serialize_broadcast,
+    adjust_unread, reset_unread, unread_count_for
+)
+from app.utils.pagination import get_page_args, fetch_page, encode_cursor, page_response, CursorError
 
 notifications_bp = Blueprint("notifications", __name__)
 
+
+# Order of the two sources when dates tie, so merged pages have a stable cursor
+PERSONAL_RANK = 1
+BROADCAST_RANK = 0
+
+
+def _merge_sources(sources, page=None):
+    """
+    Merges several (query, date_col, id_col, rank, serialize) sources into one
+    feed ordered by (date, rank, id), newest first. serialize maps a row to
+    (date, id, item). With page=(limit, cursor) each source is read with a
+    keyset filter and the result is a page dict; otherwise the full list.
+    """
+    entries = []
+    has_more = False
+    for query, date_col, id_col, rank, serialize in sources:
+        if page:
+            limit, cursor = page
+            rows, more = fetch_page(query, date_col, id_col, limit, cursor, rank)
+            has_more = has_more or more
+        else:
+            rows = query.order_by(date_col.desc(), id_col.desc()).all()
+        for row in rows:
+            date, item_id, item = serialize(row)
+            entries.append((date, rank, item_id, item))
+
+    entries.sort(key=lambda entry: entry[:3], reverse=True)
+    if not page:
+        return [entry[3] for entry in entries]
+
+    limit, _ = page
+    has_more = has_more or len(entries) > limit
+    entries = entries[:limit]
+
+    next_cursor = None
+    if has_more and entries:
+        last_date, last_rank, last_id, _ = entries[-1]
+        next_cursor = encode_cursor(last_date, last_id, last_rank)
+    return page_response([entry[3] for entry in entries], limit, next_cursor)
+
+
+def _mark_read(notification):
+    """ Marks one notification read, counting it down only if this call flipped it. """
+    flipped = Notification.query.filter_by(id=notification.id, read=False).update(
+        {"read": True}, synchronize_session=False
+    )
+    if flipped:
+        adjust_unread(notification.user_id, notification.group_id, -1)
+
+
+def _merged_feed(user, unread_only=False, page=None):
+    """ Merges the user's personal notifications with their group's broadcasts, newest first. """
+    personal = Notification.query.filter_by(user_id=user.id, group_id=user.group_id)
+    if unread_only:
+        personal = personal.filter_by(read=False)
+
+    return _merge_sources([
+        (personal, Notification.date, Notification.id, PERSONAL_RANK,
+         lambda n: (n.date, n.id, serialize_notification(n))),
+        (visible_broadcasts(user.id, user.group_id, unread_only), GroupBroadcast.date, GroupBroadcast.id, BROADCAST_RANK,
+         lambda row: (row[0].date, row[0].id, serialize_broadcast(*row))),
+    ], page)
+
+
 @notifications_bp.route("/notifications", methods=["GET"])
 @jwt_required()
 def get_notifications():
@@ -16,19 +85,12 @@ def get_notifications():
     if not user or not user.group_id:
         return jsonify({"error": "User not found or not in a group"}), 400
 
-    notifications = Notification.query.filter_by(user_id=user_id, group_id=user.group_id).order_by(Notification.date.desc()).all()
-    
-    return jsonify([
-        {
-            "id": notification.id,
-            "group_id": user.group_id,
-            "message": notification.message,
-            "type": notification.type,
-            "date": notification.date.isoformat(),
-            "is_read": notification.read
-        }
-        for notification in notifications
-    ]), 200
+    try:
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(_merged_feed(user, page=page)), 200
 
 @notifications_bp.route("/notifications/unread", methods=["GET"])
 @jwt_required()
@@ -40,19 +102,7 @@ def get_unread_notifications():
     if not user or not user.group_id:
         return jsonify({"error": "User not found or not in a group"}), 400
 
-    unread_notifications = Notification.query.filter_by(user_id=user_id, group_id=user.group_id, read=False).order_by(Notification.date.desc()).all()
-
-    return jsonify([
-        {
-            "id": notification.id,
-            "group_id": user.group_id,
-            "message": notification.message,
-            "type": notification.type,
-            "date": notification.date.isoformat(),
-            "is_read": notification.read
-        }
-        for notification in unread_notifications
-    ]), 200
+    return jsonify(_merged_feed(user, unread_only=True)), 200
 
 @notifications_bp.route("/notifications/read/<int:notification_id>", methods=["POST"])
 @jwt_required()
@@ -69,7 +119,7 @@ def mark_notification_as_read(notification_id):
     if not notification:
         return jsonify({"error": "Notification not found"}), 404
 
-    notification.read = True
+    _mark_read(notification)
     db.session.commit()
 
     return jsonify({"message": "Notification marked as read"}), 200
@@ -85,6 +135,9 @@ def mark_all_notifications_as_read():
         return jsonify({"error": "User not found or not in a group"}), 400
 
     Notification.query.filter_by(user_id=user_id, group_id=user.group_id, read=False).update({"read": True})
+    unread_ids = [broadcast.id for broadcast, _ in visible_broadcasts(user.id, user.group_id, unread_only=True)]
+    set_broadcast_state(user.id, unread_ids, read=True)
+    reset_unread(user.id, user.group_id)
     db.session.commit()
 
     return jsonify({"message": "All notifications marked as read"}), 200
@@ -105,6 +158,8 @@ def delete_notification(notification_id):
         return jsonify({"error": "Notification not found"}), 404
 
     db.session.delete(notification)
+    if not notification.read:
+        adjust_unread(notification.user_id, notification.group_id, -1)
     db.session.commit()
 
     return jsonify({"message": "Notification deleted successfully"}), 200
@@ -120,6 +175,9 @@ def clear_all_notifications():
         return jsonify({"error": "User not found or not in a group"}), 400
 
     Notification.query.filter_by(user_id=user_id, group_id=user.group_id).delete()
+    visible_ids = [broadcast.id for broadcast, _ in visible_broadcasts(user.id, user.group_id)]
+    set_broadcast_state(user.id, visible_ids, deleted=True)
+    reset_unread(user.id, user.group_id)
     db.session.commit()
 
     return jsonify({"message": "All notifications cleared successfully"}), 200
@@ -134,18 +192,31 @@ def get_group_notifications(group_id):
     if not user or not user.is_admin:
         return jsonify({"error": "Unauthorized"}), 403
 
-    notifications = Notification.query.filter_by(group_id=group_id).order_by(Notification.date.desc()).all()
-
-    return jsonify([
-        {
-            "id": notification.id,
-            "message": notification.message,
-            "type": notification.type,
-            "date": notification.date.isoformat(),
-            "read": notification.read
-        }
-        for notification in notifications
-    ]), 200
+    try:
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(_merge_sources([
+        (Notification.query.filter_by(group_id=group_id), Notification.date, Notification.id, PERSONAL_RANK,
+         lambda n: (n.date, n.id, {
+             "id": n.id,
+             "source": "personal",
+             "message": n.message,
+             "type": n.type,
+             "date": n.date.isoformat(),
+             "read": n.read
+         })),
+        (GroupBroadcast.query.filter_by(group_id=group_id), GroupBroadcast.date, GroupBroadcast.id, BROADCAST_RANK,
+         lambda b: (b.date, b.id, {
+             "id": b.id,
+             "source": "group",
+             "message": b.message,
+             "type": b.type,
+             "date": b.date.isoformat(),
+             "read": None  # read state is per member
+         })),
+    ], page)), 200
 
 @notifications_bp.route("/notifications/send", methods=["POST"])
 @jwt_required()
@@ -172,26 +243,10 @@ def send_notification():
         if not target_user:
             return jsonify({"error": "Target user not found or not in your group"}), 404
         
-        notification = Notification(
-            user_id=target_user.id,
-            group_id=group_id,
-            message=message,
-            type=notification_type,
-            date=datetime.datetime.now(datetime.timezone.utc)
-        )
-        db.session.add(notification)
+        notify_user(target_user.id, group_id, message, notification_type)
 
     else:
-        users = User.query.filter_by(group_id=group_id).all()
-        for member in users:
-            notification = Notification(
-                user_id=member.id,
-                group_id=group_id,
-                message=message,
-                type=notification_type,
-                date=datetime.datetime.now(datetime.timezone.utc)
-            )
-            db.session.add(notification)
+        notify_group(group_id, message, notification_type)
     db.session.commit()
     
     return jsonify({"message": "Notification sent successfully"}), 200
@@ -207,9 +262,7 @@ def get_unread_count():
     if not user or not user.group_id:
         return jsonify({"count": 0}), 200  # safe fallback
 
-    count = Notification.query.filter_by(
-        user_id=user_id, group_id=user.group_id, read=False
-    ).count()
+    count = unread_count_for(user.id, user.group_id)
 
     return jsonify({"count": count}), 200
 
@@ -231,7 +284,51 @@ def mark_single_notification_as_read(notification_id):
     if not notification:
         return jsonify({"error": "Notification not found"}), 404
 
-    notification.read = True
+    _mark_read(notification)
+    db.session.commit()
+
+    return jsonify({"message": "Notification marked as read"}), 200
+
+
+@notifications_bp.route("/notifications/broadcasts/<int:broadcast_id>/mark-read", methods=["PUT"])
+@jwt_required()
+def mark_broadcast_as_read(broadcast_id):
+    """ Marks a group broadcast as read for the logged-in user. """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user or not user.group_id:
+        return jsonify({"error": "User not found or not in a group"}), 400
+
+    visible = visible_broadcasts(user.id, user.group_id).filter(GroupBroadcast.id == broadcast_id).first()
+    if not visible:
+        return jsonify({"error": "Notification not found"}), 404
+
+    set_broadcast_state(user.id, [broadcast_id], read=True)
+    if not visible.is_read:
+        adjust_unread(user.id, user.group_id, -1)
+    db.session.commit()
+
+    return jsonify({"message": "Notification marked as read"}), 200
+
+
+@notifications_bp.route("/notifications/broadcasts/<int:broadcast_id>", methods=["DELETE"])
+@jwt_required()
+def delete_broadcast(broadcast_id):
+    """ Removes a group broadcast from the logged-in user's feed. """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user or not user.group_id:
+        return jsonify({"error": "User not found or not in a group"}), 400
+
+    visible = visible_broadcasts(user.id, user.group_id).filter(GroupBroadcast.id == broadcast_id).first()
+    if not visible:
+        return jsonify({"error": "Notification not found"}), 404
+
+    set_broadcast_state(user.id, [broadcast_id], deleted=True)
+    if not visible.is_read:
+        adjust_unread(user.id, user.group_id, -1)
     db.session.commit()
 
-    return jsonify({"message": "Notification marked as read"}), 200
\ No newline at end of file
+    return jsonify({"message": "Notification deleted successfully"}), 200
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.models import db, Transaction, User, TransactionType
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.pagination import get_page_args, paginate, CursorError
 import logging
 
 transactions_bp = Blueprint("transactions", __name__)
@@ -23,26 +24,35 @@ def get_all_transactions():
         return jsonify({"error": "Only admins can view all transactions"}), 403
 
     try:
-        transactions = Transaction.query.filter_by(group_id=user.group_id).order_by(Transaction.date.desc()).all()
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def serialize(transaction):
+        return {
+            "id": transaction.id,
+            "user_id": transaction.user_id,
+            "group_id": transaction.group_id,
+            "is_admin": User.query.get(transaction.user_id).is_admin,
+            "amount": transaction.amount,
+            "type": transaction.type.value,
+            "reason": transaction.reason,
+            "date": transaction.date.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    try:
+        query = Transaction.query.filter_by(group_id=user.group_id)
+        if page:
+            return jsonify(paginate(query, Transaction.date, Transaction.id, page, serialize)), 200
+
+        transactions = query.order_by(Transaction.date.desc()).all()
 
         if not transactions:
             return jsonify({"message": "No transactions found"}), 200
 
         logger.info(f"Admin user {user_id} retrieved all transactions for group {user.group_id}")
 
-        return jsonify([
-            {
-                "id": transaction.id,
-                "user_id": transaction.user_id,
-                "group_id": transaction.group_id,
-                "is_admin": User.query.get(transaction.user_id).is_admin,
-                "amount": transaction.amount,
-                "type": transaction.type.value,
-                "reason": transaction.reason,
-                "date": transaction.date.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for transaction in transactions
-        ]), 200
+        return jsonify([serialize(transaction) for transaction in transactions]), 200
     except Exception as e:
         logger.error(f"Database error while fetching transactions: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
@@ -62,25 +72,34 @@ def get_user_transactions():
         return jsonify({"error": "User not found"}), 404
 
     try:
-        transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.date.desc()).all()
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def serialize(transaction):
+        return {
+            "id": transaction.id,
+            "group_id": transaction.group_id,
+            "amount": transaction.amount,
+            # ✅ will now return "credit", "debit", or "repayment"
+            "type": transaction.type.value,
+            "reason": transaction.reason,
+            "date": transaction.date.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    try:
+        query = Transaction.query.filter_by(user_id=user_id)
+        if page:
+            return jsonify(paginate(query, Transaction.date, Transaction.id, page, serialize)), 200
+
+        transactions = query.order_by(Transaction.date.desc()).all()
 
         if not transactions:
             return jsonify({"message": "No transactions found"}), 200
 
         logger.info(f"User {user_id} retrieved their transactions")
 
-        return jsonify([
-            {
-                "id": transaction.id,
-                "group_id": transaction.group_id,
-                "amount": transaction.amount,
-                # ✅ will now return "credit", "debit", or "repayment"
-                "type": transaction.type.value,
-                "reason": transaction.reason,
-                "date": transaction.date.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for transaction in transactions
-        ]), 200
+        return jsonify([serialize(transaction) for transaction in transactions]), 200
     except Exception as e:
         logger.error(f"Database error while fetching transactions for user {user_id}: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
\ No newline at end of file
@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Group, Transaction, TransactionType, Loan, LoanStatus, WithdrawalRequest, WithdrawalStatus, TransactionReason, Contribution
+from app.models import db, User, Group, Loan, LoanStatus, Contribution, GroupBalance
+from app.utils.ledger import get_group_balance
+from app.utils.member_figures import get_member_figures, empty_figures
+from app.extensions import summary_cache
 import datetime
 import logging
 
@@ -9,6 +12,54 @@ logger = logging.getLogger(__name__)
 
 user_bp = Blueprint("user", __name__)
 
+
+def _summary_figures(user_id, group_id, first_day, now):
+    """
+    Reads the account summary's monthly and group aggregates in one
+    statement: the user's and group's contribution sums for the month via
+    FILTER aggregates over this month's Contribution rows, plus the group's
+    running ledger totals. The user's own lifetime figures come from
+    get_member_figures.
+    """
+    this_month = db.and_(Contribution.date >= first_day, Contribution.date <= now)
+    mine = Contribution.user_id == user_id
+
+    def total(column, condition=None):
+        aggregate = db.func.sum(column)
+        if condition is not None:
+            aggregate = aggregate.filter(condition)
+        return db.func.coalesce(aggregate, 0.0)
+
+    def ledger(column):
+        return db.select(column).where(GroupBalance.group_id == group_id).scalar_subquery()
+
+    row = db.session.query(
+        total(Contribution.amount, mine),
+        total(Contribution.amount),
+        ledger(GroupBalance.total_contributions),
+        ledger(GroupBalance.total_withdrawals),
+        ledger(GroupBalance.loans_disbursed),
+        ledger(GroupBalance.loans_repaid),
+    ).filter(Contribution.group_id == group_id, this_month).one()
+
+    monthly, group_monthly, contributions, withdrawals, disbursed, repaid = row
+
+    if contributions is None:
+        # No ledger row yet for this group; build it once
+        balance = get_group_balance(group_id)
+        contributions, withdrawals, disbursed, repaid = (
+            balance.total_contributions, balance.total_withdrawals,
+            balance.loans_disbursed, balance.loans_repaid
+        )
+
+    return {
+        "monthly_contributed": float(monthly),
+        "group_monthly_contributions": float(group_monthly),
+        "group_total_contributions": float(contributions),
+        "adjusted_group_funds": float(contributions - withdrawals - disbursed + repaid),
+    }
+
+
 @user_bp.route("/user/account_summary", methods=["GET"])
 @jwt_required()
 def account_summary():
@@ -17,7 +68,9 @@ def account_summary():
         user_id = get_jwt_identity()
         logger.debug(f"Account summary requested for user_id={user_id}")
 
-        user = User.query.get(user_id)
+        user, group = db.session.query(User, Group) \
+            .outerjoin(Group, Group.id == User.group_id) \
+            .filter(User.id == user_id).first() or (None, None)
         if not user:
             logger.debug("User not found")
             return jsonify({"error": "User not found"}), 404
@@ -26,36 +79,23 @@ def account_summary():
             logger.debug(f"User {user.id} not in a group")
             return jsonify({"error": "User not in a group"}), 400
 
-        group = Group.query.get(user.group_id)
         if not group:
             logger.debug("Group not found")
             return jsonify({"error": "Group not found"}), 404
 
+        cached = summary_cache.get(user.id, group.id)
+        if cached is not None:
+            return jsonify(cached), 200
+
         now = datetime.datetime.now(datetime.timezone.utc)
         first_day = datetime.datetime(now.year, now.month, 1, tzinfo=datetime.timezone.utc)
 
-        # --- Contributions (use Contribution table) ---
-        monthly_contributed = db.session.query(db.func.sum(Contribution.amount)).filter(
-            Contribution.user_id == user.id,
-            Contribution.group_id == group.id,
-            Contribution.date >= first_day,
-            Contribution.date <= now
-        ).scalar() or 0.0
-
-        user_total_contributions = db.session.query(db.func.sum(Contribution.amount)).filter(
-            Contribution.user_id == user.id,
-            Contribution.group_id == group.id
-        ).scalar() or 0.0
-
-        group_total_contributions = db.session.query(db.func.sum(Contribution.amount)).filter(
-            Contribution.group_id == group.id
-        ).scalar() or 0.0
-
-        group_monthly_contributions = db.session.query(db.func.sum(Contribution.amount)).filter(
-            Contribution.group_id == group.id,
-            Contribution.date >= first_day,
-            Contribution.date <= now
-        ).scalar() or 0.0
+        # --- Contributions and group funds (one statement) ---
+        figures = _summary_figures(user.id, group.id, first_day, now)
+        monthly_contributed = figures["monthly_contributed"]
+        group_monthly_contributions = figures["group_monthly_contributions"]
+        group_total_contributions = figures["group_total_contributions"]
+        adjusted_group_funds = figures["adjusted_group_funds"]
 
         # --- Required contributions ---
         daily_amount = group.daily_contribution_amount or 0
@@ -83,39 +123,11 @@ def account_summary():
                 "date_disbursed": loan.date.isoformat()
             })
 
-        # --- Withdrawals made by admin (join WithdrawalRequest) ---
-        total_withdrawals = db.session.query(db.func.sum(Transaction.amount)).join(
-            WithdrawalRequest, WithdrawalRequest.transaction_id == Transaction.id
-        ).filter(
-            Transaction.group_id == group.id,
-            Transaction.type == TransactionType.DEBIT,
-            WithdrawalRequest.status.in_([WithdrawalStatus.COMPLETED, WithdrawalStatus.APPROVED])
-        ).scalar() or 0.0
-
-        # --- Loans disbursed & repaid via Transaction reasons ---
-        total_loans_disbursed = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.group_id == group.id,
-            Transaction.type == TransactionType.DEBIT,
-            db.func.lower(Transaction.reason) == TransactionReason.LOAN_DISBURSEMENT
-        ).scalar() or 0.0
-
-        total_loans_repaid = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.group_id == group.id,
-            Transaction.type == TransactionType.CREDIT,
-            db.func.lower(Transaction.reason) == TransactionReason.LOAN_REPAYMENT
-        ).scalar() or 0.0
-
-        # Adjusted funds
-        adjusted_group_funds = (
-            (group_total_contributions or 0.0)
-            - (total_withdrawals or 0.0)
-            - (total_loans_disbursed or 0.0)
-            + (total_loans_repaid or 0.0)
-        )
-
         logger.debug(f"Adjusted group funds: {adjusted_group_funds}")
 
         # --- Loan limit ---
+        member = get_member_figures(group.id, now, user_id=user.id).get(user.id, empty_figures())
+        user_total_contributions = member["lifetime_contributions"]
         loan_limit = 0.0
         percentage_share = 0.0
         if group_total_contributions > 0 and user_total_contributions > 0 and adjusted_group_funds > 0:
@@ -124,7 +136,7 @@ def account_summary():
             loan_limit = (user_total_contributions / group_total_contributions) * available_company_limit
         logger.debug(f"Loan limit: {loan_limit}, Share: {percentage_share}%")
 
-        return jsonify({
+        summary = {
             "group_name": group.name,
             "month": now.strftime("%B %Y"),
             "daily_amount": float(daily_amount),
@@ -139,7 +151,11 @@ def account_summary():
             "user_total_contributions": float(user_total_contributions),
             "percentage_share": round(percentage_share, 2),
             "loan_limit": round(loan_limit, 2)
-        }), 200
+        }
+        db.session.commit()  # keeps the ledger row if this read built it
+        summary_cache.set(user.id, group.id, summary)
+
+        return jsonify(summary), 200
 
     except Exception as e:
         import traceback
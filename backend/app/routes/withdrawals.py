@@ -8,7 +8,13 @@ from app.models import (
 import datetime
 import logging
 from flask_socketio import emit, join_room
-from app.extensions import socketio
+from app.extensions import socketio, summary_cache
+from app.utils.ledger import get_group_balance, apply_balance_delta
+from app.utils.notify import notify_group
+from app.utils.realtime import (
+    socket_identity, remember_socket_identity, identity_from_socket_auth, user_room, group_room
+)
+from app.utils.pagination import get_page_args, paginate, CursorError
 
 withdrawal_bp = Blueprint("withdrawals", __name__)
 
@@ -20,11 +26,23 @@ logger = logging.getLogger(__name__)
 # ---------------- SOCKET HANDLERS ---------------- #
 @socketio.on("join_group")
 def handle_join_group(data):
-    """Allow a client to join their group's room for real-time updates."""
+    """
+    Lets a signed-in member's client join their own group's room for
+    real-time updates. The connection must have authenticated on connect,
+    or send its access token here as {"token": ..., "group_id": ...}.
+    """
+    data = data or {}
     group_id = data.get("group_id")
-    if group_id:
-        join_room(f"group_{group_id}")
-        logger.info(f"Client joined room group_{group_id}")
+    user_id = socket_identity() or identity_from_socket_auth(data)
+    user = db.session.get(User, user_id) if user_id else None
+    if not user or not user.group_id or str(user.group_id) != str(group_id):
+        logger.warning(f"Refused join to room group_{group_id} for user {user_id}")
+        return
+    if socket_identity() is None:
+        remember_socket_identity(user.id)
+        join_room(user_room(user.id))
+    join_room(group_room(user.group_id))
+    logger.info(f"User {user.id} joined room group_{user.group_id}")
 
 
 # ---------------- WITHDRAWAL ROUTES ---------------- #
@@ -57,17 +75,8 @@ def withdraw_request():
     if pending_withdrawal:
         return jsonify({"error": "A pending withdrawal already exists"}), 400
 
-    # Compute available balance
-    total_contributions = db.session.query(db.func.sum(Contribution.amount)).filter_by(group_id=group_id).scalar() or 0
-    total_withdrawals = db.session.query(db.func.sum(Transaction.amount)).join(
-        WithdrawalRequest, WithdrawalRequest.transaction_id == Transaction.id, isouter=True
-    ).filter(
-        Transaction.type == TransactionType.DEBIT,
-        db.or_(WithdrawalRequest.status == WithdrawalStatus.COMPLETED, WithdrawalRequest.status.is_(None)),
-        Transaction.group_id == group_id
-    ).scalar()
-
-    available_balance = total_contributions - float(total_withdrawals or 0)
+    # Compute available balance from the running ledger totals
+    available_balance = get_group_balance(group_id).adjusted_funds
 
     if amount > available_balance:
         logger.info(
@@ -96,16 +105,7 @@ def withdraw_request():
             )
             db.session.add(withdrawal_request)
 
-            group_members = User.query.filter_by(group_id=group_id).all()
-            for member in group_members:
-                notification = Notification(
-                    user_id=member.id,
-                    group_id=group_id,
-                    message=f"A withdrawal request of ksh {amount} has been initiated",
-                    type="Withdrawal request",
-                    date=datetime.datetime.now(datetime.timezone.utc)
-                )
-                db.session.add(notification)
+            notify_group(group_id, f"A withdrawal request of ksh {amount} has been initiated", "Withdrawal request")
 
         db.session.commit()
 
@@ -151,17 +151,14 @@ def get_withdrawal_status():
         return jsonify({"error": "User not found"}), 404
 
     group_id = user.group_id
-    withdrawals = WithdrawalRequest.query.filter_by(group_id=group_id).all()
-
-    if not withdrawals:
-        return jsonify({"message": "No withdrawal requests found"}), 200
-    
-    logger.info(f"User {user.id} requesting status for group {group_id}")
-    logger.info(f"Withdrawals found: {[w.id for w in withdrawals]}")
 
+    try:
+        page = get_page_args()
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify([
-        {
+    def serialize(withdrawal):
+        return {
             "id": withdrawal.id,
             "amount": withdrawal.transaction.amount,
             "date": withdrawal.transaction.date.strftime("%Y-%m-%d %H:%M:%S"),
@@ -169,8 +166,27 @@ def get_withdrawal_status():
             "reason": withdrawal.transaction.reason,
             "requested_by": withdrawal.transaction.user.name if withdrawal.transaction.user else "Unknown"
         }
-        for withdrawal in withdrawals
-    ]), 200
+
+    if page:
+        # Withdrawals take their date from the requesting transaction
+        query = WithdrawalRequest.query.join(
+            Transaction, Transaction.id == WithdrawalRequest.transaction_id
+        ).filter(WithdrawalRequest.group_id == group_id).options(db.contains_eager(WithdrawalRequest.transaction))
+        return jsonify(paginate(
+            query, Transaction.date, WithdrawalRequest.id, page, serialize,
+            key=lambda w: (w.transaction.date, w.id)
+        )), 200
+
+    withdrawals = WithdrawalRequest.query.filter_by(group_id=group_id).all()
+
+    if not withdrawals:
+        return jsonify({"message": "No withdrawal requests found"}), 200
+    
+    logger.info(f"User {user.id} requesting status for group {group_id}")
+    logger.info(f"Withdrawals found: {[w.id for w in withdrawals]}")
+
+
+    return jsonify([serialize(withdrawal) for withdrawal in withdrawals]), 200
 
 
 @withdrawal_bp.route("/withdrawal/approve/<int:withdrawal_id>", methods=["POST"])
@@ -211,19 +227,16 @@ def approve_withdrawal(withdrawal_id):
 
     if total_approvals > total_members // 2:
         withdrawal.status = WithdrawalStatus.APPROVED
+        apply_balance_delta(withdrawal.group_id, total_withdrawals=withdrawal.transaction.amount)
 
-        group_members = User.query.filter_by(group_id=group_id).all()
-        for member in group_members:
-            notification = Notification(
-                user_id=member.id,
-                group_id=group_id,
-                message=f"The withdrawal request of ksh {withdrawal.transaction.amount} has been approved",
-                type="Withdrawal request approval",
-                date=datetime.datetime.now(datetime.timezone.utc)
-            )
-            db.session.add(notification)
+        notify_group(
+            group_id,
+            f"The withdrawal request of ksh {withdrawal.transaction.amount} has been approved",
+            "Withdrawal request approval"
+        )
 
     db.session.commit()
+    summary_cache.invalidate_group(group_id)
 
     socketio.emit(
         "withdrawal_updated",
@@ -283,18 +296,14 @@ def reject_withdrawal(withdrawal_id):
     if total_rejections > total_members // 2:
         withdrawal.status = WithdrawalStatus.REJECTED
 
-        group_members = User.query.filter_by(group_id=group_id).all()
-        for member in group_members:
-            notification = Notification(
-                user_id=member.id,
-                group_id=group_id,
-                message=f"The withdrawal request of ksh {withdrawal.transaction.amount} was rejected",
-                type="Withdrawal request rejection",
-                date=datetime.datetime.now(datetime.timezone.utc)
-            )
-            db.session.add(notification)
+        notify_group(
+            group_id,
+            f"The withdrawal request of ksh {withdrawal.transaction.amount} was rejected",
+            "Withdrawal request rejection"
+        )
 
     db.session.commit()
+    summary_cache.invalidate_group(group_id)
 
     socketio.emit(
         "withdrawal_updated",
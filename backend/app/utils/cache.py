@@ -0,0 +1,269 @@
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCacheBackend:
+    """In-process LRU with per-entry expiry. Entries are keyed (group_id, user_id)."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, group_id, user_id):
+        key = (group_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, group_id, user_id, value, ttl):
+        key = (group_id, user_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_group(self, group_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == group_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Shared backend for multi-worker deployments. Each group has a generation
+    counter that is part of every entry key, so invalidating a group is a
+    single INCR and the old entries simply age out.
+    """
+
+    def __init__(self, url, prefix="summary"):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _generation(self, group_id):
+        return int(self._redis.get(f"{self.prefix}:gen:{group_id}") or 0)
+
+    def _key(self, group_id, user_id):
+        return f"{self.prefix}:{group_id}:{self._generation(group_id)}:{user_id}"
+
+    def get(self, group_id, user_id):
+        raw = self._redis.get(self._key(group_id, user_id))
+        return json.loads(raw) if raw else None
+
+    def set(self, group_id, user_id, value, ttl):
+        self._redis.set(self._key(group_id, user_id), json.dumps(value), ex=int(ttl))
+
+    def invalidate_group(self, group_id):
+        self._redis.incr(f"{self.prefix}:gen:{group_id}")
+
+    def clear(self):
+        for key in self._redis.scan_iter(f"{self.prefix}:*"):
+            self._redis.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(f"{self.prefix}:*"))
+
+
+class SummaryCache:
+    """
+    Caches per-user account summary payloads keyed by (user_id, group_id).
+    Writes that move a group's money call invalidate_group().
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend or LRUCacheBackend()
+        self.ttl = ttl
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    def init_app(self, app):
+        self.enabled = app.config.get("SUMMARY_CACHE_ENABLED", True)
+        self.ttl = app.config.get("SUMMARY_CACHE_TTL", self.ttl)
+        backend = app.config.get("SUMMARY_CACHE_BACKEND", "memory")
+        if backend == "redis":
+            self.backend = RedisCacheBackend(app.config["SUMMARY_CACHE_REDIS_URL"])
+        else:
+            self.backend = LRUCacheBackend(app.config.get("SUMMARY_CACHE_SIZE", 1024))
+        app.extensions["summary_cache"] = self
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, user_id, group_id):
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(int(group_id), int(user_id))
+        except Exception as e:
+            # A broken shared cache should never take the summary down with it
+            logger.error(f"Summary cache read failed: {e}")
+            self._count("errors")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, user_id, group_id, payload):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(int(group_id), int(user_id), payload, self.ttl)
+        except Exception as e:
+            logger.error(f"Summary cache write failed: {e}")
+            self._count("errors")
+
+    def invalidate_group(self, group_id):
+        if not group_id:
+            return
+        try:
+            self.backend.invalidate_group(int(group_id))
+            self._count("invalidations")
+        except Exception as e:
+            logger.error(f"Summary cache invalidation failed for group {group_id}: {e}")
+            self._count("errors")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["ttl"] = self.ttl
+        stats["backend"] = type(self.backend).__name__
+        try:
+            stats["size"] = len(self.backend)
+        except Exception:
+            stats["size"] = None
+        return stats
+
+
+class PhoneLookupCache:
+    """
+    Maps a canonical phone number to (user_id, group_id, email_delivery)
+    so a burst of M-Pesa callbacks does not query User once per payment.
+    Only hits are kept. Entries are dropped once a change to a user's phone,
+    group or email delivery, or the user's deletion, commits; the TTL bounds
+    anything that slips past.
+    """
+
+    STALE_KEY = "stale_phone_lookups"
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def init_app(self, app):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app.models import User
+
+        self.enabled = app.config.get("PHONE_LOOKUP_CACHE_ENABLED", True)
+        self.maxsize = app.config.get("PHONE_LOOKUP_CACHE_SIZE", self.maxsize)
+        self.ttl = app.config.get("PHONE_LOOKUP_CACHE_TTL", self.ttl)
+        if not event.contains(Session, "after_commit", self._after_commit):
+            event.listen(User.phone_e164, "set", self._on_phone_set, active_history=True)
+            event.listen(User.group_id, "set", self._on_user_changed)
+            event.listen(User.email_delivery, "set", self._on_user_changed)
+            event.listen(User, "after_delete", self._on_user_deleted)
+            event.listen(Session, "after_commit", self._after_commit)
+            event.listen(Session, "after_rollback", self._after_rollback)
+        app.extensions["phone_lookup_cache"] = self
+
+    def lookup(self, phone_e164):
+        """Returns (user_id, group_id, email_delivery) for a canonical phone, querying User only on a miss."""
+        from app.models import db, User
+
+        if not phone_e164:
+            return None
+        if self.enabled:
+            with self._lock:
+                entry = self._entries.get(phone_e164)
+                if entry is not None and entry[0] >= time.monotonic():
+                    self._entries.move_to_end(phone_e164)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                self._stats["misses"] += 1
+
+        row = db.session.query(User.id, User.group_id, User.email_delivery) \
+            .filter(User.phone_e164 == phone_e164).first()
+        if row is None:
+            return None
+        value = (row.id, row.group_id, row.email_delivery)
+        if self.enabled:
+            with self._lock:
+                self._entries[phone_e164] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(phone_e164)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *phones):
+        with self._lock:
+            for phone in phones:
+                if phone and self._entries.pop(phone, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _mark_stale(self, target, *phones):
+        # Drop now, and again after the commit, so a lookup that reads the
+        # old row in between cannot keep a stale entry for a whole TTL
+        self.invalidate(*phones)
+        from sqlalchemy.orm import object_session
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(self.STALE_KEY, set()).update(phone for phone in phones if phone)
+
+    def _on_phone_set(self, target, value, oldvalue, initiator):
+        old = oldvalue if isinstance(oldvalue, str) else None
+        self._mark_stale(target, old, value)
+
+    def _on_user_changed(self, target, value, oldvalue, initiator):
+        self._mark_stale(target, target.phone_e164)
+
+    def _on_user_deleted(self, mapper, connection, target):
+        self._mark_stale(target, target.phone_e164)
+
+    def _after_commit(self, session):
+        stale = session.info.pop(self.STALE_KEY, None)
+        if stale:
+            self.invalidate(*stale)
+
+    def _after_rollback(self, session):
+        session.info.pop(self.STALE_KEY, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["ttl"] = self.ttl
+        return stats
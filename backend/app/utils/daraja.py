@@ -0,0 +1,156 @@
+import random
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_BASE_URL = "https://sandbox.safaricom.co.ke"
+OAUTH_PATH = "/oauth/v1/generate?grant_type=client_credentials"
+STK_PUSH_PATH = "/mpesa/stkpush/v1/processrequest"
+STK_QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+B2C_PATH = "/mpesa/b2c/v1/paymentrequest"
+
+# Statuses worth another try on an idempotent call
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DarajaAuthError(requests.RequestException):
+    """No OAuth token could be had, so the request itself was never sent."""
+
+
+class DarajaClient:
+    """
+    HTTP client for the Safaricom Daraja API.
+
+    Owns one pooled requests.Session so OAuth, STK push and B2C calls reuse
+    kept-alive connections, and applies a (connect, read) timeout to every
+    call. Idempotent calls (the OAuth GET) are retried with exponential
+    backoff and jitter; payment POSTs are retried only when the connection
+    was never established, so a request Safaricom may have acted on is
+    never sent twice.
+    """
+
+    def __init__(self, token_cache=None):
+        self.token_cache = token_cache
+        self.base_url = SANDBOX_BASE_URL
+        self.oauth_url = None
+        self.stk_url = None
+        self.stk_query_url = None
+        self.b2c_url = None
+        self.consumer_key = None
+        self.consumer_secret = None
+        self.connect_timeout = 3.05
+        self.read_timeout = 15
+        self.max_retries = 2
+        self.backoff = 0.5
+        self.pool_size = 10
+        self.session = self._build_session()
+
+    def init_app(self, app):
+        config = app.config
+        self.base_url = (config.get("MPESA_BASE_URL") or SANDBOX_BASE_URL).rstrip("/")
+        # Full-URL overrides, e.g. to point one endpoint at the local simulator
+        self.oauth_url = config.get("MPESA_OAUTH_URL")
+        self.stk_url = config.get("MPESA_STK_URL")
+        self.stk_query_url = config.get("MPESA_STK_QUERY_URL")
+        self.b2c_url = config.get("MPESA_B2C_URL")
+        self.consumer_key = config.get("MPESA_CONSUMER_KEY")
+        self.consumer_secret = config.get("MPESA_CONSUMER_SECRET")
+        self.connect_timeout = config.get("MPESA_HTTP_CONNECT_TIMEOUT", self.connect_timeout)
+        self.read_timeout = config.get("MPESA_HTTP_READ_TIMEOUT", self.read_timeout)
+        self.max_retries = config.get("MPESA_HTTP_MAX_RETRIES", self.max_retries)
+        self.backoff = config.get("MPESA_HTTP_BACKOFF", self.backoff)
+        self.pool_size = config.get("MPESA_HTTP_POOL_SIZE", self.pool_size)
+        self.session = self._build_session()
+        app.extensions["daraja"] = self
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter keeps workers that failed together from retrying together
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _request(self, method, url, idempotent, **kwargs):
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectTimeout as e:
+                # Nothing reached Safaricom, so even a payment is safe to resend
+                error = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent:
+                    raise
+                error = e
+            else:
+                if not (idempotent and response.status_code in RETRY_STATUSES):
+                    return response
+                error = None
+
+            if attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+            logger.warning(f"Daraja {method} {url} failed (attempt {attempt + 1}), retrying: {error or response.status_code}")
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    def fetch_token(self):
+        """Requests a new OAuth token. Returns (token, expires_in seconds)."""
+        response = self._request(
+            "GET", self.oauth_url or self.base_url + OAUTH_PATH, idempotent=True,
+            auth=(self.consumer_key, self.consumer_secret)
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data.get("access_token"), int(data.get("expires_in", 3599))
+
+    def access_token(self):
+        if self.token_cache is None:
+            return self.fetch_token()[0]
+        return self.token_cache.get(self.fetch_token)
+
+    def _post(self, url, payload):
+        """
+        POSTs a request with a bearer token and returns the parsed JSON.
+        A 401 means the token was rejected before anything was processed,
+        so the token is dropped and the call made once more. Raises
+        DarajaAuthError when no token can be had.
+        """
+        for attempt in range(2):
+            try:
+                token = self.access_token()
+            except requests.RequestException as e:
+                raise DarajaAuthError(f"Failed to obtain access token: {e}") from e
+            if not token:
+                raise DarajaAuthError("Failed to obtain access token")
+            response = self._request(
+                "POST", url, idempotent=False, json=payload,
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+            )
+            if response.status_code != 401 or self.token_cache is None or attempt:
+                break
+            self.token_cache.invalidate()
+        response.raise_for_status()
+        return response.json()
+
+    def stk_push(self, payload):
+        return self._post(self.stk_url or self.base_url + STK_PUSH_PATH, payload)
+
+    def stk_query(self, payload):
+        """
+        Asks for the outcome of an STK push. Not retried here: the caller
+        polls again later, and each retry would spend its query budget.
+        """
+        return self._post(self.stk_query_url or self.base_url + STK_QUERY_PATH, payload)
+
+    def b2c_payment(self, payload):
+        return self._post(self.b2c_url or self.base_url + B2C_PATH, payload)
@@ -0,0 +1,161 @@
+import datetime
+import logging
+from markupsafe import escape
+from app.models import db, User, Notification, GroupBroadcast, BroadcastReceipt
+from app.utils.email_outbox import queue_email
+
+logger = logging.getLogger(__name__)
+
+IMMEDIATE = "immediate"
+DIGEST = "digest"
+DELIVERY_MODES = (IMMEDIATE, DIGEST)
+
+
+def _item_html(message, notification_type, date):
+    return f"""
+    <tr>
+      <td style="padding:8px 0;border-bottom:1px solid #eee;">
+        <strong>{escape(notification_type)}</strong><br>
+        {escape(message)}<br>
+        <small style="color:#888;">{date.strftime("%d %b %Y, %H:%M")}</small>
+      </td>
+    </tr>"""
+
+
+def render_notification_email(name, message, notification_type, date):
+    """Subject and HTML body for a single notification sent immediately."""
+    html_body = f"""
+    <p>Hi {escape(name)},</p>
+    <table style="width:100%;border-collapse:collapse;">{_item_html(message, notification_type, date)}
+    </table>
+    <p>You can change how often we email you in your profile settings.</p>
+    """
+    return f"Maziwa: {notification_type}", html_body
+
+
+def render_digest_email(name, items):
+    """Subject and HTML body for a digest of (message, type, date) items, oldest first."""
+    rows = "".join(_item_html(*item) for item in items)
+    html_body = f"""
+    <p>Hi {escape(name)},</p>
+    <p>Here is what happened since your last update:</p>
+    <table style="width:100%;border-collapse:collapse;">{rows}
+    </table>
+    <p>You can change how often we email you in your profile settings.</p>
+    """
+    count = len(items)
+    return f"Maziwa: {count} new notification{'s' if count != 1 else ''}", html_body
+
+
+def queue_immediate_emails(users, message, notification_type, date):
+    """
+    Queues a notification email for each given user who chose immediate
+    delivery and has a verified address. Does not commit.
+    """
+    for user in users:
+        if user.email_delivery != IMMEDIATE or not user.is_verified:
+            continue
+        subject, html_body = render_notification_email(user.name, message, notification_type, date)
+        queue_email(subject, user.email, html_body)
+
+
+def _unread_items(user_ids, window_start):
+    """
+    Unread personal notifications and group broadcasts newer than each
+    user's last digest (or window_start), leaving out broadcasts from before
+    they joined the group, as {user_id: [(message, type, date)]}.
+    """
+    since = db.func.coalesce(User.digest_sent_at, window_start)
+    items = {user_id: [] for user_id in user_ids}
+
+    personal = db.session.query(
+        User.id, Notification.message, Notification.type, Notification.date
+    ).join(Notification, Notification.user_id == User.id).filter(
+        User.id.in_(user_ids),
+        Notification.read.is_(False),
+        Notification.date > since
+    )
+
+    receipt = db.aliased(BroadcastReceipt)
+    broadcasts = db.session.query(
+        User.id, GroupBroadcast.message, GroupBroadcast.type, GroupBroadcast.date
+    ).join(GroupBroadcast, GroupBroadcast.group_id == User.group_id).outerjoin(
+        receipt,
+        db.and_(receipt.broadcast_id == GroupBroadcast.id, receipt.user_id == User.id)
+    ).filter(
+        User.id.in_(user_ids),
+        GroupBroadcast.date >= db.func.coalesce(User.joined_group_at, GroupBroadcast.date),
+        db.or_(GroupBroadcast.excluded_user_id.is_(None), GroupBroadcast.excluded_user_id != User.id),
+        db.not_(db.func.coalesce(receipt.read, False)),
+        db.not_(db.func.coalesce(receipt.deleted, False)),
+        GroupBroadcast.date > since
+    )
+
+    for user_id, message, notification_type, date in personal.union_all(broadcasts).all():
+        items[user_id].append((message, notification_type, date))
+    for user_items in items.values():
+        user_items.sort(key=lambda item: item[2])
+    return items
+
+
+def send_digests(window_hours=24, batch_size=200):
+    """
+    Queues one digest email per member on digest delivery whose window has
+    elapsed, covering their unread notifications since the last digest.
+    Members are handled in batches, committing after each, and every
+    handled member's window restarts even if there was nothing to send.
+
+    Returns {"users", "emails"}.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    window_start = now - datetime.timedelta(hours=window_hours)
+    due = User.query.filter(
+        User.email_delivery == DIGEST,
+        User.is_verified.is_(True),
+        db.or_(User.digest_sent_at.is_(None), User.digest_sent_at <= window_start)
+    ).order_by(User.id)
+
+    users_seen = emails = 0
+    last_id = 0
+    while True:
+        users = due.filter(User.id > last_id).limit(batch_size).all()
+        if not users:
+            break
+        last_id = users[-1].id
+
+        items = _unread_items([user.id for user in users], window_start)
+        for user in users:
+            if items[user.id]:
+                subject, html_body = render_digest_email(user.name, items[user.id])
+                queue_email(subject, user.email, html_body)
+                emails += 1
+            user.digest_sent_at = now
+        db.session.commit()
+        users_seen += len(users)
+
+    logger.info(f"Digest run: {emails} email(s) queued for {users_seen} member(s)")
+    return {"users": users_seen, "emails": emails}
+
+
+def start_digest_job(app):
+    """
+    Starts the in-process digest loop when DIGEST_INTERVAL is set.
+    Leave it at 0 to run `flask notifications send-digests` from cron instead.
+    """
+    from app.extensions import socketio
+
+    interval = app.config.get("DIGEST_INTERVAL", 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    send_digests(app.config.get("DIGEST_WINDOW_HOURS", 24), app.config.get("DIGEST_BATCH_SIZE", 200))
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Digest run failed: {e}")
+
+    return socketio.start_background_task(run)
@@ -0,0 +1,425 @@
+import datetime
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from sqlalchemy.exc import IntegrityError
+from app.utils.daraja import DarajaAuthError
+from app.models import (
+    db, Disbursement, Loan, LoanStatus, Transaction, TransactionType, TransactionReason, WithdrawalRequest
+)
+
+logger = logging.getLogger(__name__)
+
+LOAN = "loan"
+WITHDRAWAL = "withdrawal"
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def serialize_disbursement(disbursement):
+    return {
+        "id": disbursement.id,
+        "kind": disbursement.kind,
+        "loan_id": disbursement.loan_id,
+        "withdrawal_id": disbursement.withdrawal_id,
+        "amount": disbursement.amount,
+        "status": disbursement.status,
+        "attempts": disbursement.attempts,
+        "last_error": disbursement.last_error,
+        "outcome_unknown": disbursement.outcome_unknown,
+        "created_at": disbursement.created_at.isoformat() if disbursement.created_at else None,
+        "sent_at": disbursement.sent_at.isoformat() if disbursement.sent_at else None,
+        "completed_at": disbursement.completed_at.isoformat() if disbursement.completed_at else None,
+    }
+
+
+def queue_disbursement(kind, user_id, group_id, phone, amount, reason, loan_id=None, withdrawal_id=None):
+    """
+    Queues a B2C payout in the caller's transaction. A loan or withdrawal
+    has at most one disbursement: asking again returns the existing one,
+    re-queued if Daraja refused it. One whose outcome is unknown is
+    returned as it is, failed, since it may have paid out; callers should
+    leave it to `flask mpesa requeue-disbursement`. Does not commit.
+    """
+    existing = Disbursement.query.filter_by(loan_id=loan_id, withdrawal_id=withdrawal_id).first() \
+        if (loan_id or withdrawal_id) else None
+    if existing:
+        if existing.status == FAILED and not existing.outcome_unknown:
+            requeue(existing)
+        return existing
+
+    disbursement = Disbursement(
+        kind=kind,
+        loan_id=loan_id,
+        withdrawal_id=withdrawal_id,
+        user_id=user_id,
+        group_id=group_id,
+        phone=phone,
+        amount=amount,
+        reason=reason,
+        status=QUEUED,
+        next_attempt_at=_now()
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(disbursement)
+    except IntegrityError:
+        # Queued by a concurrent request in the meantime
+        return Disbursement.query.filter_by(loan_id=loan_id, withdrawal_id=withdrawal_id).first()
+    return disbursement
+
+
+def requeue(disbursement):
+    """
+    Puts a failed disbursement back in the queue with a fresh attempt count,
+    reinstating its loan if the failure had unwound it. Does not commit.
+    """
+    if disbursement.kind == LOAN:
+        _reinstate_loan(disbursement)
+    disbursement.status = QUEUED
+    disbursement.attempts = 0
+    disbursement.last_error = None
+    disbursement.outcome_unknown = False
+    disbursement.completed_at = None
+    disbursement.next_attempt_at = _now()
+
+
+def settle_disbursement(result):
+    """
+    Applies a B2C result callback to the disbursement it answers, if any.
+    Returns the disbursement, or None for payouts sent outside the queue.
+    Does not commit.
+    """
+    originator_id = result.get("OriginatorConversationID")
+    conversation_id = result.get("ConversationID")
+    disbursement = None
+    if originator_id:
+        disbursement = Disbursement.query.filter_by(originator_conversation_id=originator_id).first()
+    if not disbursement and conversation_id:
+        disbursement = Disbursement.query.filter_by(conversation_id=conversation_id).first()
+    if not disbursement:
+        return None
+
+    disbursement.outcome_unknown = False  # M-Pesa has answered
+    if result.get("ResultCode") == 0:
+        disbursement.status = CONFIRMED
+        disbursement.last_error = None
+        if disbursement.kind == LOAN:
+            _book_loan_disbursement(disbursement)
+    else:
+        disbursement.status = FAILED
+        disbursement.last_error = result.get("ResultDesc")
+        logger.error(f"Disbursement {disbursement.id} ({disbursement.kind}) failed at M-Pesa: {disbursement.last_error}")
+        if disbursement.kind == LOAN:
+            _unwind_loan(disbursement)
+    disbursement.completed_at = _now()
+    return disbursement
+
+
+def _book_loan_disbursement(disbursement):
+    """
+    Records the group's DEBIT for a loan M-Pesa has paid out and tells the
+    borrower. Books once per loan, however often the result is applied.
+    """
+    from app.utils.ledger import apply_balance_delta
+    from app.utils.notify import notify_user
+
+    loan = db.session.get(Loan, disbursement.loan_id)
+    if loan.disbursed_transaction_id:
+        return
+    if loan.status == LoanStatus.FAILED:
+        # Unwound after an earlier failure, yet the money went out after all
+        _reinstate_loan(disbursement)
+    # Interest runs from the day the borrower got the money
+    loan.status = LoanStatus.DISBURSED
+    loan.date = _now()
+    tx = Transaction(
+        user_id=loan.user_id,
+        group_id=loan.group_id,
+        amount=loan.amount,
+        type=TransactionType.DEBIT,
+        reason=TransactionReason.LOAN_DISBURSEMENT,
+        date=_now()
+    )
+    db.session.add(tx)
+    apply_balance_delta(loan.group_id, loans_disbursed=loan.amount)
+    db.session.flush()
+    loan.disbursed_transaction_id = tx.id
+
+    notify_user(loan.user_id, loan.group_id, f"Your loan of Ksh {loan.amount} was disbursed.", "Loan disbursed")
+
+
+def _unwind_loan(disbursement):
+    """
+    Marks a loan whose payout M-Pesa refused or rejected as failed and
+    releases the principal it held against the group's cash. Does nothing
+    to a loan that was paid out or is already unwound. A payout whose
+    outcome is unknown leaves its loan pending until that is settled.
+    """
+    from app.utils.ledger import apply_balance_delta
+    from app.utils.notify import notify_user
+
+    loan = db.session.get(Loan, disbursement.loan_id)
+    if loan.disbursed_transaction_id or loan.status == LoanStatus.FAILED:
+        return
+    apply_balance_delta(loan.group_id, outstanding_principal=-loan.outstanding)
+    loan.outstanding = 0
+    loan.status = LoanStatus.FAILED
+
+    notify_user(
+        loan.user_id, loan.group_id,
+        f"Your loan of Ksh {loan.amount} could not be sent to M-Pesa and has been cancelled.", "Loan failed"
+    )
+
+
+def _reinstate_loan(disbursement):
+    """Undoes _unwind_loan for a payout that is being sent again."""
+    from app.utils.ledger import apply_balance_delta
+
+    loan = db.session.get(Loan, disbursement.loan_id)
+    if loan.status != LoanStatus.FAILED:
+        return
+    loan.status = LoanStatus.PENDING
+    loan.outstanding = loan.amount
+    apply_balance_delta(loan.group_id, outstanding_principal=loan.amount)
+
+
+class _RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DisbursementDispatcher:
+    """
+    Sends queued B2C payouts to Daraja at no more than `rate` requests per
+    second with at most `concurrency` in flight, so a burst of approvals
+    neither trips Safaricom's limits nor holds web workers. A payout Daraja
+    refuses is retried with backoff; one whose fate is unknown (the
+    connection dropped after sending) is failed rather than resent, since
+    B2C calls are not idempotent. Status moves queued -> sent -> confirmed
+    or failed, the last step driven by the B2C result callback; a loan's
+    DEBIT is booked only once that callback confirms the payout.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.rate = 2.0
+        self.concurrency = 2
+        self.batch_size = 10
+        self.poll_interval = 2
+        self.max_attempts = 3
+        self.backoff_base = 60
+        self.claim_timeout = 300
+        self._app = None
+        self._started = False
+        self._executor = None
+        self._limiter = _RateLimiter(self.rate)
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "retried": 0, "failed": 0, "unknown": 0, "batches": 0, "errors": 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get("MPESA_B2C_DISPATCHER", True)
+        self.rate = config.get("MPESA_B2C_RATE", self.rate)
+        self.concurrency = config.get("MPESA_B2C_CONCURRENCY", self.concurrency)
+        self.batch_size = config.get("MPESA_B2C_BATCH_SIZE", self.batch_size)
+        self.poll_interval = config.get("MPESA_B2C_POLL_INTERVAL", self.poll_interval)
+        self.max_attempts = config.get("MPESA_B2C_MAX_ATTEMPTS", self.max_attempts)
+        self.backoff_base = config.get("MPESA_B2C_BACKOFF_BASE", self.backoff_base)
+        self.claim_timeout = config.get("MPESA_B2C_CLAIM_TIMEOUT", self.claim_timeout)
+        self._limiter = _RateLimiter(self.rate)
+        self._app = app
+        app.before_request(self._ensure_started)
+        app.extensions["disbursements"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["running"] = self._started
+        stats["rate"] = self.rate
+        stats["concurrency"] = self.concurrency
+        stats["by_status"] = dict(
+            db.session.query(Disbursement.status, db.func.count(Disbursement.id)).group_by(Disbursement.status).all()
+        )
+        return stats
+
+    def backoff(self, attempts):
+        """Seconds to wait before resending after the given number of refused attempts."""
+        return self.backoff_base * 2 ** (attempts - 1)
+
+    def _ensure_started(self):
+        if self._started or not self.enabled:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        from app.extensions import socketio
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        from app.extensions import socketio
+        while True:
+            processed = 0
+            with self._app.app_context():
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    db.session.rollback()
+                    self._count("errors")
+                    logger.error(f"Disbursement batch failed: {e}")
+            if not processed:
+                socketio.sleep(self.poll_interval)
+
+    def _fail_stale_claims(self, now):
+        """A claim that outlived claim_timeout died mid-send; it may have paid out, so it is not resent."""
+        stale = Disbursement.query.filter(
+            Disbursement.status == SENDING,
+            Disbursement.next_attempt_at <= now
+        ).with_for_update(skip_locked=True).all()
+        for disbursement in stale:
+            disbursement.status = FAILED
+            disbursement.outcome_unknown = True
+            disbursement.last_error = "Dispatcher stopped while sending; check M-Pesa before requeueing"
+            disbursement.completed_at = now
+            self._count("unknown")
+            logger.error(f"Disbursement {disbursement.id} was left mid-send")
+
+    def claim_batch(self):
+        """
+        Claims up to batch_size due payouts and returns their (id, payload)
+        pairs. Each attempt gets its own OriginatorConversationID, which is
+        how the result callback finds the disbursement again; the random
+        suffix keeps it unique after a requeue resets the attempt count.
+        """
+        from app.utils.mpesa import build_b2c_payload
+
+        now = _now()
+        self._fail_stale_claims(now)
+        disbursements = Disbursement.query.filter(
+            Disbursement.status == QUEUED,
+            Disbursement.next_attempt_at <= now
+        ).order_by(Disbursement.next_attempt_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for disbursement in disbursements:
+            disbursement.status = SENDING
+            disbursement.attempts += 1
+            disbursement.next_attempt_at = now + datetime.timedelta(seconds=self.claim_timeout)
+            disbursement.originator_conversation_id = f"disb-{disbursement.id}-{disbursement.attempts}-{uuid.uuid4().hex[:8]}"
+            claimed.append((disbursement.id, build_b2c_payload(
+                disbursement.phone, disbursement.amount, disbursement.reason,
+                disbursement.originator_conversation_id
+            )))
+        db.session.commit()
+        return claimed
+
+    def _send(self, payload):
+        """
+        Sends one payout. Returns (response, error, outcome) with outcome
+        accepted, refused or unknown. Only failures where the request was
+        never sent or Safaricom turned it away (a 4xx) count as refused; a
+        5xx from Daraja or its gateway may come after the payout was made.
+        """
+        from app.extensions import daraja
+
+        self._limiter.acquire()
+        try:
+            response = daraja.b2c_payment(payload)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            body = e.response.text[:500] if e.response is not None else ""
+            outcome = "refused" if status is not None and status < 500 else "unknown"
+            return None, f"{e} {body}".strip(), outcome
+        except (DarajaAuthError, requests.ConnectTimeout) as e:
+            return None, str(e), "refused"  # never reached Safaricom
+        except requests.RequestException as e:
+            return None, str(e), "unknown"
+        if response.get("ResponseCode") != "0":
+            return response, response.get("ResponseDescription") or str(response), "refused"
+        return response, None, "accepted"
+
+    def deliver(self, claimed):
+        """Sends the claimed payouts on the bounded pool, returning {id: (response, error, outcome)}."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="b2c")
+        results = self._executor.map(self._send, [payload for _, payload in claimed])
+        return {disbursement_id: result for (disbursement_id, _), result in zip(claimed, results)}
+
+    def process_batch(self):
+        """Claims, sends and records one batch. Returns the number of payouts handled."""
+        from app.extensions import summary_cache
+
+        claimed = self.claim_batch()
+        if not claimed:
+            return 0
+
+        results = self.deliver(claimed)
+        now = _now()
+        group_ids = set()
+        for disbursement_id, (response, error, outcome) in results.items():
+            disbursement = db.session.get(Disbursement, disbursement_id)
+            if outcome == "accepted":
+                disbursement.status = SENT
+                disbursement.sent_at = now
+                disbursement.last_error = None
+                disbursement.conversation_id = response.get("ConversationID")
+                if disbursement.kind == WITHDRAWAL:
+                    withdrawal = db.session.get(WithdrawalRequest, disbursement.withdrawal_id)
+                    withdrawal.mpesa_transaction_id = disbursement.originator_conversation_id
+                group_ids.add(disbursement.group_id)
+                self._count("sent")
+            elif outcome == "unknown":
+                disbursement.status = FAILED
+                disbursement.outcome_unknown = True
+                disbursement.last_error = f"No clear answer from Daraja, the payout may have gone out: {error}"
+                disbursement.completed_at = now
+                self._count("unknown")
+                logger.error(f"Disbursement {disbursement.id} outcome unknown: {error}")
+            elif disbursement.attempts >= self.max_attempts:
+                disbursement.status = FAILED
+                disbursement.last_error = error
+                disbursement.completed_at = now
+                if disbursement.kind == LOAN:
+                    _unwind_loan(disbursement)
+                    group_ids.add(disbursement.group_id)
+                self._count("failed")
+                logger.error(f"Giving up on disbursement {disbursement.id}: {error}")
+            else:
+                disbursement.status = QUEUED
+                disbursement.last_error = error
+                disbursement.next_attempt_at = now + datetime.timedelta(seconds=self.backoff(disbursement.attempts))
+                self._count("retried")
+                logger.warning(f"Disbursement {disbursement.id} refused, retrying: {error}")
+        db.session.commit()
+        for group_id in group_ids:
+            summary_cache.invalidate_group(group_id)
+        self._count("batches")
+        return len(claimed)
@@ -0,0 +1,178 @@
+import datetime
+import logging
+import threading
+from app.models import db, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def queue_email(subject, recipient, html_body, sender=None):
+    """
+    Queues a transactional email in the caller's transaction. It is sent by
+    the outbox worker once the caller commits; a rollback drops it.
+    Does not commit.
+    """
+    email = EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        html_body=html_body,
+        sender=sender,
+        status=PENDING,
+        next_attempt_at=_now()
+    )
+    db.session.add(email)
+    return email
+
+
+class EmailOutboxWorker:
+    """
+    Delivers queued EmailOutbox rows in the background with retries and
+    exponential backoff. The worker starts with the first request a process
+    serves, so CLI commands and migrations never spawn it.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.batch_size = 20
+        self.poll_interval = 2
+        self.max_attempts = 6
+        self.backoff_base = 30
+        self.backoff_max = 3600
+        self.claim_timeout = 300
+        self._app = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "retried": 0, "failed": 0, "batches": 0, "errors": 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get("EMAIL_OUTBOX_WORKER", True)
+        self.batch_size = config.get("EMAIL_OUTBOX_BATCH_SIZE", self.batch_size)
+        self.poll_interval = config.get("EMAIL_OUTBOX_POLL_INTERVAL", self.poll_interval)
+        self.max_attempts = config.get("EMAIL_OUTBOX_MAX_ATTEMPTS", self.max_attempts)
+        self.backoff_base = config.get("EMAIL_OUTBOX_BACKOFF_BASE", self.backoff_base)
+        self.backoff_max = config.get("EMAIL_OUTBOX_BACKOFF_MAX", self.backoff_max)
+        self.claim_timeout = config.get("EMAIL_OUTBOX_CLAIM_TIMEOUT", self.claim_timeout)
+        self._app = app
+        app.before_request(self._ensure_started)
+        app.extensions["email_outbox"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["running"] = self._started
+        return stats
+
+    def backoff(self, attempts):
+        """Seconds to wait before the next try after the given number of failed attempts."""
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def _ensure_started(self):
+        if self._started or not self.enabled:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        from app.extensions import socketio
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        from app.extensions import socketio
+        while True:
+            processed = 0
+            with self._app.app_context():
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    db.session.rollback()
+                    self._count("errors")
+                    logger.error(f"Email outbox batch failed: {e}")
+            if not processed:
+                socketio.sleep(self.poll_interval)
+
+    def claim_batch(self):
+        """
+        Claims up to batch_size due emails. Claimed rows are pushed out by
+        claim_timeout, so a worker that dies mid-send lets another retry them.
+        Workers in other processes skip rows already locked by a claim.
+        """
+        now = _now()
+        emails = EmailOutbox.query.filter(
+            EmailOutbox.status.in_((PENDING, SENDING)),
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        for email in emails:
+            email.status = SENDING
+            email.attempts += 1
+            email.next_attempt_at = now + datetime.timedelta(seconds=self.claim_timeout)
+        ids = [email.id for email in emails]
+        db.session.commit()
+
+        # Reload the claimed rows in one query rather than one refresh per row
+        return EmailOutbox.query.filter(EmailOutbox.id.in_(ids)).order_by(EmailOutbox.id).all() if ids else []
+
+    def deliver(self, emails):
+        """Sends the claimed emails, returning {email_id: error or None}."""
+        from flask import current_app
+        from app.utils.helpers import build_email_message
+
+        results = {}
+        messages = []
+        for email in emails:
+            try:
+                messages.append((email.id, build_email_message(email.subject, email.recipient, email.html_body, email.sender)))
+            except Exception as e:
+                results[email.id] = str(e) or type(e).__name__
+
+        # The whole batch goes out over one pooled SMTP connection
+        try:
+            errors = current_app.extensions["smtp_pool"].send_batch([message for _, message in messages])
+        except Exception as e:
+            errors = [str(e) or type(e).__name__] * len(messages)
+        results.update({email_id: error for (email_id, _), error in zip(messages, errors)})
+        return results
+
+    def process_batch(self):
+        """Claims, sends and records one batch. Returns the number of emails handled."""
+        emails = self.claim_batch()
+        if not emails:
+            return 0
+
+        results = self.deliver(emails)
+        now = _now()
+        for email in emails:
+            error = results.get(email.id, "not attempted")
+            if error is None:
+                email.status = SENT
+                email.sent_at = now
+                email.last_error = None
+                self._count("sent")
+            elif email.attempts >= self.max_attempts:
+                email.status = FAILED
+                email.last_error = error
+                self._count("failed")
+                logger.error(f"Giving up on email {email.id} to {email.recipient}: {error}")
+            else:
+                email.status = PENDING
+                email.last_error = error
+                email.next_attempt_at = now + datetime.timedelta(seconds=self.backoff(email.attempts))
+                self._count("retried")
+                logger.warning(f"Email {email.id} to {email.recipient} failed, retrying: {error}")
+        db.session.commit()
+        self._count("batches")
+        return len(emails)
@@ -1,4 +1,3 @@
-import re
 import os
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask import current_app
@@ -6,24 +5,14 @@ from flask_mail import Message
 from app.extensions import mail
 from markupsafe import Markup
 from app.models import User, db
+from app.utils.phone import normalize_phone
 
 def format_phone_number(phone: str) -> str | None:
     """
     Ensure the phone number is in valid Kenyan format: 2547XXXXXXXX or 2541XXXXXXXX
     Returns formatted phone number (254XXXXXXXXX) or None if invalid.
     """
-    if not phone:
-        return None
-
-    phone = phone.strip().replace(" ", "").lstrip("+")
-    if phone.startswith("0") and len(phone) == 10:
-        phone = "254" + phone[1:]
-    elif not phone.startswith("254"):
-        phone = f"254{phone[-9:]}"
-
-    if re.fullmatch(r"254(7\d{8}|1\d{8})", phone):
-        return phone
-    return None
+    return normalize_phone(phone)
 
 
 # TOKEN HELPERS
@@ -55,39 +44,46 @@ def confirm_token(token: str, expiration: int = 3600) -> str | None:
 
 
 # Email HELper
-def send_email(subject: str, recipient: str, html_body: str, sender: str | None = None) -> bool:
+def build_email_message(subject: str, recipient: str, html_body: str, sender: str | None = None) -> Message:
     """
-    Sends a styled email with both HTML and plain-text parts.
+    Builds a styled email with both HTML and plain-text parts.
     Adds proper headers to improve Gmail deliverability.
     """
-    try:
-        mail = current_app.extensions.get("mail")
-        if not mail:
-            current_app.logger.error("Mail extension not initialized.")
-            return False
+    sender_email = sender or current_app.config.get("MAIL_USERNAME")
+    from_name = current_app.config.get("APP_NAME", "Maziwa")  # or your project name
+    msg = Message(
+        subject=subject,
+        recipients=[recipient],
+        sender=(from_name, sender_email),
+        reply_to=sender_email,
+    )
 
-        sender_email = sender or current_app.config.get("MAIL_USERNAME")
-        from_name = current_app.config.get("APP_NAME", "Maziwa")  # or your project name
-        msg = Message(
-            subject=subject,
-            recipients=[recipient],
-            sender=(from_name, sender_email),
-            reply_to=sender_email,
-        )
+    # Plain text fallback
+    plain_body = Markup(html_body).striptags()
+    msg.body = plain_body
+    msg.html = html_body
+
+    # Optional headers (help Gmail trust your email more)
+    msg.extra_headers = {
+        "X-Priority": "3",
+        "X-Mailer": "Flask-Mail",
+        "Content-Type": "text/html; charset=UTF-8"
+    }
+    return msg
 
-        # Plain text fallback
-        plain_body = Markup(html_body).striptags()
-        msg.body = plain_body
-        msg.html = html_body
 
-        # Optional headers (help Gmail trust your email more)
-        msg.extra_headers = {
-            "X-Priority": "3",
-            "X-Mailer": "Flask-Mail",
-            "Content-Type": "text/html; charset=UTF-8"
-        }
+def send_email(subject: str, recipient: str, html_body: str, sender: str | None = None) -> bool:
+    """
+    Sends an email synchronously over a pooled SMTP connection.
+    Request handlers should use queue_email from app.utils.email_outbox instead.
+    """
+    try:
+        pool = current_app.extensions.get("smtp_pool")
+        if not pool or not current_app.extensions.get("mail"):
+            current_app.logger.error("Mail extension not initialized.")
+            return False
 
-        mail.send(msg)
+        pool.send(build_email_message(subject, recipient, html_body, sender))
         current_app.logger.info(f"✅ Email sent successfully to {recipient}")
         return True
 
@@ -1,7 +1,6 @@
 import jwt
 import datetime
 from flask import current_app
-from app.models import TokenBlacklist
 
 
 def create_access_token(user_id):
@@ -36,8 +35,7 @@ def decode_jwt(token):
     try:
         decoded_token = jwt.decode(token, current_app.config["JWT_SECRET_KEY"], algorithms=["HS256"])
 
-        blacklisted = TokenBlacklist.query.filter_by(token=token).first()
-        if blacklisted:
+        if current_app.extensions["token_revocations"].is_revoked(decoded_token.get("jti")):
             return None
         
         return decoded_token
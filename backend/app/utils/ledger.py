@@ -0,0 +1,208 @@
+import datetime
+from sqlalchemy.exc import IntegrityError
+from app.models import (
+    db, GroupBalance, MemberMonthTotal, Contribution, Transaction, TransactionType,
+    TransactionReason, WithdrawalRequest, WithdrawalStatus, Loan, LoanStatus
+)
+
+# Withdrawals count against the group's cash as soon as members approve them
+COUNTED_WITHDRAWAL_STATUSES = (WithdrawalStatus.APPROVED, WithdrawalStatus.COMPLETED)
+ACTIVE_LOAN_STATUSES = (LoanStatus.DISBURSED, LoanStatus.PARTIALLY_REPAID)
+# A loan's principal is held against the group's cash from approval, before the payout lands
+RESERVED_LOAN_STATUSES = (LoanStatus.PENDING,) + ACTIVE_LOAN_STATUSES
+
+BALANCE_FIELDS = (
+    "total_contributions",
+    "total_withdrawals",
+    "loans_disbursed",
+    "loans_repaid",
+    "outstanding_principal",
+)
+
+
+def _sum(query):
+    return float(query.scalar() or 0.0)
+
+
+def compute_group_totals(group_id):
+    """Recomputes a group's running totals from the source tables."""
+    return {
+        "total_contributions": _sum(
+            db.session.query(db.func.sum(Contribution.amount)).filter(Contribution.group_id == group_id)
+        ),
+        "total_withdrawals": _sum(
+            db.session.query(db.func.sum(Transaction.amount)).join(
+                WithdrawalRequest, WithdrawalRequest.transaction_id == Transaction.id
+            ).filter(
+                Transaction.group_id == group_id,
+                Transaction.type == TransactionType.DEBIT,
+                WithdrawalRequest.status.in_(COUNTED_WITHDRAWAL_STATUSES)
+            )
+        ),
+        "loans_disbursed": _sum(
+            db.session.query(db.func.sum(Transaction.amount)).filter(
+                Transaction.group_id == group_id,
+                Transaction.type == TransactionType.DEBIT,
+                db.func.lower(Transaction.reason) == TransactionReason.LOAN_DISBURSEMENT
+            )
+        ),
+        "loans_repaid": _sum(
+            db.session.query(db.func.sum(Transaction.amount)).filter(
+                Transaction.group_id == group_id,
+                Transaction.type == TransactionType.CREDIT,
+                db.func.lower(Transaction.reason) == TransactionReason.LOAN_REPAYMENT
+            )
+        ),
+        "outstanding_principal": _sum(
+            db.session.query(db.func.sum(Loan.outstanding)).filter(
+                Loan.group_id == group_id,
+                Loan.status.in_(RESERVED_LOAN_STATUSES)
+            )
+        ),
+    }
+
+
+def recompute_group_balance(group_id):
+    """
+    Rebuilds the GroupBalance row for a group from the source tables.
+    Does not commit; the caller owns the transaction.
+    """
+    totals = compute_group_totals(group_id)
+    balance = db.session.get(GroupBalance, group_id)
+    if not balance:
+        balance = GroupBalance(group_id=group_id)
+        db.session.add(balance)
+
+    for field, value in totals.items():
+        setattr(balance, field, value)
+    balance.updated_at = datetime.datetime.now(datetime.timezone.utc)
+    db.session.flush()
+    return balance
+
+
+def _insert_group_balance(group_id):
+    """
+    Builds a group's missing GroupBalance row from the source tables inside a
+    savepoint. Returns the row, or None if a concurrent writer inserted it
+    first. Does not commit.
+    """
+    balance = GroupBalance(
+        group_id=group_id,
+        updated_at=datetime.datetime.now(datetime.timezone.utc),
+        **compute_group_totals(group_id)
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(balance)
+    except IntegrityError:
+        return None
+    return balance
+
+
+def get_group_balance(group_id):
+    """
+    Returns the group's running totals, building the row on first use.
+    Does not commit; the route keeps a row it built by committing.
+    """
+    balance = db.session.get(GroupBalance, group_id)
+    if balance:
+        return balance
+
+    # Another request may be building it too; if theirs lands first, read theirs
+    return _insert_group_balance(group_id) or db.session.get(GroupBalance, group_id, populate_existing=True)
+
+
+def apply_balance_delta(group_id, **deltas):
+    """
+    Adds the given amounts to a group's running totals in the caller's transaction.
+
+    Call this after the source rows for the movement have been added to the
+    session. The increment is a single UPDATE so concurrent writers never lose
+    each other's amounts. If the group has no balance row yet it is built from
+    the (already flushed) source rows, which include this movement.
+    """
+    unknown = set(deltas) - set(BALANCE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown balance fields: {', '.join(sorted(unknown))}")
+
+    values = {
+        getattr(GroupBalance, field): getattr(GroupBalance, field) + float(amount)
+        for field, amount in deltas.items() if amount
+    }
+    if not values:
+        return
+
+    db.session.flush()
+    values[GroupBalance.updated_at] = datetime.datetime.now(datetime.timezone.utc)
+    increment = db.update(GroupBalance).where(GroupBalance.group_id == group_id).values(values)
+    if db.session.execute(increment).rowcount:
+        return
+
+    if _insert_group_balance(group_id) is None:
+        # Another writer built the row first, from source rows that could not see this movement; add to theirs
+        db.session.execute(increment)
+
+
+def record_member_credit(group_id, user_id, amount, date=None):
+    """
+    Adds a CREDIT transaction to the member's monthly rollup in the caller's transaction.
+    """
+    if not amount:
+        return
+
+    date = date or datetime.datetime.now(datetime.timezone.utc)
+    year_month = MemberMonthTotal.key_for(date)
+    key = (
+        MemberMonthTotal.group_id == group_id,
+        MemberMonthTotal.user_id == user_id,
+        MemberMonthTotal.year_month == year_month,
+    )
+    increment = db.update(MemberMonthTotal).where(*key).values(total=MemberMonthTotal.total + float(amount))
+
+    db.session.flush()
+    if db.session.execute(increment).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(MemberMonthTotal(
+                group_id=group_id, user_id=user_id, year_month=year_month, total=float(amount)
+            ))
+    except IntegrityError:
+        # Another writer created the row first; add to theirs
+        db.session.execute(increment)
+
+
+def backfill_member_month_totals(group_id=None):
+    """
+    Rebuilds the monthly rollup from the CREDIT transactions.
+    Does not commit; returns the number of rollup rows written.
+    """
+    year = db.func.extract("year", Transaction.date)
+    month = db.func.extract("month", Transaction.date)
+    query = db.session.query(
+        Transaction.group_id, Transaction.user_id, year, month, db.func.sum(Transaction.amount)
+    ).filter(
+        Transaction.type == TransactionType.CREDIT,
+        Transaction.user_id.isnot(None)
+    ).group_by(Transaction.group_id, Transaction.user_id, year, month)
+
+    delete = db.delete(MemberMonthTotal)
+    if group_id:
+        query = query.filter(Transaction.group_id == group_id)
+        delete = delete.where(MemberMonthTotal.group_id == group_id)
+
+    rows = [
+        {
+            "group_id": gid,
+            "user_id": uid,
+            "year_month": f"{int(y):04d}-{int(m):02d}",
+            "total": float(total or 0.0),
+        }
+        for gid, uid, y, m, total in query.all()
+    ]
+
+    db.session.execute(delete)
+    if rows:
+        db.session.execute(db.insert(MemberMonthTotal), rows)
+    return len(rows)
@@ -0,0 +1,71 @@
+import datetime
+from app.models import db, Transaction, TransactionType, TransactionReason, Contribution, Loan
+from app.utils.ledger import ACTIVE_LOAN_STATUSES
+
+FIGURES = ("month_credits", "lifetime_contributions", "outstanding_loans", "repayments")
+
+
+def _row(user_id, **figures):
+    """One branch of the union: user_id plus every figure column, zero unless given."""
+    return [user_id.label("user_id")] + [
+        (figures[name] if name in figures else db.literal(0.0)).label(name) for name in FIGURES
+    ]
+
+
+def get_member_figures(group_id, date=None, user_id=None):
+    """
+    Returns per-member figures for a group in a single statement, read from
+    the source tables rather than any stored rollup:
+
+        {user_id: {"month_credits", "lifetime_contributions", "outstanding_loans", "repayments"}}
+
+    Transaction, Contribution and Loan rows are unioned into one column set
+    with CASE expressions picking out each figure, then summed with a single
+    GROUP BY user_id, so the cost does not grow with the member count.
+    month_credits are CREDIT transactions from the first of date's month up
+    to date. Members with no rows are absent; use empty_figures() for them.
+    Pass user_id to fetch a single member.
+    """
+    date = date or datetime.datetime.now(datetime.timezone.utc)
+    first_day = datetime.datetime(date.year, date.month, 1, tzinfo=date.tzinfo)
+
+    credit = Transaction.type == TransactionType.CREDIT
+    transactions = db.select(*_row(
+        Transaction.user_id,
+        month_credits=db.case(
+            (db.and_(credit, Transaction.date >= first_day, Transaction.date <= date), Transaction.amount),
+            else_=0.0
+        ),
+        repayments=db.case(
+            (db.and_(credit, db.func.lower(Transaction.reason) == TransactionReason.LOAN_REPAYMENT), Transaction.amount),
+            else_=0.0
+        ),
+    )).where(Transaction.group_id == group_id)
+
+    contributions = db.select(*_row(
+        Contribution.user_id, lifetime_contributions=Contribution.amount
+    )).where(Contribution.group_id == group_id)
+
+    loans = db.select(*_row(
+        Loan.user_id,
+        outstanding_loans=db.case((Loan.status.in_(ACTIVE_LOAN_STATUSES), Loan.outstanding), else_=0.0),
+    )).where(Loan.group_id == group_id)
+
+    if user_id is not None:
+        transactions = transactions.where(Transaction.user_id == user_id)
+        contributions = contributions.where(Contribution.user_id == user_id)
+        loans = loans.where(Loan.user_id == user_id)
+
+    rows = db.union_all(transactions, contributions, loans).subquery()
+    query = db.session.query(
+        rows.c.user_id, *[db.func.coalesce(db.func.sum(rows.c[name]), 0.0) for name in FIGURES]
+    ).group_by(rows.c.user_id)
+
+    return {
+        member_id: {name: float(value) for name, value in zip(FIGURES, values)}
+        for member_id, *values in query.all()
+    }
+
+
+def empty_figures():
+    return {name: 0.0 for name in FIGURES}
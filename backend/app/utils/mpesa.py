@@ -4,6 +4,8 @@ import base64
 import logging
 from app.models import Group, User, WithdrawalRequest, db
 from app.config import Config
+from app.extensions import daraja
+from app.utils.stk_reconcile import record_stk_push
 from app.routes.auth import format_phone_number
 
 # Configure logging
@@ -13,10 +15,6 @@ logger = logging.getLogger(__name__)
 # M-Pesa Configuration
 MPESA_PASSKEY = Config.MPESA_PASSKEY
 MPESA_SHORTCODE = Config.MPESA_SHORTCODE
-MPESA_CONSUMER_KEY = Config.MPESA_CONSUMER_KEY
-MPESA_CONSUMER_SECRET = Config.MPESA_CONSUMER_SECRET
-MPESA_STK_URL = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-MPESA_B2C_URL = Config.MPESA_B2C_URL
 MPESA_CALLBACK_URL = Config.MPESA_CALLBACK_URL
 MPESA_B2C_INITIATOR_NAME = Config.MPESA_B2C_INITIATOR_NAME
 MPESA_B2C_SECURITY_CREDENTIAL = Config.MPESA_B2C_SECURITY_CREDENTIAL
@@ -25,16 +23,13 @@ MPESA_B2C_RESULT_URL = Config.MPESA_B2C_RESULT_URL
 MPESA_ORIGINATOR_CONVERSATION_ID = Config.MPESA_ORIGINATOR_CONVERSATION_ID
 MPESA_B2C_TIMEOUT_URL = Config.MPESA_B2C_TIMEOUT_URL
 
+def fetch_mpesa_access_token():
+    """Requests a new access token from Daraja. Returns (token, expires_in seconds)."""
+    return daraja.fetch_token()
+
 def get_mpesa_access_token():
-    """Fetches the M-Pesa access token for API authentication."""
-    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-    try:
-        response = requests.get(url, auth=(MPESA_CONSUMER_KEY, MPESA_CONSUMER_SECRET))
-        response.raise_for_status()
-        return response.json().get("access_token")
-    except requests.RequestException as e:
-        logger.error(f"Error fetching M-Pesa access token: {e}")
-        return None
+    """Returns the M-Pesa access token, from the shared cache unless it is about to expire."""
+    return daraja.access_token()
 
 def generate_password():
     """Generates the security password required for STK Push."""
@@ -67,7 +62,6 @@ def initiate_stk_push(user_id, amount, account_reference=None, transaction_desc=
     # Generate password for STK Push
     password, timestamp = generate_password()
 
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
     payload = {
         "BusinessShortCode": MPESA_SHORTCODE,
         "Password": password,
@@ -83,28 +77,35 @@ def initiate_stk_push(user_id, amount, account_reference=None, transaction_desc=
     }
 
     try:
-        response = requests.post(MPESA_STK_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        response = daraja.stk_push(payload)
     except requests.RequestException as e:
         logger.error(f"Error initiating STK Push: {e}")
         return {"error": "Failed to initiate STK Push"}
 
-def initiate_b2c_payment(user_id, phone_number, amount, reason, withdrawal_request_id):
-    """
-    Sends a B2C payment request to Safaricom M-Pesa API.
-    """
-    access_token = get_mpesa_access_token()
-    if not access_token:
-        return {"error": "Failed to obtain access token"}
-    
-    user = User.query.get(user_id)
-    if not user or not user.group_id:
-        return {"error": "User or group not found"}
-    
-    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-    payload = {
-        "OriginatorConversationID": MPESA_ORIGINATOR_CONVERSATION_ID,
+    if response.get("ResponseCode") == "0":
+        # Kept so the reconciler can settle it if the callback never arrives
+        try:
+            record_stk_push(response, user.id, phone_number, amount)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not record STK push {response.get('CheckoutRequestID')}: {e}")
+    return response
+
+def query_stk_push(checkout_request_id):
+    """Asks Daraja for the outcome of an STK push. Raises requests.RequestException on failure."""
+    password, timestamp = generate_password()
+    return daraja.stk_query({
+        "BusinessShortCode": MPESA_SHORTCODE,
+        "Password": password,
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id
+    })
+
+def build_b2c_payload(phone_number, amount, reason, originator_conversation_id=None):
+    """The B2C payment request body. originator_conversation_id defaults to the configured one."""
+    return {
+        "OriginatorConversationID": originator_conversation_id or MPESA_ORIGINATOR_CONVERSATION_ID,
         "InitiatorName": MPESA_B2C_INITIATOR_NAME,
         "SecurityCredential": MPESA_B2C_SECURITY_CREDENTIAL,
         "CommandID": MPESA_B2C_COMMAND_ID,
@@ -116,11 +117,23 @@ def initiate_b2c_payment(user_id, phone_number, amount, reason, withdrawal_reque
         "ResultURL": MPESA_B2C_RESULT_URL,
         "Occasion": ""
     }
+
+def initiate_b2c_payment(user_id, phone_number, amount, reason, withdrawal_request_id):
+    """
+    Sends a B2C payment request to Safaricom M-Pesa API.
+    """
+    access_token = get_mpesa_access_token()
+    if not access_token:
+        return {"error": "Failed to obtain access token"}
     
+    user = User.query.get(user_id)
+    if not user or not user.group_id:
+        return {"error": "User or group not found"}
+    
+    payload = build_b2c_payload(phone_number, amount, reason)
+
     try:
-        response = requests.post(MPESA_B2C_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        response_data = response.json()
+        response_data = daraja.b2c_payment(payload)
     except requests.RequestException as e:
         logger.error(f"Error initiating B2C payment: {e}")
         return {"error": "Failed to initiate B2C payment"}
@@ -0,0 +1,356 @@
+import datetime
+import logging
+import threading
+from sqlalchemy.exc import IntegrityError
+from app.utils.phone import normalize_phone
+from app.models import (
+    db, MpesaCallback, Transaction, TransactionType, TransactionReason,
+    Loan, LoanStatus, WithdrawalRequest, WithdrawalStatus
+)
+
+logger = logging.getLogger(__name__)
+
+STK = "stk"
+B2C = "b2c"
+
+PENDING = "pending"
+PROCESSED = "processed"
+IGNORED = "ignored"
+FAILED = "failed"
+
+# What Daraja expects back; anything else (or a timeout) makes it resend
+ACCEPTED = {"ResultCode": 0, "ResultDesc": "Accepted"}
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def parse_stk_callback(data):
+    """Flattens an STK push callback body into the fields we act on."""
+    stk_callback = (data or {}).get("Body", {}).get("stkCallback", {})
+    parsed = {
+        "result_code": stk_callback.get("ResultCode"),
+        "result_desc": stk_callback.get("ResultDesc"),
+        "checkout_request_id": stk_callback.get("CheckoutRequestID"),
+        "receipt_number": None,
+        "phone": None,
+        "amount": None,
+    }
+    for item in stk_callback.get("CallbackMetadata", {}).get("Item", []):
+        if item.get("Name") == "MpesaReceiptNumber":
+            parsed["receipt_number"] = item.get("Value")
+        elif item.get("Name") == "PhoneNumber":
+            parsed["phone"] = str(item.get("Value"))
+        elif item.get("Name") == "Amount":
+            parsed["amount"] = item.get("Value")
+    return parsed
+
+
+def callback_key(kind, data):
+    """
+    The identity a callback is deduplicated on: the MpesaReceiptNumber of a
+    paid STK push, otherwise the id Daraja assigned the request. Safaricom
+    resends the same body on retry, so a resend maps to the same key.
+    """
+    if kind == STK:
+        parsed = parse_stk_callback(data)
+        if parsed["receipt_number"]:
+            return f"receipt:{parsed['receipt_number']}"
+        if parsed["checkout_request_id"]:
+            return f"checkout:{parsed['checkout_request_id']}"
+        return None
+
+    result = (data or {}).get("Result", {})
+    conversation_id = result.get("ConversationID") or result.get("OriginatorConversationID")
+    return f"b2c:{conversation_id}" if conversation_id else None
+
+
+def store_callback(kind, data):
+    """
+    Saves a raw callback to the inbox for the worker to apply. Returns False
+    if the same callback is already there. Does not commit.
+    """
+    callback = MpesaCallback(kind=kind, dedupe_key=callback_key(kind, data), payload=data, status=PENDING)
+    try:
+        with db.session.begin_nested():
+            db.session.add(callback)
+    except IntegrityError:
+        return False
+    return True
+
+
+def apply_stk_callback(data):
+    """
+    Books a paid STK push as a loan repayment when the payer has a loan
+    outstanding, otherwise as a contribution. Returns (status, group_id,
+    note). Does not commit.
+    """
+    from app.routes.contributions import record_contribution
+    from app.extensions import phone_lookup_cache
+    from app.utils.ledger import apply_balance_delta, record_member_credit
+    from app.utils.notify import notify_user
+    from app.utils.stk_reconcile import settle_stk_push, link_stk_transaction, record_stk_receipt
+
+    parsed = parse_stk_callback(data)
+    # The callback and the reconciler's query result can both arrive; book only the first
+    if not settle_stk_push(parsed["checkout_request_id"], parsed["result_code"], parsed["result_desc"]):
+        # A real callback after the reconciler booked the push still brings the receipt
+        if parsed["result_code"] == 0 and record_stk_receipt(parsed["checkout_request_id"], parsed["receipt_number"]):
+            return PROCESSED, None, None
+        return IGNORED, None, f"Checkout {parsed['checkout_request_id']} already settled"
+
+    if parsed["result_code"] != 0:
+        return IGNORED, None, f"Payment failed: {parsed['result_desc']}"
+
+    receipt_number = parsed["receipt_number"]
+    pay_amount = float(parsed["amount"])
+    if receipt_number and Transaction.query.filter_by(reference=receipt_number).first():
+        return IGNORED, None, f"Receipt {receipt_number} already booked"
+
+    # Match user by phone, in whatever form Daraja or the member wrote it
+    member = phone_lookup_cache.lookup(normalize_phone(parsed["phone"]))
+    if not member:
+        return IGNORED, None, "User not found"
+    user_id, group_id, email_delivery = member
+
+    # --- Handle repayment if outstanding loan exists ---
+    active_loan = Loan.query.filter(
+        Loan.user_id == user_id,
+        Loan.status.in_([LoanStatus.DISBURSED, LoanStatus.PARTIALLY_REPAID])
+    ).first()
+
+    if active_loan:
+        as_of_date = _now()
+        total_due = active_loan.calculate_due_amount(as_of_date)
+
+        already_repaid = active_loan.amount - active_loan.outstanding
+        remaining_balance = max(total_due - already_repaid, 0.0)
+
+        new_remaining_balance = max(remaining_balance - pay_amount, 0.0)
+        previous_outstanding = active_loan.outstanding
+
+        active_loan.outstanding = new_remaining_balance
+
+        if new_remaining_balance <= 0:
+            active_loan.status = LoanStatus.REPAID
+            active_loan.outstanding = 0
+        else:
+            active_loan.status = LoanStatus.PARTIALLY_REPAID
+
+        repayment_tx = Transaction(
+            user_id=user_id,
+            group_id=group_id,
+            amount=pay_amount,
+            type=TransactionType.CREDIT,   # money into group
+            reason=TransactionReason.LOAN_REPAYMENT,
+            reference=receipt_number,
+            date=as_of_date
+        )
+        db.session.add(repayment_tx)
+        transaction = repayment_tx
+        apply_balance_delta(
+            active_loan.group_id,
+            loans_repaid=pay_amount,
+            outstanding_principal=active_loan.outstanding - previous_outstanding
+        )
+        record_member_credit(group_id, user_id, pay_amount, as_of_date)
+
+        notify_user(
+            user_id, group_id,
+            f"Loan repayment of KES {pay_amount:.2f} received. "
+            f"Outstanding balance: KES {active_loan.outstanding:.2f}",
+            "Loan repayment",
+            email_delivery
+        )
+
+    else:
+        if not group_id or pay_amount <= 0:
+            return IGNORED, None, "Not a valid contribution"
+        # Treat as normal contribution
+        _, transaction = record_contribution(user_id, group_id, pay_amount, receipt_number, email_delivery)
+
+        notify_user(
+            user_id, group_id, f"Contribution of KES {pay_amount:.2f} received successfully!", "Contribution",
+            email_delivery
+        )
+
+    if not receipt_number and parsed["checkout_request_id"]:
+        link_stk_transaction(parsed["checkout_request_id"], transaction)
+
+    return PROCESSED, group_id, None
+
+
+def apply_b2c_callback(data):
+    """
+    Marks the disbursement and the withdrawal a B2C result belongs to as
+    completed or failed. Returns (status, group_id, note). Does not commit.
+    """
+    from app.utils.disbursements import settle_disbursement, LOAN
+    from app.utils.ledger import apply_balance_delta
+    from app.utils.notify import notify_group
+
+    result = (data or {}).get("Result", {})
+    result_code = result.get("ResultCode")
+    mpesa_transaction_id = result.get("OriginatorConversationID")
+    result_desc = result.get("ResultDesc")
+
+    disbursement = settle_disbursement(result)
+    if disbursement and disbursement.kind == LOAN:
+        return PROCESSED, disbursement.group_id, None
+
+    if not mpesa_transaction_id:
+        return IGNORED, None, "Missing mpesa_transaction_id in callback"
+
+    withdrawal = WithdrawalRequest.query.filter_by(
+        mpesa_transaction_id=mpesa_transaction_id
+    ).first()
+    if not withdrawal:
+        return IGNORED, None, f"Withdrawal with transaction ID {mpesa_transaction_id} not found"
+
+    was_counted = withdrawal.status in (WithdrawalStatus.APPROVED, WithdrawalStatus.COMPLETED)
+    if result_code == 0:
+        withdrawal.status = WithdrawalStatus.COMPLETED
+        notify_group(
+            withdrawal.group_id,
+            f"Withdrawal of Ksh {withdrawal.transaction.amount} via M-Pesa completed successfully",
+            "Withdrawal"
+        )
+    else:
+        withdrawal.status = WithdrawalStatus.FAILED
+        if was_counted:
+            # The payout never left, so the money is back in the group's cash
+            apply_balance_delta(withdrawal.group_id, total_withdrawals=-withdrawal.transaction.amount)
+        logger.error(f"Withdrawal {mpesa_transaction_id} failed: {result_desc}")
+
+    return PROCESSED, withdrawal.group_id, None
+
+
+APPLY = {STK: apply_stk_callback, B2C: apply_b2c_callback}
+
+
+class MpesaCallbackWorker:
+    """
+    Drains the M-Pesa callback inbox in batches. Each batch is claimed with
+    row locks that other workers skip, every callback is applied in its own
+    savepoint so one bad payload cannot sink the rest, and the effects and
+    the inbox status flip commit together, so each receipt is booked once.
+    A callback that fails is retried after an exponential backoff. The
+    worker starts with the first request a process serves.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.batch_size = 100
+        self.poll_interval = 1
+        self.max_attempts = 5
+        self.backoff_base = 5
+        self.backoff_max = 600
+        self._app = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats = {"processed": 0, "ignored": 0, "retried": 0, "failed": 0, "duplicates": 0, "batches": 0, "errors": 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get("MPESA_CALLBACK_WORKER", True)
+        self.batch_size = config.get("MPESA_CALLBACK_BATCH_SIZE", self.batch_size)
+        self.poll_interval = config.get("MPESA_CALLBACK_POLL_INTERVAL", self.poll_interval)
+        self.max_attempts = config.get("MPESA_CALLBACK_MAX_ATTEMPTS", self.max_attempts)
+        self.backoff_base = config.get("MPESA_CALLBACK_BACKOFF_BASE", self.backoff_base)
+        self.backoff_max = config.get("MPESA_CALLBACK_BACKOFF_MAX", self.backoff_max)
+        self._app = app
+        app.before_request(self._ensure_started)
+        app.extensions["mpesa_callbacks"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["running"] = self._started
+        stats["pending"] = MpesaCallback.query.filter_by(status=PENDING).count()
+        return stats
+
+    def backoff(self, attempts):
+        """Seconds to wait before the next try after the given number of failed attempts."""
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def receive(self, kind, data):
+        """Stores a callback from Daraja and commits, counting resends of one already stored."""
+        if not store_callback(kind, data):
+            self._count("duplicates")
+        db.session.commit()
+
+    def _ensure_started(self):
+        if self._started or not self.enabled:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        from app.extensions import socketio
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        from app.extensions import socketio
+        while True:
+            processed = 0
+            with self._app.app_context():
+                try:
+                    processed = self.process_batch()
+                except Exception as e:
+                    db.session.rollback()
+                    self._count("errors")
+                    logger.error(f"M-Pesa callback batch failed: {e}")
+            if not processed:
+                socketio.sleep(self.poll_interval)
+
+    def process_batch(self):
+        """Applies and commits one batch of due callbacks. Returns the number handled."""
+        from app.extensions import summary_cache
+        from app.utils.realtime import pending_events_mark, discard_events_since
+
+        now = _now()
+        callbacks = MpesaCallback.query.filter(
+            MpesaCallback.status == PENDING,
+            MpesaCallback.next_attempt_at <= now
+        ).order_by(MpesaCallback.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        if not callbacks:
+            return 0
+
+        group_ids = set()
+        for callback in callbacks:
+            callback.attempts += 1
+            mark = pending_events_mark(db.session)
+            try:
+                with db.session.begin_nested():
+                    status, group_id, note = APPLY[callback.kind](callback.payload)
+            except Exception as e:
+                discard_events_since(db.session, mark)
+                callback.error = str(e) or type(e).__name__
+                if callback.attempts >= self.max_attempts:
+                    callback.status = FAILED
+                    callback.processed_at = now
+                    self._count("failed")
+                    logger.error(f"Giving up on M-Pesa callback {callback.id}: {callback.error}")
+                else:
+                    callback.next_attempt_at = now + datetime.timedelta(seconds=self.backoff(callback.attempts))
+                    self._count("retried")
+                    logger.warning(f"M-Pesa callback {callback.id} failed, retrying: {callback.error}")
+                continue
+
+            callback.status = status
+            callback.error = note
+            callback.processed_at = now
+            self._count(status)
+            if group_id:
+                group_ids.add(group_id)
+
+        db.session.commit()
+        for group_id in group_ids:
+            summary_cache.invalidate_group(group_id)
+        self._count("batches")
+        return len(callbacks)
@@ -0,0 +1,146 @@
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.models import db, MpesaJob
+
+logger = logging.getLogger(__name__)
+
+SYNC = "sync"
+ASYNC = "async"
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def serialize_job(job):
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "http_status": job.http_status,
+        "result": job.result,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
+
+
+class MpesaJobRunner:
+    """
+    Runs outbound Daraja calls either inline (sync mode) or on a bounded
+    worker pool (async mode), where the endpoint answers straight away with
+    a pending MpesaJob and the outcome is pushed to the user's socket room
+    as an "mpesa_job" event. At most max_workers calls are in flight and
+    queue_limit more may wait; beyond that callers get a 503 instead of
+    tying up the request handler. Under eventlet the pool threads are green
+    threads, so a slow Safaricom response never blocks the hub.
+    """
+
+    def __init__(self):
+        self.mode = SYNC
+        self.max_workers = 8
+        self.queue_limit = 32
+        self._app = None
+        self._executor = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "errors": 0}
+
+    def init_app(self, app):
+        self.mode = app.config.get("MPESA_CALL_MODE", self.mode)
+        self.max_workers = app.config.get("MPESA_WORKERS", self.max_workers)
+        self.queue_limit = app.config.get("MPESA_JOB_QUEUE_LIMIT", self.queue_limit)
+        self._app = app
+        app.extensions["mpesa_jobs"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._inflight
+        stats["mode"] = self.mode
+        stats["max_workers"] = self.max_workers
+        stats["queue_limit"] = self.queue_limit
+        return stats
+
+    def _reserve(self):
+        with self._lock:
+            if self._inflight >= self.max_workers + self.queue_limit:
+                self._stats["rejected"] += 1
+                return False
+            self._inflight += 1
+            if self._executor is None:
+                # Created on first use so CLI commands never start worker threads
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mpesa")
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def run(self, user_id, kind, call, *args):
+        """
+        Runs call(*args) -> (body, http_status) for the given user. Sync mode
+        returns its result directly; async mode commits a pending job, hands
+        the call to the pool and returns a 202 body carrying the job id.
+        call must take plain values, since it runs in its own app context.
+        """
+        if self.mode != ASYNC:
+            return call(*args)
+
+        if not self._reserve():
+            return {"error": "M-Pesa is busy, please try again shortly"}, 503
+
+        try:
+            job = MpesaJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind, status=PENDING)
+            db.session.add(job)
+            db.session.commit()
+            self._executor.submit(self._execute, job.id, call, args)
+        except Exception:
+            self._release()
+            raise
+        self._count("submitted")
+        return {"message": "M-Pesa request submitted", "job_id": job.id, "status": PENDING}, 202
+
+    def _execute(self, job_id, call, args):
+        from app.utils.realtime import emit_after_commit, user_room
+
+        try:
+            with self._app.app_context():
+                try:
+                    MpesaJob.query.filter_by(id=job_id).update({"status": RUNNING})
+                    db.session.commit()
+
+                    try:
+                        body, http_status = call(*args)
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"M-Pesa job {job_id} raised: {e}")
+                        body, http_status = {"error": "M-Pesa request failed", "details": str(e)}, 500
+
+                    job = db.session.get(MpesaJob, job_id)
+                    job.status = SUCCEEDED if http_status < 400 else FAILED
+                    job.http_status = http_status
+                    job.result = body
+                    job.completed_at = _now()
+                    emit_after_commit(db.session, "mpesa_job", user_room(job.user_id), lambda: serialize_job(job))
+                    db.session.commit()
+                    self._count(job.status)
+                except Exception as e:
+                    db.session.rollback()
+                    self._count("errors")
+                    logger.error(f"M-Pesa job {job_id} could not be recorded: {e}")
+                finally:
+                    db.session.remove()
+        finally:
+            self._release()
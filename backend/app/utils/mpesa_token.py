@@ -0,0 +1,174 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MpesaTokenCache:
+    """
+    Caches the Daraja OAuth access token until shortly before it expires.
+
+    Refreshes are single-flight: within a process one caller fetches while
+    the others wait on a lock, and with the redis backend a short-lived
+    lock key does the same across worker processes, which then read the
+    token the winner stored.
+    """
+
+    def __init__(self, refresh_margin=60):
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = 10
+        self.prefix = "mpesa:token"
+        self._redis = None
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "coalesced_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "last_refresh_ms": None,
+            "total_refresh_ms": 0.0,
+        }
+
+    def init_app(self, app):
+        self.refresh_margin = app.config.get("MPESA_TOKEN_REFRESH_MARGIN", self.refresh_margin)
+        if app.config.get("MPESA_TOKEN_CACHE_BACKEND", "memory") == "redis":
+            import redis  # optional dependency, only needed for this backend
+            self._redis = redis.Redis.from_url(app.config["MPESA_TOKEN_REDIS_URL"])
+        app.extensions["mpesa_token_cache"] = self
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["coalesced_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["coalesced_hits"]) / lookups, 4) if lookups else 0.0
+        stats["avg_refresh_ms"] = round(stats["total_refresh_ms"] / stats["refreshes"], 1) if stats["refreshes"] else None
+        stats["expires_in"] = max(0, round(self._expires_at - time.monotonic())) if self._token else 0
+        stats["backend"] = "redis" if self._redis else "memory"
+        return stats
+
+    def _local(self):
+        if self._token and time.monotonic() < self._expires_at:
+            return self._token
+        return None
+
+    def _shared(self):
+        """Token stored by another process, copied into this process with its remaining TTL."""
+        if not self._redis:
+            return None
+        try:
+            pipe = self._redis.pipeline()
+            pipe.get(self.prefix)
+            pipe.pttl(self.prefix)
+            token, ttl_ms = pipe.execute()
+        except Exception as e:
+            logger.error(f"M-Pesa token cache read failed: {e}")
+            return None
+        if not token or ttl_ms is None or ttl_ms <= 0:
+            return None
+        self._token = token.decode()
+        self._expires_at = time.monotonic() + ttl_ms / 1000
+        return self._token
+
+    def get(self, fetch):
+        """
+        Returns a valid access token, calling fetch() -> (token, expires_in)
+        only when neither this process nor the shared store has one.
+        Returns None if the refresh fails.
+        """
+        token = self._local()
+        if token:
+            self._count("hits")
+            return token
+
+        with self._refresh_lock:
+            # Another caller may have refreshed while we waited for the lock
+            token = self._local() or self._shared()
+            if token:
+                self._count("coalesced_hits")
+                return token
+
+            self._count("misses")
+            holds_shared_lock = self._acquire_shared_lock()
+            try:
+                if not holds_shared_lock:
+                    token = self._wait_for_shared()
+                    if token:
+                        self._count("coalesced_hits")
+                        return token
+                return self._refresh(fetch)
+            finally:
+                if holds_shared_lock:
+                    self._release_shared_lock()
+
+    def _refresh(self, fetch):
+        started = time.monotonic()
+        try:
+            token, expires_in = fetch()
+        except Exception as e:
+            logger.error(f"M-Pesa token refresh failed: {e}")
+            token, expires_in = None, 0
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+
+        if not token:
+            self._count("refresh_errors")
+            return None
+
+        with self._stats_lock:
+            self._stats["refreshes"] += 1
+            self._stats["last_refresh_ms"] = elapsed_ms
+            self._stats["total_refresh_ms"] += elapsed_ms
+
+        ttl = max(int(expires_in) - self.refresh_margin, 1)
+        self._token = token
+        self._expires_at = time.monotonic() + ttl
+        if self._redis:
+            try:
+                self._redis.set(self.prefix, token, ex=ttl)
+            except Exception as e:
+                logger.error(f"M-Pesa token cache write failed: {e}")
+        return token
+
+    def _acquire_shared_lock(self):
+        if not self._redis:
+            return True
+        try:
+            return bool(self._redis.set(f"{self.prefix}:lock", "1", nx=True, ex=self.lock_timeout))
+        except Exception as e:
+            logger.error(f"M-Pesa token lock failed, refreshing without it: {e}")
+            return True
+
+    def _release_shared_lock(self):
+        if self._redis:
+            try:
+                self._redis.delete(f"{self.prefix}:lock")
+            except Exception:
+                pass  # it expires on its own
+
+    def _wait_for_shared(self):
+        """Polls for the token another process is fetching, up to the lock timeout."""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            token = self._shared()
+            if token:
+                return token
+        return None
+
+    def invalidate(self):
+        """Drops the cached token, e.g. after Daraja rejects it with a 401."""
+        self._token = None
+        self._expires_at = 0.0
+        if self._redis:
+            try:
+                self._redis.delete(self.prefix)
+            except Exception as e:
+                logger.error(f"M-Pesa token cache invalidation failed: {e}")
@@ -0,0 +1,241 @@
+import datetime
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Notification, NotificationCounter, GroupBroadcast, BroadcastReceipt, User
+from app.utils.realtime import emit_after_commit, user_room, group_room
+from app.utils.digest import queue_immediate_emails, IMMEDIATE
+
+
+def serialize_notification(notification):
+    return {
+        "id": notification.id,
+        "source": "personal",
+        "group_id": notification.group_id,
+        "message": notification.message,
+        "type": notification.type,
+        "date": notification.date.isoformat(),
+        "is_read": notification.read
+    }
+
+
+def serialize_broadcast(broadcast, is_read=False):
+    return {
+        "id": broadcast.id,
+        "source": "group",
+        "group_id": broadcast.group_id,
+        "message": broadcast.message,
+        "type": broadcast.type,
+        "date": broadcast.date.isoformat(),
+        "is_read": bool(is_read)
+    }
+
+
+def notify_user(user_id, group_id, message, notification_type, email_delivery=None):
+    """
+    Adds a personal notification in the caller's transaction and bumps the
+    owner's unread counter. The owner's sockets receive it once the caller
+    commits. Pass the owner's email_delivery when it is already known, so
+    the User is loaded only when an immediate email may be due. Returns the
+    notification. Does not commit.
+    """
+    notification = Notification(
+        user_id=user_id,
+        group_id=group_id,
+        message=message,
+        type=notification_type,
+        date=datetime.datetime.now(datetime.timezone.utc),
+        read=False
+    )
+    db.session.add(notification)
+    adjust_unread(user_id, group_id, 1)
+    emit_after_commit(db.session, "notification", user_room(user_id), lambda: serialize_notification(notification))
+
+    if email_delivery in (None, IMMEDIATE):
+        user = db.session.get(User, user_id)
+        if user:
+            queue_immediate_emails([user], message, notification_type, notification.date)
+    return notification
+
+
+def notify_group(group_id, message, notification_type, exclude_user_id=None):
+    """
+    Posts a group-wide notification in the caller's transaction.
+
+    The message is stored once as a GroupBroadcast and merged into each
+    member's feed when they read notifications, so the write cost does not
+    grow with the group size. It is pushed to the group room once the caller
+    commits. Returns the broadcast. Does not commit.
+    """
+    broadcast = GroupBroadcast(
+        group_id=group_id,
+        message=message,
+        type=notification_type,
+        date=datetime.datetime.now(datetime.timezone.utc),
+        excluded_user_id=exclude_user_id
+    )
+    db.session.add(broadcast)
+    db.session.flush()
+
+    # One UPDATE bumps every member's counter; members without a row get
+    # theirs built from the source rows on their next read
+    counters = db.update(NotificationCounter).where(NotificationCounter.group_id == group_id)
+    if exclude_user_id is not None:
+        counters = counters.where(NotificationCounter.user_id != exclude_user_id)
+    db.session.execute(counters.values(
+        unread=NotificationCounter.unread + 1,
+        updated_at=broadcast.date
+    ))
+
+    # Members' sockets sit in the group room; when one member is left out,
+    # the event goes to every other member's own room instead
+    payload = {**serialize_broadcast(broadcast), "excluded_user_id": exclude_user_id}
+    if exclude_user_id is None:
+        emit_after_commit(db.session, "notification", group_room(group_id), payload)
+    else:
+        members = db.session.query(User.id).filter(User.group_id == group_id, User.id != exclude_user_id)
+        for (member_id,) in members:
+            emit_after_commit(db.session, "notification", user_room(member_id), payload)
+
+    # Only members who asked for immediate email get one now; the rest see it in their digest
+    immediate = User.query.filter(User.group_id == group_id, User.email_delivery == IMMEDIATE)
+    if exclude_user_id is not None:
+        immediate = immediate.filter(User.id != exclude_user_id)
+    queue_immediate_emails(immediate.all(), message, notification_type, broadcast.date)
+    return broadcast
+
+
+def visible_broadcasts(user_id, group_id, unread_only=False):
+    """
+    Query of (GroupBroadcast, is_read) for the broadcasts a member can see:
+    their group's broadcasts since they joined that did not exclude them and
+    that they have not deleted.
+    """
+    receipt = db.aliased(BroadcastReceipt)
+    is_read = db.func.coalesce(receipt.read, False)
+    joined_at = db.select(User.joined_group_at).where(User.id == user_id).scalar_subquery()
+
+    query = db.session.query(GroupBroadcast, is_read.label("is_read")).outerjoin(
+        receipt,
+        db.and_(receipt.broadcast_id == GroupBroadcast.id, receipt.user_id == user_id)
+    ).filter(
+        GroupBroadcast.group_id == group_id,
+        GroupBroadcast.date >= db.func.coalesce(joined_at, GroupBroadcast.date),
+        db.or_(GroupBroadcast.excluded_user_id.is_(None), GroupBroadcast.excluded_user_id != user_id),
+        db.not_(db.func.coalesce(receipt.deleted, False))
+    )
+    if unread_only:
+        query = query.filter(db.not_(is_read))
+    return query
+
+
+def set_broadcast_state(user_id, broadcast_ids, **state):
+    """
+    Records read/deleted state for a member on the given broadcasts, creating
+    receipts where none exist. Does not commit.
+    """
+    broadcast_ids = list(broadcast_ids)
+    if not broadcast_ids:
+        return
+
+    existing = {
+        broadcast_id for (broadcast_id,) in db.session.query(BroadcastReceipt.broadcast_id).filter(
+            BroadcastReceipt.user_id == user_id,
+            BroadcastReceipt.broadcast_id.in_(broadcast_ids)
+        )
+    }
+    if existing:
+        db.session.query(BroadcastReceipt).filter(
+            BroadcastReceipt.user_id == user_id,
+            BroadcastReceipt.broadcast_id.in_(existing)
+        ).update(state, synchronize_session=False)
+
+    missing = [broadcast_id for broadcast_id in broadcast_ids if broadcast_id not in existing]
+    if missing:
+        rows = [
+            {"broadcast_id": broadcast_id, "user_id": user_id, "read": False, "deleted": False, **state}
+            for broadcast_id in missing
+        ]
+        db.session.execute(db.insert(BroadcastReceipt), rows)
+
+
+def count_unread(user_id, group_id):
+    """Counts a member's unread personal notifications and broadcasts from the source rows."""
+    personal = Notification.query.filter_by(user_id=user_id, group_id=group_id, read=False).count()
+    return personal + visible_broadcasts(user_id, group_id, unread_only=True).count()
+
+
+def adjust_unread(user_id, group_id, delta):
+    """
+    Moves a member's unread counter by delta with a single UPDATE, never
+    below zero. Call it after the notification change is in the session: a
+    missing row is built from the source rows, which then include it. If a
+    concurrent first read builds the row meanwhile, the UPDATE is applied
+    to theirs. Does not commit.
+    """
+    if not group_id or not delta:
+        return
+
+    unread = NotificationCounter.unread + delta
+    update = db.update(NotificationCounter).where(
+        NotificationCounter.user_id == user_id, NotificationCounter.group_id == group_id
+    ).values(
+        unread=db.case((unread < 0, 0), else_=unread),
+        updated_at=datetime.datetime.now(datetime.timezone.utc)
+    )
+    if db.session.execute(update).rowcount:
+        return
+
+    built = count_unread(user_id, group_id)
+    try:
+        with db.session.begin_nested():
+            db.session.add(NotificationCounter(user_id=user_id, group_id=group_id, unread=built))
+    except IntegrityError:
+        # unread_count_for inserted it; its count was taken before this change committed
+        db.session.execute(update)
+
+
+def reset_unread(user_id, group_id):
+    """Sets a member's unread counter to zero. Does not commit."""
+    db.session.execute(
+        db.update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id, NotificationCounter.group_id == group_id)
+        .values(unread=0, updated_at=datetime.datetime.now(datetime.timezone.utc))
+    )
+
+
+def unread_count_for(user_id, group_id):
+    """Returns a member's unread count, building the counter row on first use."""
+    counter = db.session.get(NotificationCounter, (user_id, group_id))
+    if counter:
+        return counter.unread
+
+    unread = count_unread(user_id, group_id)
+    try:
+        with db.session.begin_nested():
+            db.session.add(NotificationCounter(user_id=user_id, group_id=group_id, unread=unread))
+    except IntegrityError:
+        # Another read or a writer's adjust_unread built it first; theirs includes any later writes
+        return db.session.get(NotificationCounter, (user_id, group_id), populate_existing=True).unread
+    db.session.commit()
+    return unread
+
+
+def rebuild_unread_counters(group_id=None):
+    """
+    Recomputes unread counters from the source rows for every member, or
+    those of one group. Does not commit; returns the number of counters written.
+    """
+    members = db.session.query(User.id, User.group_id).filter(User.group_id.isnot(None))
+    delete = db.delete(NotificationCounter)
+    if group_id:
+        members = members.filter(User.group_id == group_id)
+        delete = delete.where(NotificationCounter.group_id == group_id)
+
+    rows = [
+        {"user_id": uid, "group_id": gid, "unread": count_unread(uid, gid)}
+        for uid, gid in members.all()
+    ]
+
+    db.session.execute(delete)
+    if rows:
+        db.session.execute(db.insert(NotificationCounter), rows)
+    return len(rows)
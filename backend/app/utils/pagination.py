@@ -0,0 +1,89 @@
+import base64
+import datetime
+import json
+from flask import request
+from app.models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(date, item_id, rank=0):
+    raw = json.dumps([date.isoformat(), item_id, rank]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (date, id, rank) from an opaque cursor string."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, item_id, rank = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(date), int(item_id), int(rank)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise CursorError("Invalid cursor") from e
+
+
+def get_page_args():
+    """
+    Reads ?limit= and ?cursor= from the request. Pagination is opt-in:
+    returns None when neither is given, otherwise (limit, decoded cursor or None).
+    Raises CursorError on bad input.
+    """
+    if "limit" not in request.args and "cursor" not in request.args:
+        return None
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        raise CursorError("limit must be an integer") from e
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = request.args.get("cursor")
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def keyset_filter(date_col, id_col, cursor, rank=0):
+    """
+    Condition selecting rows strictly after the cursor in (date, rank, id)
+    descending order. rank orders sources that are merged into one feed.
+    """
+    date, item_id, cursor_rank = cursor
+    if rank < cursor_rank:
+        return date_col <= date
+    if rank > cursor_rank:
+        return date_col < date
+    return db.or_(date_col < date, db.and_(date_col == date, id_col < item_id))
+
+
+def fetch_page(query, date_col, id_col, limit, cursor, rank=0):
+    """
+    Runs one page of a keyset query, newest first. Fetches one extra row to
+    know whether another page exists. Returns (rows, has_more).
+    """
+    if cursor:
+        query = query.filter(keyset_filter(date_col, id_col, cursor, rank))
+    rows = query.order_by(date_col.desc(), id_col.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def page_response(items, limit, next_cursor):
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+
+def paginate(query, date_col, id_col, page, serialize, key=None):
+    """
+    Serves one keyset page of a single-source query as a response dict.
+    key maps a row to its (date, id); defaults to row.date and row.id.
+    """
+    limit, cursor = page
+    rows, has_more = fetch_page(query, date_col, id_col, limit, cursor)
+
+    next_cursor = None
+    if has_more and rows:
+        date, item_id = key(rows[-1]) if key else (rows[-1].date, rows[-1].id)
+        next_cursor = encode_cursor(date, item_id)
+    return page_response([serialize(row) for row in rows], limit, next_cursor)
@@ -0,0 +1,24 @@
+import re
+
+
+def normalize_phone(phone) -> str | None:
+    """
+    Returns a Kenyan mobile number in the canonical 254XXXXXXXXX form
+    (E.164 without the leading +, as Daraja sends it), or None if invalid.
+    Accepts 07..., 01..., +254..., 254... and spaced variants, and the
+    integer PhoneNumber Daraja puts in callbacks.
+    """
+    if phone is None:
+        return None
+
+    phone = str(phone).strip().replace(" ", "").lstrip("+")
+    if not phone:
+        return None
+    if phone.startswith("0") and len(phone) == 10:
+        phone = "254" + phone[1:]
+    elif not phone.startswith("254"):
+        phone = f"254{phone[-9:]}"
+
+    if re.fullmatch(r"254(7\d{8}|1\d{8})", phone):
+        return phone
+    return None
@@ -0,0 +1,100 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask import current_app
+from flask_jwt_extended import decode_token
+from app.extensions import socketio
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "pending_socket_events"
+SOCKET_USER_KEY = "socket_user_id"
+
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+
+def group_room(group_id):
+    return f"group_{group_id}"
+
+
+def emit_after_commit(session, event_name, room, build_payload):
+    """
+    Queues a Socket.IO event to go out only once the session commits, so
+    clients never hear about rows that were rolled back. build_payload is
+    called just before the commit, after a flush, so generated ids are set.
+    """
+    session.info.setdefault(PENDING_KEY, []).append((event_name, room, build_payload))
+
+
+def pending_events_mark(session):
+    """Position in the queued events, to pass to discard_events_since after a savepoint rolls back."""
+    return len(session.info.get(PENDING_KEY, []))
+
+
+def discard_events_since(session, mark):
+    """Drops events queued after mark, e.g. by work whose savepoint was rolled back."""
+    pending = session.info.get(PENDING_KEY)
+    if pending:
+        del pending[mark:]
+
+
+@event.listens_for(Session, "before_commit")
+def _build_pending_events(session):
+    pending = session.info.get(PENDING_KEY)
+    if not pending:
+        return
+    session.flush()
+    session.info[PENDING_KEY] = [
+        (event_name, room, build() if callable(build) else build)
+        for event_name, room, build in pending
+    ]
+
+
+@event.listens_for(Session, "after_commit")
+def _emit_pending_events(session):
+    for event_name, room, payload in session.info.pop(PENDING_KEY, []):
+        try:
+            socketio.emit(event_name, payload, room=room)
+        except Exception as e:
+            # Push is best effort; clients still catch up from the REST endpoints
+            logger.error(f"Failed to emit {event_name} to {room}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_events(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def remember_socket_identity(user_id):
+    """Keeps the user a Socket.IO connection authenticated as, for its later events."""
+    from flask import session
+    session[SOCKET_USER_KEY] = user_id
+
+
+def socket_identity():
+    """The user the current Socket.IO connection authenticated as on connect, or None."""
+    from flask import session
+    return session.get(SOCKET_USER_KEY)
+
+
+def identity_from_socket_auth(auth):
+    """
+    Returns the user id carried by the access token a client sends in the
+    Socket.IO auth payload ({"token": "..."}), or None if it is missing or invalid.
+    Raises ConnectionRefusedError for a revoked token, which refuses the connection;
+    decode_token does not consult the revocation list the way jwt_required does.
+    """
+    token = (auth or {}).get("token")
+    if not token:
+        return None
+    try:
+        decoded = decode_token(token)
+    except Exception as e:
+        logger.info(f"Rejected socket connection: {e}")
+        return None
+    if current_app.extensions["token_revocations"].is_revoked(decoded["jti"]):
+        logger.info(f"Refused socket connection with revoked token for user {decoded['sub']}")
+        raise ConnectionRefusedError("Token has been revoked")
+    return int(decoded["sub"])
@@ -0,0 +1,184 @@
+import datetime
+import logging
+import threading
+import time
+from app.models import (
+    db, User, Notification, NotificationArchive, GroupBroadcast, GroupBroadcastArchive, BroadcastReceipt
+)
+from app.extensions import socketio
+from app.utils.notify import adjust_unread
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = ("id", "user_id", "group_id", "message", "read", "type", "date")
+ARCHIVED_BROADCAST_COLUMNS = ("id", "group_id", "message", "type", "date", "excluded_user_id")
+
+_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "rows_archived": 0,
+    "rows_deleted": 0,
+    "broadcasts_archived": 0,
+    "broadcasts_deleted": 0,
+    "batches": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+    "last_run_rows": None,
+}
+
+
+def _record_run(result):
+    with _lock:
+        _stats["runs"] += 1
+        _stats["rows_archived"] += result["archived"]
+        _stats["rows_deleted"] += result["deleted"]
+        _stats["broadcasts_archived"] += result["broadcasts_archived"]
+        _stats["broadcasts_deleted"] += result["broadcasts_deleted"]
+        _stats["batches"] += result["batches"]
+        _stats["last_run_at"] = result["finished_at"]
+        _stats["last_run_seconds"] = result["seconds"]
+        _stats["last_run_rows"] = result["deleted"] + result["broadcasts_deleted"]
+
+
+def retention_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _move_notifications(ids, archive):
+    archived = 0
+    if archive:
+        columns = [getattr(Notification, name) for name in ARCHIVED_COLUMNS]
+        archived = db.session.execute(
+            db.insert(NotificationArchive).from_select(
+                ARCHIVED_COLUMNS, db.select(*columns).where(Notification.id.in_(ids))
+            )
+        ).rowcount
+    deleted = db.session.execute(db.delete(Notification).where(Notification.id.in_(ids))).rowcount
+    return archived, deleted
+
+
+def _move_broadcasts(ids, archive):
+    # Members who never read these had them in their unread counter; take them off
+    receipt = db.aliased(BroadcastReceipt)
+    unread = db.session.query(User.id, User.group_id, db.func.count(GroupBroadcast.id)).join(
+        GroupBroadcast, GroupBroadcast.group_id == User.group_id
+    ).outerjoin(
+        receipt, db.and_(receipt.broadcast_id == GroupBroadcast.id, receipt.user_id == User.id)
+    ).filter(
+        GroupBroadcast.id.in_(ids),
+        GroupBroadcast.date >= db.func.coalesce(User.joined_group_at, GroupBroadcast.date),
+        db.or_(GroupBroadcast.excluded_user_id.is_(None), GroupBroadcast.excluded_user_id != User.id),
+        db.not_(db.func.coalesce(receipt.read, False)),
+        db.not_(db.func.coalesce(receipt.deleted, False))
+    ).group_by(User.id, User.group_id).all()
+
+    archived = 0
+    if archive:
+        columns = [getattr(GroupBroadcast, name) for name in ARCHIVED_BROADCAST_COLUMNS]
+        archived = db.session.execute(
+            db.insert(GroupBroadcastArchive).from_select(
+                ARCHIVED_BROADCAST_COLUMNS, db.select(*columns).where(GroupBroadcast.id.in_(ids))
+            )
+        ).rowcount
+    db.session.execute(db.delete(BroadcastReceipt).where(BroadcastReceipt.broadcast_id.in_(ids)))
+    deleted = db.session.execute(db.delete(GroupBroadcast).where(GroupBroadcast.id.in_(ids))).rowcount
+    for user_id, group_id, count in unread:
+        adjust_unread(user_id, group_id, -count)
+    return archived, deleted
+
+
+def purge_notifications(retention_days, batch_size=1000, archive=True, pause=0.0, max_batches=None):
+    """
+    Moves read notifications, and group broadcasts, older than
+    retention_days out of the live tables.
+
+    Works in batches of batch_size rows, oldest ids first, committing after
+    each batch so no single statement holds locks for long. With archive the
+    rows are copied to NotificationArchive and GroupBroadcastArchive before
+    being deleted. Unread notifications are never touched. Broadcasts go
+    whatever their read state, together with their receipts, and members
+    who had not read them get their unread counter lowered to match.
+    max_batches caps the batches of both tables together.
+
+    Returns {"archived", "deleted", "broadcasts_archived",
+    "broadcasts_deleted", "batches", "seconds", "finished_at"}.
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    started = time.monotonic()
+    totals = {"archived": 0, "deleted": 0, "broadcasts_archived": 0, "broadcasts_deleted": 0}
+    batches = 0
+
+    tables = (
+        (db.session.query(Notification.id).filter(Notification.read.is_(True), Notification.date < cutoff)
+            .order_by(Notification.id), _move_notifications, "archived", "deleted"),
+        (db.session.query(GroupBroadcast.id).filter(GroupBroadcast.date < cutoff)
+            .order_by(GroupBroadcast.id), _move_broadcasts, "broadcasts_archived", "broadcasts_deleted"),
+    )
+    for expired, move, archived_key, deleted_key in tables:
+        while max_batches is None or batches < max_batches:
+            ids = [row_id for (row_id,) in expired.limit(batch_size)]
+            if not ids:
+                break
+
+            archived, deleted = move(ids, archive)
+            db.session.commit()
+            totals[archived_key] += archived
+            totals[deleted_key] += deleted
+            batches += 1
+
+            if len(ids) < batch_size:
+                break
+            if pause:
+                socketio.sleep(pause)  # give other writers room between batches
+
+    result = {
+        **totals,
+        "batches": batches,
+        "seconds": round(time.monotonic() - started, 3),
+        "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    _record_run(result)
+    logger.info(
+        f"Notification retention: {totals['deleted']} row(s) removed, {totals['archived']} archived; "
+        f"{totals['broadcasts_deleted']} broadcast(s) removed, {totals['broadcasts_archived']} archived; "
+        f"in {batches} batch(es), {result['seconds']}s"
+    )
+    return result
+
+
+def purge_notifications_from_config(config, **overrides):
+    """Runs purge_notifications with the NOTIFICATION_* settings from the app config."""
+    options = {
+        "retention_days": config.get("NOTIFICATION_RETENTION_DAYS", 90),
+        "batch_size": config.get("NOTIFICATION_PURGE_BATCH_SIZE", 1000),
+        "archive": config.get("NOTIFICATION_RETENTION_MODE", "archive") != "delete",
+        "pause": config.get("NOTIFICATION_PURGE_PAUSE", 0.0),
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return purge_notifications(**options)
+
+
+def start_retention_job(app):
+    """
+    Starts the in-process purge loop when NOTIFICATION_PURGE_INTERVAL is set.
+    Leave it at 0 to run `flask notifications purge` from cron instead.
+    """
+    interval = app.config.get("NOTIFICATION_PURGE_INTERVAL", 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    purge_notifications_from_config(app.config)
+                except Exception as e:
+                    db.session.rollback()
+                    with _lock:
+                        _stats["errors"] += 1
+                    logger.error(f"Notification retention run failed: {e}")
+
+    return socketio.start_background_task(run)
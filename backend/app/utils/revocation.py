@@ -0,0 +1,181 @@
+import datetime
+import logging
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from app.models import db, TokenBlacklist
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _epoch(value):
+    # DateTime columns come back naive; they hold UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class TokenRevocationList:
+    """
+    Keeps the revoked access-token jtis in memory, so the blocklist check on
+    every authenticated request is a dict lookup rather than a query.
+    Revocations made in this process are visible at once. Those made by
+    other workers are read from TokenBlacklist as a change feed, the rows
+    created since the last read, at most every sync_interval seconds by
+    whichever request first finds the copy stale. Entries are dropped once
+    their token would have expired anyway.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.sync_interval = 5
+        # Rows are re-read this far back, for writers whose clock or commit lags
+        self.overlap = 60
+        self._revoked = {}  # jti -> expiry, epoch seconds
+        self._seen_until = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stats = {"checks": 0, "revoked_hits": 0, "syncs": 0, "sync_rows": 0, "sync_errors": 0, "purged": 0}
+
+    def init_app(self, app):
+        from app.extensions import jwt
+
+        self.enabled = app.config.get("TOKEN_REVOCATION_ENABLED", True)
+        self.sync_interval = app.config.get("TOKEN_REVOCATION_SYNC_INTERVAL", self.sync_interval)
+        self.overlap = app.config.get("TOKEN_REVOCATION_SYNC_OVERLAP", self.overlap)
+        jwt.token_in_blocklist_loader(self._blocklist_loader)
+        app.extensions["token_revocations"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _blocklist_loader(self, jwt_header, jwt_payload):
+        return self.is_revoked(jwt_payload.get("jti"))
+
+    def is_revoked(self, jti):
+        if not self.enabled:
+            return False
+        if self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval:
+            self._sync_if_stale()
+
+        self._count("checks")
+        with self._lock:
+            expires = self._revoked.get(jti)
+        if expires is None:
+            return False
+        self._count("revoked_hits")
+        return True
+
+    def _sync_if_stale(self):
+        # One request refreshes the copy; the rest carry on with what is there
+        first = self._synced_at is None
+        if not self._sync_lock.acquire(blocking=first):
+            return
+        try:
+            if self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_interval:
+                return
+            self.sync()
+        except Exception as e:
+            self._count("sync_errors")
+            logger.error(f"Token revocation sync failed: {e}")
+            if first:
+                raise
+        finally:
+            self._sync_lock.release()
+
+    def sync(self):
+        """Reads revocations made since the last sync (all live ones the first time) and drops expired entries."""
+        now = _now()
+        query = db.session.query(TokenBlacklist.jti, TokenBlacklist.expires_at, TokenBlacklist.created_at) \
+            .filter(TokenBlacklist.expires_at > now)
+        if self._seen_until is not None:
+            query = query.filter(TokenBlacklist.created_at >= self._seen_until - datetime.timedelta(seconds=self.overlap))
+
+        rows = query.all()
+        cutoff = now.timestamp()
+        with self._lock:
+            for jti, expires_at, created_at in rows:
+                self._revoked[jti] = _epoch(expires_at)
+                if self._seen_until is None or _epoch(created_at) > self._seen_until.timestamp():
+                    self._seen_until = datetime.datetime.fromtimestamp(_epoch(created_at), datetime.timezone.utc)
+            if self._seen_until is None:
+                self._seen_until = now
+            for jti in [jti for jti, expires in self._revoked.items() if expires <= cutoff]:
+                del self._revoked[jti]
+            self._stats["syncs"] += 1
+            self._stats["sync_rows"] += len(rows)
+        self._synced_at = time.monotonic()
+        return len(rows)
+
+    def revoke(self, jti, expires_at, user_id=None):
+        """Revokes a token by jti until expires_at and commits. Returns False if it already was."""
+        entry = TokenBlacklist(jti=jti, expires_at=expires_at, user_id=user_id)
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+            revoked = True
+        except IntegrityError:
+            revoked = False
+        db.session.commit()
+        with self._lock:
+            self._revoked[jti] = _epoch(expires_at)
+        return revoked
+
+    def purge(self, batch_size=1000, max_batches=None):
+        """Deletes revocations whose token has expired, in batches. Returns the number removed."""
+        now = _now()
+        deleted = batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = [
+                entry_id for (entry_id,) in db.session.query(TokenBlacklist.id)
+                .filter(TokenBlacklist.expires_at <= now).order_by(TokenBlacklist.id).limit(batch_size)
+            ]
+            if not ids:
+                break
+            deleted += db.session.execute(db.delete(TokenBlacklist).where(TokenBlacklist.id.in_(ids))).rowcount
+            db.session.commit()
+            batches += 1
+            if len(ids) < batch_size:
+                break
+        self._count("purged", deleted)
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._revoked)
+        stats["sync_interval"] = self.sync_interval
+        stats["stored"] = TokenBlacklist.query.count()
+        return stats
+
+
+def start_revocation_purge_job(app):
+    """
+    Starts the in-process purge loop for expired revocations when
+    TOKEN_REVOCATION_PURGE_INTERVAL is set. Leave it at 0 to run
+    `flask auth purge-revoked-tokens` from cron instead.
+    """
+    from app.extensions import socketio, token_revocations
+
+    interval = app.config.get("TOKEN_REVOCATION_PURGE_INTERVAL", 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    deleted = token_revocations.purge(app.config.get("TOKEN_REVOCATION_PURGE_BATCH_SIZE", 1000))
+                    logger.info(f"Token revocations: {deleted} expired row(s) purged")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Token revocation purge failed: {e}")
+
+    return socketio.start_background_task(run)
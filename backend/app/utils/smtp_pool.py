@@ -0,0 +1,150 @@
+import smtplib
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection itself is gone, as opposed to one message being refused
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError, OSError)
+
+
+class _PooledConnection:
+    """A Flask-Mail Connection held open across messages."""
+
+    def __init__(self, mail):
+        self.mail = mail
+        self.connection = None
+        self.last_used = float("-inf")
+        self.open()
+
+    def open(self):
+        self.connection = self.mail.connect()
+        self.connection.__enter__()  # opens the socket, STARTTLS and login
+        self.last_used = time.monotonic()
+
+    def send(self, message):
+        self.connection.send(message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.last_used = float("-inf")  # never hand a closed connection out again
+        try:
+            self.connection.__exit__(None, None, None)
+        except Exception:
+            pass  # the server may already have dropped it
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+
+class SMTPPool:
+    """
+    Keeps a small pool of authenticated SMTP connections alive so each
+    message does not pay for a new TCP connection, TLS handshake and login.
+    Connections idle for longer than idle_timeout are replaced rather than
+    reused, and a connection that errors is reopened once before the
+    message is reported as failed.
+    """
+
+    def __init__(self, size=2, idle_timeout=30):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats = {"opened": 0, "reused": 0, "reconnects": 0, "sent": 0, "errors": 0}
+
+    def init_app(self, app):
+        self.size = app.config.get("MAIL_POOL_SIZE", self.size)
+        self.idle_timeout = app.config.get("MAIL_POOL_IDLE_TIMEOUT", self.idle_timeout)
+        self._slots = threading.BoundedSemaphore(self.size)
+        app.extensions["smtp_pool"] = self
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["size"] = self.size
+        return stats
+
+    def _open(self):
+        connection = _PooledConnection(current_app.extensions["mail"])
+        self._count("opened")
+        return connection
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if time.monotonic() - connection.last_used < self.idle_timeout:
+                    self._stats["reused"] += 1
+                    return connection
+                connection.close()  # servers drop idle sessions; don't find out mid-send
+        return self._open()
+
+    def _checkin(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled connection; at most `size` are in use at once."""
+        with self._slots:
+            connection = self._checkout()
+            try:
+                yield connection
+            except Exception:
+                connection.close()
+                raise
+            else:
+                if connection.last_used > float("-inf"):
+                    self._checkin(connection)
+
+    def send_batch(self, messages):
+        """
+        Sends messages over one pooled connection. Returns a list holding
+        None for each message sent or the error text for each that failed.
+        """
+        results = []
+        with self.connection() as pooled:
+            for message in messages:
+                try:
+                    try:
+                        pooled.send(message)
+                    except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                        raise  # the server answered; the connection is fine
+                    except CONNECTION_ERRORS as e:
+                        logger.info(f"SMTP connection lost ({e}), reconnecting")
+                        self._count("reconnects")
+                        pooled.reconnect()
+                        self._count("opened")
+                        pooled.send(message)
+                    results.append(None)
+                    self._count("sent")
+                except Exception as e:
+                    results.append(str(e) or type(e).__name__)
+                    self._count("errors")
+        return results
+
+    def send(self, message):
+        """Sends one message over a pooled connection, raising on failure."""
+        error = self.send_batch([message])[0]
+        if error is not None:
+            raise smtplib.SMTPException(error)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
@@ -0,0 +1,131 @@
+import csv
+import io
+import time
+from collections import defaultdict
+from app.models import db, Transaction
+
+# Column names in the M-Pesa organisation (paybill) statement export
+RECEIPT_COLUMN = "Receipt No."
+PAID_IN_COLUMN = "Paid In"
+STATUS_COLUMN = "Transaction Status"
+COMPLETED = "Completed"
+
+# Bound parameters per IN query; stays under SQLite's and Postgres' limits
+LOOKUP_CHUNK = 900
+AMOUNT_TOLERANCE = 0.005
+
+
+class StatementError(ValueError):
+    pass
+
+
+def _amount(value):
+    value = (value or "").replace(",", "").strip()
+    return float(value) if value else 0.0
+
+
+def read_statement(stream):
+    """
+    Streams a paybill statement CSV and returns (paid_in, duplicates, rows):
+    the completed money-in receipts mapped to their amount, the receipts
+    that appear more than once, and the number of rows read. Exports start
+    with a few lines of account details, so the header is the first row
+    naming a "Receipt No." column.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+
+    reader = csv.reader(stream)
+    for header in reader:
+        header = [column.strip() for column in header]
+        if RECEIPT_COLUMN in header:
+            break
+    else:
+        raise StatementError(f"No '{RECEIPT_COLUMN}' column found; is this an M-Pesa statement CSV?")
+    if PAID_IN_COLUMN not in header:
+        raise StatementError(f"No '{PAID_IN_COLUMN}' column found")
+
+    receipt_at = header.index(RECEIPT_COLUMN)
+    paid_in_at = header.index(PAID_IN_COLUMN)
+    status_at = header.index(STATUS_COLUMN) if STATUS_COLUMN in header else None
+    width = max(receipt_at, paid_in_at, status_at or 0)
+
+    paid_in = {}
+    duplicates = set()
+    rows = 0
+    for row in reader:
+        if len(row) <= width:
+            continue
+        rows += 1
+        receipt = row[receipt_at].strip()
+        if not receipt or (status_at is not None and row[status_at].strip() != COMPLETED):
+            continue
+        try:
+            amount = _amount(row[paid_in_at])
+        except ValueError:
+            raise StatementError(f"Unreadable '{PAID_IN_COLUMN}' amount for receipt {receipt}: {row[paid_in_at]!r}")
+        if amount <= 0:
+            continue
+        if receipt in paid_in:
+            # A receipt is one payment; a repeat is an export artefact, not more money
+            duplicates.add(receipt)
+        else:
+            paid_in[receipt] = amount
+    return paid_in, duplicates, rows
+
+
+def _booked(group_id, receipts):
+    """Sums the group's booked amount and row count per receipt, reading plain columns in chunks."""
+    booked = defaultdict(lambda: [0.0, 0])
+    for start in range(0, len(receipts), LOOKUP_CHUNK):
+        chunk = receipts[start:start + LOOKUP_CHUNK]
+        # Filtered on reference alone so the planner probes its index rather
+        # than scanning the group's rows once per chunk; receipts are unique
+        # across groups, so the group check costs nothing here
+        rows = db.session.query(Transaction.reference, Transaction.amount, Transaction.group_id).filter(
+            Transaction.reference.in_(chunk)
+        )
+        for reference, amount, booked_group_id in rows:
+            if booked_group_id != group_id:
+                continue
+            booked[reference][0] += amount
+            booked[reference][1] += 1
+    return booked
+
+
+def reconcile_statement(group_id, stream):
+    """
+    Compares a paybill statement with the group's transactions by receipt
+    number. Returns the receipts never booked, those in the statement or
+    the ledger more than once, and those booked once but for a different
+    amount.
+    """
+    started = time.monotonic()
+    paid_in, statement_duplicates, rows = read_statement(stream)
+    booked = _booked(group_id, list(paid_in))
+
+    booked_duplicates = sorted(receipt for receipt, entry in booked.items() if entry[1] > 1)
+    missing = []
+    mismatched = []
+    for receipt, amount in paid_in.items():
+        entry = booked.get(receipt)
+        if entry is None:
+            missing.append({"receipt": receipt, "amount": amount})
+        elif entry[1] == 1 and abs(entry[0] - amount) > AMOUNT_TOLERANCE:
+            mismatched.append({"receipt": receipt, "statement_amount": amount, "booked_amount": round(entry[0], 2)})
+
+    return {
+        "rows": rows,
+        "receipts": len(paid_in),
+        "matched": len(paid_in) - len(missing) - len(mismatched) - len(booked_duplicates),
+        "missing": sorted(missing, key=lambda item: item["receipt"]),
+        "missing_amount": round(sum(item["amount"] for item in missing), 2),
+        "duplicates": {
+            "statement": sorted(statement_duplicates),
+            "booked": booked_duplicates,
+        },
+        "amount_mismatches": sorted(mismatched, key=lambda item: item["receipt"]),
+        "seconds": round(time.monotonic() - started, 2),
+    }
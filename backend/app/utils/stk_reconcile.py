@@ -0,0 +1,258 @@
+import datetime
+import logging
+import threading
+import time
+import requests
+from app.models import db, StkPushRequest, Transaction
+from app.extensions import socketio
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+EXPIRED = "expired"
+
+# Daraja answers a query for a push the customer has not finished with this error
+STILL_PROCESSING = "500.001.1001"
+
+_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "queried": 0,
+    "settled": 0,
+    "still_pending": 0,
+    "expired": 0,
+    "errors": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+}
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _record_run(result):
+    with _lock:
+        _stats["runs"] += 1
+        for key in ("queried", "settled", "still_pending", "expired", "errors"):
+            _stats[key] += result[key]
+        _stats["last_run_at"] = result["finished_at"]
+        _stats["last_run_seconds"] = result["seconds"]
+
+
+def reconcile_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats["pending"] = StkPushRequest.query.filter_by(status=PENDING).count()
+    return stats
+
+
+def record_stk_push(response, user_id, phone, amount):
+    """Keeps an STK push Daraja accepted until it is settled. Does not commit."""
+    push = StkPushRequest(
+        checkout_request_id=response["CheckoutRequestID"],
+        merchant_request_id=response.get("MerchantRequestID"),
+        user_id=user_id,
+        phone=phone,
+        amount=float(amount),
+        status=PENDING
+    )
+    db.session.add(push)
+    return push
+
+
+def settle_stk_push(checkout_request_id, result_code, result_desc):
+    """
+    Marks an STK push settled by its callback, or by the reconciler's
+    stand-in for one. Returns False if it was already settled, so the
+    payment is not booked twice; True otherwise, including for pushes made
+    before they were recorded. Does not commit.
+    """
+    if not checkout_request_id:
+        return True
+    push = StkPushRequest.query.filter_by(checkout_request_id=checkout_request_id).with_for_update().first()
+    if not push:
+        return True
+    if push.status in (COMPLETED, FAILED):
+        return False
+
+    # An expired push is still settled by a late callback
+    push.status = COMPLETED if result_code == 0 else FAILED
+    push.result_code = result_code
+    push.result_desc = (result_desc or "")[:255]
+    push.resolved_at = _now()
+    return True
+
+
+def link_stk_transaction(checkout_request_id, transaction):
+    """
+    Records the transaction a push settled by the reconciler was booked as,
+    so its callback can add the receipt if it turns up. Does not commit.
+    """
+    push = StkPushRequest.query.filter_by(checkout_request_id=checkout_request_id).first()
+    if push:
+        push.transaction = transaction
+
+
+def record_stk_receipt(checkout_request_id, receipt_number):
+    """
+    Writes the receipt from a push's late callback onto the transaction the
+    reconciler booked for it without one. Returns True if it did. Does not
+    commit.
+    """
+    if not checkout_request_id or not receipt_number:
+        return False
+    push = StkPushRequest.query.filter_by(checkout_request_id=checkout_request_id).first()
+    if not push or not push.transaction_id:
+        return False
+    if Transaction.query.filter_by(reference=receipt_number).first():
+        return False
+    updated = Transaction.query.filter(
+        Transaction.id == push.transaction_id, Transaction.reference.is_(None)
+    ).update({Transaction.reference: receipt_number}, synchronize_session="fetch")
+    return updated == 1
+
+
+def _callback_from_query(push, result):
+    """
+    Builds the STK callback body Daraja would have sent, from a query
+    result. The query does not return the receipt, so the inbox keys it by
+    CheckoutRequestID and the payment is booked without a reference until
+    the real callback supplies one.
+    """
+    result_code = int(result.get("ResultCode"))
+    stk_callback = {
+        "MerchantRequestID": push.merchant_request_id,
+        "CheckoutRequestID": push.checkout_request_id,
+        "ResultCode": result_code,
+        "ResultDesc": result.get("ResultDesc"),
+    }
+    if result_code == 0:
+        stk_callback["CallbackMetadata"] = {"Item": [
+            {"Name": "Amount", "Value": push.amount},
+            {"Name": "PhoneNumber", "Value": push.phone},
+        ]}
+    return {"Body": {"stkCallback": stk_callback}, "ReconciledBy": "stk_query"}
+
+
+def _query(checkout_request_id):
+    """Returns the query result, or None while the push is still open or the query failed."""
+    from app.utils.mpesa import query_stk_push
+
+    try:
+        result = query_stk_push(checkout_request_id)
+    except requests.HTTPError as e:
+        body = {}
+        try:
+            body = e.response.json()
+        except Exception:
+            pass
+        if body.get("errorCode") == STILL_PROCESSING:
+            return None, False
+        logger.warning(f"STK query for {checkout_request_id} failed: {e}")
+        return None, True
+    except requests.RequestException as e:
+        logger.warning(f"STK query for {checkout_request_id} failed: {e}")
+        return None, True
+    if result.get("ResultCode") in (None, ""):
+        return None, False
+    return result, False
+
+
+def reconcile_stk_pushes(after_minutes, batch_size=50, rate=2.0, expire_hours=24, max_batches=None):
+    """
+    Settles STK pushes whose callback has not arrived after_minutes after
+    they were sent. Each batch is claimed by stamping last_checked_at, so
+    a push is asked about at most once every after_minutes and concurrent
+    runs skip each other's rows. Queries are spaced to stay under `rate`
+    per second. A definite answer goes into the callback inbox, where the
+    callback worker books it exactly as it would the real callback. Pushes
+    still open after expire_hours are given up on.
+    """
+    from app.utils.mpesa_callbacks import store_callback, STK
+
+    started = time.monotonic()
+    result = {"queried": 0, "settled": 0, "still_pending": 0, "expired": 0, "errors": 0, "batches": 0}
+
+    now = _now()
+    result["expired"] = StkPushRequest.query.filter(
+        StkPushRequest.status == PENDING,
+        StkPushRequest.created_at < now - datetime.timedelta(hours=expire_hours)
+    ).update({"status": EXPIRED, "resolved_at": now}, synchronize_session=False)
+    db.session.commit()
+
+    interval = 1.0 / rate if rate > 0 else 0.0
+    while max_batches is None or result["batches"] < max_batches:
+        now = _now()
+        cutoff = now - datetime.timedelta(minutes=after_minutes)
+        pushes = StkPushRequest.query.filter(
+            StkPushRequest.status == PENDING,
+            StkPushRequest.created_at <= cutoff,
+            db.or_(StkPushRequest.last_checked_at.is_(None), StkPushRequest.last_checked_at <= cutoff)
+        ).order_by(StkPushRequest.created_at).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not pushes:
+            break
+        for push in pushes:
+            push.checks += 1
+            push.last_checked_at = now
+        claimed = [(push.id, push.checkout_request_id) for push in pushes]
+        db.session.commit()
+
+        for push_id, checkout_request_id in claimed:
+            query_started = time.monotonic()
+            answer, failed = _query(checkout_request_id)
+            result["queried"] += 1
+            if answer is not None:
+                store_callback(STK, _callback_from_query(db.session.get(StkPushRequest, push_id), answer))
+                db.session.commit()
+                result["settled"] += 1
+            elif failed:
+                result["errors"] += 1
+            else:
+                result["still_pending"] += 1
+            wait = interval - (time.monotonic() - query_started)
+            if wait > 0:
+                socketio.sleep(wait)
+        result["batches"] += 1
+
+    result["finished_at"] = _now().isoformat()
+    result["seconds"] = round(time.monotonic() - started, 2)
+    _record_run(result)
+    return result
+
+
+def reconcile_stk_pushes_from_config(config, **overrides):
+    options = {
+        "after_minutes": config.get("MPESA_STK_RECONCILE_AFTER", 3),
+        "batch_size": config.get("MPESA_STK_RECONCILE_BATCH_SIZE", 50),
+        "rate": config.get("MPESA_STK_QUERY_RATE", 2.0),
+        "expire_hours": config.get("MPESA_STK_EXPIRE_HOURS", 24),
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return reconcile_stk_pushes(**options)
+
+
+def start_stk_reconcile_job(app):
+    """
+    Starts the in-process reconcile loop when MPESA_STK_RECONCILE_INTERVAL
+    is set. Leave it at 0 to run `flask mpesa reconcile-stk` from cron instead.
+    """
+    interval = app.config.get("MPESA_STK_RECONCILE_INTERVAL", 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                try:
+                    reconcile_stk_pushes_from_config(app.config)
+                except Exception as e:
+                    db.session.rollback()
+                    with _lock:
+                        _stats["errors"] += 1
+                    logger.error(f"STK push reconcile run failed: {e}")
+
+    return socketio.start_background_task(run)
@@ -0,0 +1,283 @@
+"""
+Local stand-in for the Safaricom Daraja API, for load and latency tests.
+
+Serves the OAuth, STK push, STK push query and B2C endpoints with
+configurable latency and error rate, and delivers the asynchronous
+callbacks back to the app the way Safaricom does. Point the app at it
+with MPESA_BASE_URL:
+
+    python daraja_simulator.py --port 8089 --latency-ms 300 --error-rate 0.02 \\
+        --callback-base http://localhost:5000
+    MPESA_BASE_URL=http://localhost:8089 python run.py
+
+Counters are served at GET /simulator/stats.
+"""
+import argparse
+import base64
+import datetime
+import heapq
+import os
+import random
+import string
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+settings = {}
+tokens = {}
+checkouts = {}  # CheckoutRequestID -> (time the customer finishes, ResultCode, ResultDesc), for STK queries
+stats = {
+    "oauth": 0, "stk_push": 0, "stk_query": 0, "b2c": 0, "errors_injected": 0, "unauthorized": 0,
+    "callbacks_sent": 0, "callbacks_failed": 0, "callbacks_dropped": 0,
+}
+stats_lock = threading.Lock()
+
+
+def count(name, amount=1):
+    with stats_lock:
+        stats[name] += amount
+
+
+def simulate_latency():
+    latency = settings["latency_ms"] + random.uniform(-settings["jitter_ms"], settings["jitter_ms"])
+    if latency > 0:
+        time.sleep(latency / 1000)
+
+
+def inject_error():
+    """Returns an error response for a configured share of calls, like Daraja's 500.001.1001."""
+    if random.random() < settings["error_rate"]:
+        count("errors_injected")
+        return jsonify({
+            "requestId": uuid.uuid4().hex,
+            "errorCode": "500.001.1001",
+            "errorMessage": "Unable to lock subscriber, a transaction is already in process for the current subscriber"
+        }), 500
+    return None
+
+
+def authorized():
+    header = request.headers.get("Authorization", "")
+    token = header[len("Bearer "):] if header.startswith("Bearer ") else None
+    if token and tokens.get(token, 0) > time.time():
+        return True
+    count("unauthorized")
+    return False
+
+
+def receipt_number():
+    return "S" + "".join(random.choices(string.ascii_uppercase + string.digits, k=9))
+
+
+def callback_url(url):
+    """Rewrites a callback URL onto --callback-base, keeping its path, when one is set."""
+    if not settings["callback_base"] or not url:
+        return url
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    return settings["callback_base"].rstrip("/") + path
+
+
+class CallbackScheduler:
+    """Delivers callbacks after their delay on a bounded pool, however many are pending."""
+
+    def __init__(self, workers):
+        self._heap = []
+        self._cv = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="callback")
+        self._session = requests.Session()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def schedule(self, url, body):
+        if random.random() < settings["drop_rate"]:
+            count("callbacks_dropped")  # Safaricom occasionally never calls back
+            return
+        delay = settings["callback_delay"] + random.uniform(0, settings["callback_jitter"])
+        with self._cv:
+            heapq.heappush(self._heap, (time.monotonic() + delay, uuid.uuid4().hex, url, body))
+            self._cv.notify()
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cv.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, url, body = heapq.heappop(self._heap)
+            self._pool.submit(self._deliver, url, body)
+
+    def _deliver(self, url, body):
+        try:
+            response = self._session.post(url, json=body, timeout=10)
+            count("callbacks_sent" if response.status_code < 500 else "callbacks_failed")
+        except requests.RequestException:
+            count("callbacks_failed")
+
+
+scheduler = None
+
+
+@app.route("/oauth/v1/generate", methods=["GET"])
+def oauth():
+    simulate_latency()
+    if not request.authorization:
+        return jsonify({"errorCode": "400.008.01", "errorMessage": "Invalid Authentication passed"}), 400
+    count("oauth")
+    token = base64.b64encode(os.urandom(21)).decode()
+    tokens[token] = time.time() + settings["token_ttl"]
+    return jsonify({"access_token": token, "expires_in": str(settings["token_ttl"])})
+
+
+@app.route("/mpesa/stkpush/v1/processrequest", methods=["POST"])
+def stk_push():
+    simulate_latency()
+    if not authorized():
+        return jsonify({"errorCode": "404.001.04", "errorMessage": "Invalid Access Token"}), 401
+    error = inject_error()
+    if error:
+        return error
+    count("stk_push")
+
+    data = request.get_json(silent=True) or {}
+    merchant_request_id = f"{random.randint(10000, 99999)}-{random.randint(1000000, 9999999)}-1"
+    checkout_request_id = f"ws_CO_{datetime.datetime.now():%d%m%Y%H%M%S}{random.randint(100, 999)}{uuid.uuid4().hex[:8]}"
+
+    if random.random() < settings["fail_rate"]:
+        stk_callback = {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": 1032,
+            "ResultDesc": "Request cancelled by user",
+        }
+    else:
+        stk_callback = {
+            "MerchantRequestID": merchant_request_id,
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": 0,
+            "ResultDesc": "The service request is processed successfully.",
+            "CallbackMetadata": {"Item": [
+                {"Name": "Amount", "Value": data.get("Amount")},
+                {"Name": "MpesaReceiptNumber", "Value": receipt_number()},
+                {"Name": "TransactionDate", "Value": int(datetime.datetime.now().strftime("%Y%m%d%H%M%S"))},
+                {"Name": "PhoneNumber", "Value": int(data.get("PhoneNumber") or 0)},
+            ]},
+        }
+    checkouts[checkout_request_id] = (
+        time.time() + settings["callback_delay"], stk_callback["ResultCode"], stk_callback["ResultDesc"]
+    )
+    scheduler.schedule(callback_url(data.get("CallBackURL")), {"Body": {"stkCallback": stk_callback}})
+
+    return jsonify({
+        "MerchantRequestID": merchant_request_id,
+        "CheckoutRequestID": checkout_request_id,
+        "ResponseCode": "0",
+        "ResponseDescription": "Success. Request accepted for processing",
+        "CustomerMessage": "Success. Request accepted for processing",
+    })
+
+
+@app.route("/mpesa/stkpushquery/v1/query", methods=["POST"])
+def stk_query():
+    simulate_latency()
+    if not authorized():
+        return jsonify({"errorCode": "404.001.04", "errorMessage": "Invalid Access Token"}), 401
+    count("stk_query")
+
+    checkout_request_id = (request.get_json(silent=True) or {}).get("CheckoutRequestID")
+    checkout = checkouts.get(checkout_request_id)
+    if not checkout:
+        return jsonify({"errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid CheckoutRequestID"}), 400
+    ready_at, result_code, result_desc = checkout
+    if time.time() < ready_at:
+        return jsonify({"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}), 500
+
+    return jsonify({
+        "ResponseCode": "0",
+        "ResponseDescription": "The service request has been accepted successsfully",
+        "MerchantRequestID": "",
+        "CheckoutRequestID": checkout_request_id,
+        "ResultCode": str(result_code),
+        "ResultDesc": result_desc,
+    })
+
+
+@app.route("/mpesa/b2c/v1/paymentrequest", methods=["POST"])
+@app.route("/mpesa/b2c/v3/paymentrequest", methods=["POST"])
+def b2c_payment():
+    simulate_latency()
+    if not authorized():
+        return jsonify({"errorCode": "404.001.04", "errorMessage": "Invalid Access Token"}), 401
+    error = inject_error()
+    if error:
+        return error
+    count("b2c")
+
+    data = request.get_json(silent=True) or {}
+    conversation_id = f"AG_{datetime.datetime.now():%Y%m%d}_{uuid.uuid4().hex[:20]}"
+    originator_id = data.get("OriginatorConversationID") or f"{random.randint(10000, 99999)}-{random.randint(1000000, 9999999)}-1"
+
+    result = {
+        "ResultType": 0,
+        "OriginatorConversationID": originator_id,
+        "ConversationID": conversation_id,
+        "TransactionID": receipt_number(),
+    }
+    if random.random() < settings["fail_rate"]:
+        result.update(ResultCode=2001, ResultDesc="The initiator information is invalid.")
+    else:
+        result.update(ResultCode=0, ResultDesc="The service request is processed successfully.")
+    scheduler.schedule(callback_url(data.get("ResultURL")), {"Result": result})
+
+    return jsonify({
+        "ConversationID": conversation_id,
+        "OriginatorConversationID": originator_id,
+        "ResponseCode": "0",
+        "ResponseDescription": "Accept the service request successfully.",
+    })
+
+
+@app.route("/simulator/stats", methods=["GET"])
+def simulator_stats():
+    with stats_lock:
+        return jsonify(dict(stats, settings=settings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Daraja API simulator.")
+    env = os.environ.get
+    parser.add_argument("--host", default=env("SIM_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("SIM_PORT", 8089)))
+    parser.add_argument("--latency-ms", type=float, default=float(env("SIM_LATENCY_MS", 200)),
+                        help="Mean response latency of every endpoint.")
+    parser.add_argument("--jitter-ms", type=float, default=float(env("SIM_JITTER_MS", 50)),
+                        help="Latency varies uniformly by up to this much either way.")
+    parser.add_argument("--error-rate", type=float, default=float(env("SIM_ERROR_RATE", 0)),
+                        help="Share of STK/B2C requests answered with HTTP 500.")
+    parser.add_argument("--fail-rate", type=float, default=float(env("SIM_FAIL_RATE", 0)),
+                        help="Share of accepted requests whose callback reports a failure.")
+    parser.add_argument("--drop-rate", type=float, default=float(env("SIM_DROP_RATE", 0)),
+                        help="Share of callbacks never delivered.")
+    parser.add_argument("--callback-delay", type=float, default=float(env("SIM_CALLBACK_DELAY", 2)),
+                        help="Seconds before a callback is delivered.")
+    parser.add_argument("--callback-jitter", type=float, default=float(env("SIM_CALLBACK_JITTER", 1)),
+                        help="Extra random delay of up to this many seconds.")
+    parser.add_argument("--callback-base", default=env("SIM_CALLBACK_BASE"),
+                        help="Deliver callbacks here (keeping the path) instead of the URL in the request.")
+    parser.add_argument("--callback-workers", type=int, default=int(env("SIM_CALLBACK_WORKERS", 16)))
+    parser.add_argument("--token-ttl", type=int, default=int(env("SIM_TOKEN_TTL", 3599)))
+    args = parser.parse_args()
+
+    global scheduler
+    settings.update({key: value for key, value in vars(args).items() if key not in ("host", "port")})
+    scheduler = CallbackScheduler(args.callback_workers)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir.name, 'test.db')}"
+os.environ.setdefault("MAIL_SUPPRESS_SEND", "true")
+os.environ.setdefault("MPESA_STK_RECONCILE_INTERVAL", "0")
+os.environ.setdefault("TOKEN_REVOCATION_PURGE_INTERVAL", "0")
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+
+from app.app import app
+from app.models import (
+    db, User, Group, Transaction, TransactionType, TransactionReason, Contribution, ContributionStatus,
+    Loan, LoanStatus
+)
+from app.routes.admin import get_admin_dashboard
+from app.routes.contributions import get_contribution_streaks
+from app.utils.member_figures import get_member_figures, empty_figures
+
+
+class MemberFiguresTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.ctx.pop()
+        _db_dir.cleanup()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def _seed_group(self, size):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        admin = User(name="admin", email=f"admin-{size}@example.invalid", is_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        group = Group(name=f"group {size}", admin_id=admin.id, daily_contribution_amount=10)
+        db.session.add(group)
+        db.session.flush()
+        admin.group_id = group.id
+        members = [
+            User(name=f"member {n}", email=f"member-{size}-{n}@example.invalid", group_id=group.id)
+            for n in range(size)
+        ]
+        db.session.add_all(members)
+        db.session.flush()
+        for n, member in enumerate(members):
+            db.session.add(Transaction(
+                user_id=member.id, group_id=group.id, amount=10.0 * (n % 7), date=now,
+                type=TransactionType.CREDIT, reason=TransactionReason.CONTRIBUTION
+            ))
+            db.session.add(Contribution(
+                user_id=member.id, group_id=group.id, amount=10.0 * (n % 7), date=now,
+                status=ContributionStatus.PAID
+            ))
+        db.session.flush()
+        return admin, group, members
+
+    def _count_statements(self, admin, view):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        db.session.expire_all()  # start from a cold session, as a request would
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+        with app.test_request_context(headers=headers):
+            verify_jwt_in_request()  # refreshes the token revocation list now, not mid-count
+            event.listen(db.engine, "before_cursor_execute", count)
+            try:
+                view()
+            finally:
+                event.remove(db.engine, "before_cursor_execute", count)
+        return len(statements)
+
+    def test_figures_from_source_tables(self):
+        admin, group, members = self._seed_group(3)
+        member = members[1]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        last_month = now.replace(day=1) - datetime.timedelta(days=1)
+        db.session.add_all([
+            Transaction(user_id=member.id, group_id=group.id, amount=25.0, date=last_month,
+                        type=TransactionType.CREDIT, reason=TransactionReason.CONTRIBUTION),
+            Contribution(user_id=member.id, group_id=group.id, amount=25.0, date=last_month,
+                         status=ContributionStatus.PAID),
+            Transaction(user_id=member.id, group_id=group.id, amount=5.0, date=now,
+                        type=TransactionType.CREDIT, reason=TransactionReason.LOAN_REPAYMENT),
+            Loan(user_id=member.id, group_id=group.id, amount=100.0, outstanding=60.0, interest_rate=0,
+                 status=LoanStatus.PARTIALLY_REPAID),
+            Loan(user_id=member.id, group_id=group.id, amount=50.0, outstanding=0.0, interest_rate=0,
+                 status=LoanStatus.REPAID),
+        ])
+        db.session.flush()
+
+        figures = get_member_figures(group.id, now)
+
+        self.assertEqual(figures[member.id], {
+            "month_credits": 15.0,
+            "lifetime_contributions": 35.0,
+            "outstanding_loans": 60.0,
+            "repayments": 5.0,
+        })
+        self.assertEqual(figures[members[0].id]["month_credits"], 0.0)
+        self.assertNotIn(admin.id, figures)
+        self.assertEqual(get_member_figures(group.id, now, user_id=member.id), {member.id: figures[member.id]})
+        self.assertEqual(figures.get(admin.id, empty_figures())["lifetime_contributions"], 0.0)
+
+    def test_query_count_does_not_grow_with_members(self):
+        views = {
+            "admin_dashboard": lambda group: get_admin_dashboard(group.id),
+            "contribution_streaks": lambda group: get_contribution_streaks(),
+        }
+        for name, view in views.items():
+            counts = {}
+            for size in (5, 50):
+                admin, group, _ = self._seed_group(size)
+                counts[size] = self._count_statements(admin, lambda: view(group))
+                db.session.rollback()
+            with self.subTest(view=name):
+                self.assertEqual(counts[5], counts[50], counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,6 +15,7 @@ import CalculateIcon from "@mui/icons-material/Calculate";
 import DashboardIcon from "@mui/icons-material/Dashboard";
 import SettingsIcon from "@mui/icons-material/Settings";
 import { useNavigate } from "react-router-dom";
+import { io } from "socket.io-client";
 
 const StyledToolbar = styled(Toolbar)(({ theme }) => ({
   alignItems: "center",
@@ -67,10 +68,31 @@ export default function ProminentAppBar() {
     }
   };
 
+  // Notifications are pushed over the socket instead of polled
   React.useEffect(() => {
     fetchUnreadCount();
-    const interval = setInterval(fetchUnreadCount, 30000); // every 30s
-    return () => clearInterval(interval);
+    if (!token) return;
+
+    const userId = JSON.parse(localStorage.getItem("user") || "{}").id;
+    const socket = io(import.meta.env.VITE_API_BASE_URL, {
+      transports: ["websocket"],
+      auth: { token },
+    });
+
+    socket.on("connect", fetchUnreadCount); // catch up after reconnects
+    socket.on("notification", (note) => {
+      if (note.excluded_user_id && note.excluded_user_id === userId) return;
+      fetchUnreadCount();
+      window.dispatchEvent(new CustomEvent("notifications:new", { detail: note }));
+    });
+
+    // Read/clear actions on the notifications page change the count too
+    window.addEventListener("notifications:changed", fetchUnreadCount);
+
+    return () => {
+      window.removeEventListener("notifications:changed", fetchUnreadCount);
+      socket.disconnect();
+    };
   }, []);
 
   const handleMenuOpen = (event) => setAnchorEl(event.currentTarget);
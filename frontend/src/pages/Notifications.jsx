@@ -64,6 +64,14 @@ export default function NotificationsPage() {
     }
   }, [token]);
 
+  // New notifications arrive over the socket held by the header
+  useEffect(() => {
+    const onNew = (event) =>
+      setNotifications((prev) => [{ ...event.detail, is_read: false }, ...prev]);
+    window.addEventListener("notifications:new", onNew);
+    return () => window.removeEventListener("notifications:new", onNew);
+  }, []);
+
   // Mark all as read
   const markAllAsRead = async () => {
     try {
@@ -72,6 +80,7 @@ export default function NotificationsPage() {
         headers: authHeaders,
       });
       await fetchNotifications();
+      window.dispatchEvent(new Event("notifications:changed"));
       setSnackbarOpen(true);
     } catch (err) {
       console.error("Error marking all as read:", err);
@@ -79,16 +88,23 @@ export default function NotificationsPage() {
   };
 
   // ✅ NEW: Mark individual notification as read
-  const markAsRead = async (id) => {
+  const markAsRead = async (note) => {
+    const url =
+      note.source === "group"
+        ? `${BACKEND_URL}/notifications/broadcasts/${note.id}/mark-read`
+        : `${BACKEND_URL}/notifications/${note.id}/mark-read`;
     try {
-      await fetch(`${BACKEND_URL}/notifications/${id}/mark-read`, {
+      await fetch(url, {
         method: "PUT",
         headers: authHeaders,
       });
       // Instantly update UI without reloading
       setNotifications((prev) =>
-        prev.map((n) => (n.id === id ? { ...n, is_read: true } : n))
+        prev.map((n) =>
+          n.id === note.id && n.source === note.source ? { ...n, is_read: true } : n
+        )
       );
+      window.dispatchEvent(new Event("notifications:changed"));
     } catch (err) {
       console.error("Error marking as read:", err);
     }
@@ -220,8 +236,8 @@ export default function NotificationsPage() {
               <ul className="space-y-4">
                 {items.map((note) => (
                   <motion.li
-                    key={note.id}
-                    onClick={() => markAsRead(note.id)} // ✅ added
+                    key={`${note.source}-${note.id}`}
+                    onClick={() => markAsRead(note)} // ✅ added
                     initial={{ opacity: 0, y: 8 }}
                     animate={{ opacity: 1, y: 0 }}
                     transition={{ duration: 0.2 }}
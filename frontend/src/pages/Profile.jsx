@@ -16,7 +16,10 @@ import {
   CircularProgress,
   Tabs,
   Tab,
-  Box
+  Box,
+  RadioGroup,
+  Radio,
+  FormControlLabel
 } from "@mui/material";
 import { Delete, Edit, Lock, PhotoCamera, Person, Settings, Security } from "@mui/icons-material";
 import ProminentAppBar from "../components/Header";
@@ -72,6 +75,21 @@ export default function Profile() {
     }
   };
 
+  const handleDeliveryChange = async (emailDelivery) => {
+    try {
+      await axios.put(
+        `${API_BASE_URL}/user/profile`,
+        { email_delivery: emailDelivery },
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      setUser((prev) => ({ ...prev, email_delivery: emailDelivery }));
+      setFormData((prev) => ({ ...prev, email_delivery: emailDelivery }));
+    } catch (err) {
+      console.error("Preference update failed:", err);
+      alert("Failed to update email preference.");
+    }
+  };
+
   const handlePasswordChange = async () => {
     try {
       await axios.put(`${API_BASE_URL}/change_password`, passwordData, {
@@ -204,6 +222,24 @@ export default function Profile() {
                  <Typography variant="h6" className="font-semibold text-gray-700">
                    Preferences
                  </Typography>
+                 <Typography className="font-medium text-gray-700">
+                    Notification emails
+                 </Typography>
+                 <RadioGroup
+                    value={user.email_delivery || "digest"}
+                    onChange={(e) => handleDeliveryChange(e.target.value)}
+                 >
+                    <FormControlLabel
+                      value="immediate"
+                      control={<Radio />}
+                      label="Immediately, one email per notification"
+                    />
+                    <FormControlLabel
+                      value="digest"
+                      control={<Radio />}
+                      label="Daily digest of unread notifications"
+                    />
+                 </RadioGroup>
                  <Typography className="text-gray-500">
                     Theme settings coming soon...
                  </Typography>